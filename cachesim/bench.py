@@ -0,0 +1,128 @@
+#! /usr/bin/env python3
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import hierarchy
+import traceFile
+import traceGen
+from cache import Cache
+
+LIBQUANTUM = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mem_trace', 'log_libquantum_mem')
+
+# (size, associativity) of the Cache alone benchmarks
+CACHE_CONFIGS = [(0x8000, 8), (0x8000, -1), (0x100000, 16)]
+
+def syntheticTraces(n, seed=0):
+    """Synthetic traces of n accesses, as (addresses, writes)."""
+    return {
+        'stream': traceGen.collect(traceGen.sequential(n, writeFraction=0.3, seed=seed)),
+        'stride': traceGen.collect(traceGen.strided(n, writeFraction=0.3, seed=seed)),
+        'random': traceGen.collect(traceGen.uniform(n, writeFraction=0.3, seed=seed)),
+        'hotset': traceGen.collect(traceGen.zipf(n, workingSet=1 << 22, writeFraction=0.3, seed=seed)),
+        'chase': traceGen.collect(traceGen.pointerChase(n, workingSet=1 << 22, writeFraction=0.3, seed=seed)),
+        'pages': traceGen.collect(traceGen.pageScattered(n, writeFraction=0.3, seed=seed)),
+    }
+
+def loadTraces(n, seed=0):
+    traces = syntheticTraces(n, seed)
+    with open(LIBQUANTUM, 'rb') as f:
+        records = traceFile.parse(f, 'gem5')
+    addresses, writes, counts = traceFile.window(records)
+    traces['libquantum'] = (np.ascontiguousarray(addresses), writes)
+    return traces
+
+def benchmarks():
+    """(engine, config name, builder) for every simulated hierarchy."""
+    for size, associativity in CACHE_CONFIGS:
+        yield 'cache', '%dk/%d'%(size // 1024, associativity), lambda size=size, associativity=associativity: Cache(size, associativity)
+    yield 'hierarchy', 'default', lambda: hierarchy.baseline()[0]
+    yield 'etlb', 'default', lambda: hierarchy.etlbStack({'seed': 0})
+    yield 'etlb', 'hub512', lambda: hierarchy.etlbStack({'seed': 0, 'hub': {'nLines': 512}})
+
+def run(build, addresses, writes, mode):
+    top = build()
+    if mode == 'access_many':
+        top.access_many(addresses, writes)
+    else:
+        for address, write in zip(addresses.tolist(), writes.tolist()):
+            top.access(address, write)
+    return top
+
+def measure(build, addresses, writes, mode, repeat=3):
+    """Best time (seconds) of `repeat` runs and peak traced memory (bytes) of one benchmark."""
+    seconds = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        run(build, addresses, writes, mode)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start()
+    run(build, addresses, writes, mode)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+def runAll(n=20000, modes=('access_many', 'access'), repeat=3):
+    results = []
+    traces = loadTraces(n)
+    for engine, config, build in benchmarks():
+        for traceName, (addresses, writes) in traces.items():
+            for mode in modes:
+                seconds, peak = measure(build, addresses, writes, mode, repeat)
+                results.append({'engine': engine, 'config': config, 'trace': traceName, 'mode': mode,
+                                'n': len(addresses), 'seconds': seconds,
+                                'accessesPerSecond': len(addresses) / seconds, 'peakBytes': peak})
+                print("%-9s %-10s %-10s %-11s %10.0f acc/s %8.1f MB"%(engine, config, traceName, mode,
+                      results[-1]['accessesPerSecond'], peak / 1e6), file=sys.stderr)
+    return {'commit': commit(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results}
+
+def compare(old, new):
+    """Print the change in throughput and peak memory between two saved runs."""
+    key = lambda r: (r['engine'], r['config'], r['trace'], r['mode'])
+    before = {key(r): r for r in old['results']}
+    print("%s -> %s"%(old.get('commit', '?'), new.get('commit', '?')))
+    print("%-9s %-10s %-10s %-11s %12s %12s %7s %8s"%("engine", "config", "trace", "mode", "acc/s old", "acc/s new", "speedup", "mem"))
+    for r in new['results']:
+        if key(r) not in before:
+            continue
+        o = before[key(r)]
+        print("%-9s %-10s %-10s %-11s %12.0f %12.0f %6.2fx %7.2fx"%(key(r) + (o['accessesPerSecond'], r['accessesPerSecond'],
+              r['accessesPerSecond'] / o['accessesPerSecond'], r['peakBytes'] / max(o['peakBytes'], 1))))
+
+def test():
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        if len(sys.argv) < 4:
+            print("usage: bench.py compare <old.json> <new.json>")
+            sys.exit(1)
+        with open(sys.argv[2]) as f:
+            old = json.load(f)
+        with open(sys.argv[3]) as f:
+            new = json.load(f)
+        compare(old, new)
+        return
+    # bench.py [output.json] [n] [repeat]
+    out = sys.argv[1] if len(sys.argv) > 1 else None
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    report = runAll(n, repeat=repeat)
+    if out is None:
+        json.dump(report, sys.stdout, indent=1)
+    else:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=1)
+
+if __name__ == '__main__':
+    test()
@@ -1,11 +1,42 @@
 #! /usr/bin/env python
 import math
 import sys
+from array import array
+import numpy as np
+from replacement import makePolicy
+from prefetch import makePrefetcher
+import traceFile
+import checkpoint
+
+# Integer event counters of a level, cycles and energy are priced from these when read
+EVENTS = ('hit', 'miss', 'tagProbes', 'timedTagProbes', 'reads', 'writes', 'timedAccesses', 'writebacks', 'writeThroughs', 'fills')
+# Timing (cycles) and energy of each event, defaults of a level
+DEFAULT_PRICES = {'tagTime': 1, 'accessTime': 3, 'tagEnergy': 0.000760707, 'accessEnergy': 0.0111033}
+# Prefetch event counters, kept apart from the demand events above
+PREFETCH_EVENTS = ('prefetchProbes', 'prefetchHits', 'prefetchMisses', 'prefetchReads', 'prefetchFills', 'usefulPrefetches')
+
+def priceCycles(events, prices):
+    """Cycles of a level from its event counters and timing, both dicts."""
+    return prices['tagTime'] * events['timedTagProbes'] + prices['accessTime'] * events['timedAccesses']
+
+def priceEnergy(events, prices):
+    """Energy of a level from its event counters and energies, both dicts (a write costs two accesses)."""
+    return prices['tagEnergy'] * events['tagProbes'] + prices['accessEnergy'] * (events['reads'] + 2 * events['writes'])
+
+def pricePrefetches(events, prices):
+    """(cycles, energy) of the prefetches of a level from its prefetch event counters and prices, both dicts.
+
+    Prefetches are off the critical path, their cycles are the time the level is busy with them.
+    """
+    accesses = events['prefetchReads'] + events['prefetchFills']
+    return (prices['tagTime'] * events['prefetchProbes'] + prices['accessTime'] * accesses,
+            prices['tagEnergy'] * events['prefetchProbes'] + prices['accessEnergy'] * accesses)
 
 class Cache:
     
 
-    def __init__(self, size=0x8000, associativity=8, cacheLine=64, child=None):
+    def __init__(self, size=0x8000, associativity=8, cacheLine=64, child=None, replacement='lru', writeBack=True, writeAllocate=True, tlb=None,
+                 prefetcher=None, prefetchDegree=None):
         """Simple associative cache.
 
         Parameters
@@ -17,13 +48,32 @@ class Cache:
             Number of ways for an associative cache, -1 for fully associative.
         cacheLine (int):
             Number of bytes per cache line, determiines the number of offset bits.
-        child (Cache):
-            The next level of cache, default is None, which means DRAM (not simulated).
+        child (Cache or dram.DRAM):
+            The next level of cache or the DRAM, default is None, which means DRAM is not simulated.
+        replacement (str or class):
+            Replacement policy, a name from `replacement.POLICIES` or a policy class (default 'lru').
+        writeBack (bool):
+            True to hold writes in the line until it is evicted (write-back), False to pass
+            every write on to the child (write-through). (Default True)
+        writeAllocate (bool):
+            True to fill a line on a write miss, False to pass the write on without filling one. (Default True)
+        tlb (tlb.TLB):
+            TLB translating every access (the top level of a virtually indexed hierarchy), its
+            time and energy are counted in the TLB and page table. Default is None, which means no translation.
+        prefetcher (str or class):
+            Prefetcher trained on the demand accesses of this level, a name from `prefetch.PREFETCHERS`
+            or a class, default is None, which means no prefetching.
+        prefetchDegree (int):
+            How far ahead the prefetcher fetches, default is None, which means the prefetcher's default.
         """
         self.size = size
         self.associativity = associativity
         self.cacheLine = cacheLine
         self.child = child
+        self.writeBack = writeBack
+        self.writeAllocate = writeAllocate
+        self.tlb = tlb
+        self.prefetcher = makePrefetcher(prefetcher, prefetchDegree)
 
         self.nLines = self.size // self.cacheLine
 
@@ -39,21 +89,79 @@ class Cache:
         self.freeList = [list(range(self.associativity)) for i in range(self.nSets)]
 
         self.counter = 0
-        self.lastAccess = [[0]*self.associativity for i in range(self.nSets)]
-        self.tags = [[0]*self.associativity for i in range(self.nSets)]
+        # Per line state, indexed by setIndex * associativity + way
+        nWays = self.nSets * self.associativity
+        self.lastAccess = array('Q', bytes(8 * nWays))
+        self.tags = array('Q', bytes(8 * nWays))
+        # 0 free, 1 valid, 2 allocated but not yet accessed, 3 prefetched but not yet accessed
+        self.valid = bytearray(nWays)
+        # 1 for lines written since they were filled (write-back only)
+        self.dirty = bytearray(nWays)
+        self.replacement = makePolicy(replacement, self.nSets, self.associativity)
+        # Lowest way holding each tag in a set, and the number of ways holding a tag
+        # already held by a lower way (every way starts out holding tag 0)
+        self.tagIndex = [{0: 0} for i in range(self.nSets)]
+        self.duplicates = [self.associativity - 1] * self.nSets
 
-        self.tagTime = 1
-        self.accessTime = 3
+        self.tagTime = DEFAULT_PRICES['tagTime']
+        self.accessTime = DEFAULT_PRICES['accessTime']
 
-        self.tagEnergy = 0.000760707
-        self.accessEnergy = 0.0111033
+        self.tagEnergy = DEFAULT_PRICES['tagEnergy']
+        self.accessEnergy = DEFAULT_PRICES['accessEnergy']
 
         self.hit = 0
         self.miss = 0
-        self.cycles = 0
-        self.energy = 0.
-        
-    def access(self, address, write=False, count=True, countTime=None, countEnergy=None):
+        # Tag lookups and data array reads/writes which cost energy, and those of them
+        # on the critical path (timed), which cost tagTime/accessTime
+        self.tagProbes = 0
+        self.timedTagProbes = 0
+        self.reads = 0
+        self.writes = 0
+        self.timedAccesses = 0
+        # Dirty lines written back to the child on eviction, writes passed on to the child
+        # by write-through or no-write-allocate, and lines installed on a miss
+        self.writebacks = 0
+        self.writeThroughs = 0
+        self.fills = 0
+        # Prefetches: tag probes of prefetched lines, those found already cached (dropped)
+        # or missing, lines read out to the parent's prefetches, lines filled by prefetching
+        # and prefetched lines later used by a demand access
+        self.prefetchProbes = 0
+        self.prefetchHits = 0
+        self.prefetchMisses = 0
+        self.prefetchReads = 0
+        self.prefetchFills = 0
+        self.usefulPrefetches = 0
+
+    @property
+    def cycles(self):
+        """Cycles spent in this level, priced from the event counters at the current timing."""
+        return priceCycles(self.events(), self.prices())
+
+    @property
+    def energy(self):
+        """Energy spent in this level, priced from the event counters at the current energies."""
+        return priceEnergy(self.events(), self.prices())
+
+    @property
+    def prefetchCycles(self):
+        """Cycles this level spent prefetching, off the critical path, at the current timing."""
+        return pricePrefetches(self.events(PREFETCH_EVENTS), self.prices())[0]
+
+    @property
+    def prefetchEnergy(self):
+        """Energy this level spent prefetching, at the current energies."""
+        return pricePrefetches(self.events(PREFETCH_EVENTS), self.prices())[1]
+
+    def events(self, names=EVENTS):
+        """The event counters of this level, as a dict."""
+        return {k: getattr(self, k) for k in names}
+
+    def prices(self):
+        """The timing and energy of this level, as a dict."""
+        return {k: getattr(self, k) for k in DEFAULT_PRICES}
+
+    def access(self, address, write=False, count=True, countTime=None, countEnergy=None, batched=False, prefetch=False):
         """Access a given address.
 
         Parameters
@@ -62,9 +170,13 @@ class Cache:
             The address which is accessed.
         write (bool):
             True if the access is a write, False for a read (default read).
-            This parameter is unused currently, but maintained for future use.
         count (bool):
             Whether hit/miss rate should be counted (default is True).
+        batched (bool):
+            True when called by `access_many`, which has already translated the batch and trained
+            the prefetcher on it.
+        prefetch (bool):
+            True for a prefetch of the parent level, which is counted apart from demand accesses (see `prefetch`).
         """
         if countTime is None:
             countTime = count
@@ -72,84 +184,310 @@ class Cache:
         if countEnergy is None:
             countEnergy = count
 
+        if prefetch:
+            return self.prefetch(address, countEnergy, request=True)
+
+        if not batched and self.tlb is not None:
+            self.tlb.lookup(address, count, countTime, countEnergy)
+
         setIndex = (address >> self.offsetBits)  % self.nSets
 
         tag = address >> (self.setBits + self.offsetBits)
 
         if countTime:
-            self.cycles += self.tagTime
+            self.timedTagProbes += 1
         if countEnergy:
-            self.energy += self.tagEnergy
+            self.tagProbes += 1
 
-        if tag in self.tags[setIndex]:
+        way = self.tagIndex[setIndex].get(tag)
+        if way is not None:
             if count:
                 self.hit += 1
-            way = list(self.tags[setIndex]).index(tag)
         
         else:
             if count:
                 self.miss += 1
-            if self.child is not None:
-                self.child.access(address, write, count)
+            if write and not self.writeAllocate:
+                # The write goes to the child without filling a line here
+                if self.child is not None:
+                    self.child.access(address, True, count)
+                if countEnergy:
+                    self.writeThroughs += 1
+            else:
+                # Fetch the line, any write is made to it here
+                if self.child is not None:
+                    self.child.access(address, False, count)
 
-            if len(self.freeList[setIndex]) == 0:
-                evictedTag = self.evict(setIndex, countEnergy=countEnergy)
-            way = self.freeList[setIndex].pop()
-            self.tags[setIndex][way] = tag
-        
-        self.accessDirect(setIndex, way, write, countTime, countEnergy)
+                if len(self.freeList[setIndex]) == 0:
+                    evictedTag = self.evict(setIndex, countEnergy=countEnergy)
+                way = self.allocate(setIndex)
+                self.setTag(setIndex, way, tag)
+                if count:
+                    self.fills += 1
+
+        if way is not None:
+            self.accessDirect(setIndex, way, write, countTime, countEnergy)
+        if self.prefetcher is not None and not batched:
+            for line in self.prefetcher.observe(address >> self.offsetBits):
+                self.prefetch(line << self.offsetBits, countEnergy)
     
+    def access_many(self, addresses, writes=None, count_mask=None, chunkSize=0x10000):
+        """Access a batch of addresses, equivalent to calling `access` on each in order.
+
+        Set indices and tags are computed with NumPy a chunk at a time, hits on
+        valid lines are handled inline and anything else falls back to `access`.
+        The TLB, whose state does not depend on the cache, translates the whole batch first,
+        and the prefetcher is trained on a chunk at once, its prefetches being issued after
+        the access which triggered them.
+
+        Parameters
+        ----------
+        addresses (array of int):
+            The addresses which are accessed.
+        writes (array of bool):
+            True for each access which is a write, default None means all reads.
+        count_mask (array of bool):
+            Whether each access should be counted, default None counts all.
+        chunkSize (int):
+            Number of addresses decomposed at once.
+        """
+        addresses = np.asarray(addresses, dtype=np.uint64)
+        n = len(addresses)
+        if writes is None:
+            writes = np.zeros(n, dtype=bool)
+        if count_mask is None:
+            count_mask = np.ones(n, dtype=bool)
+        writes = np.asarray(writes, dtype=bool)
+        count_mask = np.asarray(count_mask, dtype=bool)
+        if self.tlb is not None:
+            self.tlb.access_many(addresses, count_mask, chunkSize)
+
+        tagIndex = self.tagIndex
+        valid = self.valid
+        dirty = self.dirty
+        writeThrough = not self.writeBack
+        lastAccess = self.lastAccess
+        touch = self.replacement.touch
+        associativity = self.associativity
+        prefetcher = self.prefetcher
+        for start in range(0, n, chunkSize):
+            chunk = addresses[start:start + chunkSize]
+            setIndices = ((chunk >> np.uint64(self.offsetBits)) % np.uint64(self.nSets)).tolist()
+            tags = (chunk >> np.uint64(self.setBits + self.offsetBits)).tolist()
+            chunkWrites = writes[start:start + chunkSize].tolist()
+            counts = count_mask[start:start + chunkSize].tolist()
+            # Prefetches to issue after the access at each position, -1 ends the list
+            positions, candidates = [], []
+            if prefetcher is not None:
+                positions, candidates = prefetcher.observeMany((chunk >> np.uint64(self.offsetBits)).astype(np.int64))
+                positions = positions.tolist()
+                candidates = (candidates << self.offsetBits).tolist()
+            positions.append(-1)
+            p = 0
+            nextPrefetch = positions[0]
+
+            # Counted hits (and writes among them) not yet added to the event counters
+            hits = 0
+            writeHits = 0
+            counter = self.counter
+            for i, setIndex in enumerate(setIndices):
+                way = tagIndex[setIndex].get(tags[i])
+                if way is not None:
+                    line = setIndex * associativity + way
+                write = chunkWrites[i]
+                if way is None or valid[line] != 1 or (write and writeThrough):
+                    self.countHits(hits, writeHits)
+                    hits = writeHits = 0
+                    self.counter = counter
+                    self.access(int(chunk[i]), write, counts[i], batched=True)
+                    counter = self.counter
+                else:
+                    if counts[i]:
+                        hits += 1
+                        if write:
+                            writeHits += 1
+                    if write:
+                        dirty[line] = 1
+                    touch(setIndex, way)
+                    counter += 1
+                    lastAccess[line] = counter
+                if i == nextPrefetch:
+                    while positions[p] == i:
+                        self.prefetch(candidates[p], counts[i])
+                        p += 1
+                    nextPrefetch = positions[p]
+            self.countHits(hits, writeHits)
+            self.counter = counter
+
+    def countHits(self, hits, writeHits):
+        """Count the events of `hits` counted hits on valid lines, `writeHits` of them writes."""
+        self.hit += hits
+        self.tagProbes += hits
+        self.timedTagProbes += hits
+        self.timedAccesses += hits
+        self.reads += hits - writeHits
+        self.writes += writeHits
+
     def accessDirect(self, setIndex, way, write=False, countTime=True, countEnergy=True):
         if countTime:
-            self.cycles += self.accessTime
+            self.timedAccesses += 1
         if countEnergy:
-            self.energy += self.accessEnergy
             if write:
-                self.energy += self.accessEnergy
-        if way in self.freeList[setIndex]:
-            self.freeList[setIndex].remove(way)
+                self.writes += 1
+            else:
+                self.reads += 1
+        line = setIndex * self.associativity + way
+        if write:
+            if self.writeBack:
+                self.dirty[line] = 1
+            else:
+                if self.child is not None:
+                    self.child.access(self.lineAddress(setIndex, way), write=True, count=False, countEnergy=countEnergy)
+                if countEnergy:
+                    self.writeThroughs += 1
+        state = self.valid[line]
+        if state == 1:
+            self.replacement.touch(setIndex, way)
+        elif state == 3:
+            # First demand access to a prefetched line
+            if countEnergy:
+                self.usefulPrefetches += 1
+            self.valid[line] = 1
+            self.replacement.touch(setIndex, way)
+        else:
+            if state == 0:
+                # Freed line whose tag still matched, take it back off the free list
+                self.freeList[setIndex].remove(way)
+            self.valid[line] = 1
+            self.replacement.insert(setIndex, way)
         self.counter += 1
-        self.lastAccess[setIndex][way] = self.counter
+        self.lastAccess[line] = self.counter
+
+    def prefetch(self, address, countEnergy=True, request=False):
+        """Fetch the line holding `address` ahead of demand, through the child as a miss is.
+
+        A prefetch probes the tags and is dropped if the line is already cached, otherwise
+        the line is fetched from the child (as a prefetch of the child) and filled, marked
+        as prefetched until its first demand access. Every event is counted in the prefetch
+        counters, not as a demand hit or miss.
+
+        Parameters
+        ----------
+        address (int):
+            An address in the line which is prefetched.
+        countEnergy (bool):
+            Whether the prefetch is counted (False while warming up).
+        request (bool):
+            True for a prefetch of the parent level, to which the line is read out.
+        """
+        setIndex = (address >> self.offsetBits) % self.nSets
+        tag = address >> (self.setBits + self.offsetBits)
+        if countEnergy:
+            self.prefetchProbes += 1
+            if request:
+                self.prefetchReads += 1
+        if self.tagIndex[setIndex].get(tag) is not None:
+            if countEnergy:
+                self.prefetchHits += 1
+            return
+        if countEnergy:
+            self.prefetchMisses += 1
+        if self.child is not None:
+            self.child.access(address, False, False, False, countEnergy, prefetch=True)
+        if len(self.freeList[setIndex]) == 0:
+            self.evict(setIndex, countEnergy=countEnergy)
+        way = self.allocate(setIndex)
+        self.setTag(setIndex, way, tag)
+        self.markPrefetched(setIndex, way, countEnergy)
+
+    def markPrefetched(self, setIndex, way, countEnergy=True):
+        """Install an allocated way as a prefetched line, not yet accessed by demand."""
+        self.valid[setIndex * self.associativity + way] = 3
+        self.replacement.insert(setIndex, way)
+        if countEnergy:
+            self.prefetchFills += 1
+
+    def allocate(self, setIndex):
+        """Take a way from the free list of a set, returning the way."""
+        way = self.freeList[setIndex].pop()
+        self.valid[setIndex * self.associativity + way] = 2
+        return way
+
+    def getTag(self, setIndex, way):
+        return self.tags[setIndex * self.associativity + way]
+
+    def lineAddress(self, setIndex, way):
+        """Address of the first byte of the line held in a way."""
+        return ((self.tags[setIndex * self.associativity + way] << self.setBits) + setIndex) << self.offsetBits
+
+    def clean(self, setIndex, way):
+        """Clear the dirty bit of a way, returning whether it was dirty (e.g. when its line moves to another level)."""
+        line = setIndex * self.associativity + way
+        wasDirty = self.dirty[line]
+        self.dirty[line] = 0
+        return bool(wasDirty)
+
+    def markDirty(self, setIndex, way):
+        """Mark the line in a way as modified, e.g. when a dirty line moves into it."""
+        self.dirty[setIndex * self.associativity + way] = 1
+
+    def setTag(self, setIndex, way, tag):
+        """Store `tag` in a way, keeping the per set tag index up to date."""
+        base = setIndex * self.associativity
+        line = base + way
+        index = self.tagIndex[setIndex]
+        oldTag = self.tags[line]
+        if index[oldTag] != way:
+            self.duplicates[setIndex] -= 1
+        elif self.duplicates[setIndex] == 0:
+            del index[oldTag]
+        else:
+            try:
+                index[oldTag] = self.tags.index(oldTag, line + 1, base + self.associativity) - base
+                self.duplicates[setIndex] -= 1
+            except ValueError:
+                del index[oldTag]
+        self.tags[line] = tag
+        lowest = index.get(tag)
+        if lowest is None:
+            index[tag] = way
+        else:
+            self.duplicates[setIndex] += 1
+            if way < lowest:
+                index[tag] = way
 
     def evict(self, setNumber, way=None, countEnergy=True):
-        """Evict (i.e. add to the free list) a cache line.
+        """Evict (i.e. add to the free list) a cache line, writing it back if it is dirty.
         
-        If `way` is None, LRU replacement policy is used among occupied lines.
+        If `way` is None, the replacement policy selects among occupied lines.
         If `way` is an integer, that integer is added to the free list.
         """
-        if way is not None:
-            if way not in self.freeList[setNumber]:
-                self.freeList[setNumber].append(way)
-                if self.child is not None:
-                    addr = (self.tags[setNumber][way] << self.setBits) + setNumber
-                    self.child.access(addr << self.offsetBits, write=True, count=False, countEnergy=countEnergy)
-        else:
+        if way is None:
             way = self.selectEviction(setNumber)
-            if way not in self.freeList[setNumber]:
-                self.freeList[setNumber].append(way)
+        line = setNumber * self.associativity + way
+        if self.valid[line]:
+            self.valid[line] = 0
+            self.freeList[setNumber].append(way)
+            self.replacement.remove(setNumber, way)
+            if self.dirty[line]:
+                self.dirty[line] = 0
+                # Written back to the child, or to DRAM (not simulated) without one
                 if self.child is not None:
-                    addr = (self.tags[setNumber][way] << self.setBits) + setNumber
-                    self.child.access(addr << self.offsetBits, write=True, count=False, countEnergy=countEnergy)
+                    self.child.access(self.lineAddress(setNumber, way), write=True, count=False, countEnergy=countEnergy)
+                if countEnergy:
+                    self.writebacks += 1
         if countEnergy:
-            self.energy += self.tagEnergy
-        return self.tags[setNumber][way]
+            self.tagProbes += 1
+        return self.tags[line]
 
     def selectEviction(self, setNumber):
-        way = 0
-        minAccess = self.lastAccess[setNumber][0]
-        for i,acc in enumerate(self.lastAccess[setNumber]):
-            if i not in self.freeList[setNumber] and self.lastAccess[setNumber][i] < minAccess:
-                way = i
-                minAccess = self.lastAccess[setNumber][i]
-        return way
+        return self.replacement.victim(setNumber)
 
 def test():
-    L2 = Cache(size=0x100000, associativity=16)
-    L2.accessTime = 8
-    L2.tagTime = 3
-    L2.accessEnergy = 0.137789
-    L2.tagEnergy = 0.00538836
-    L1 = Cache(size=0x8000, child=L2)
+    # hierarchy builds on this module, so it is only imported to run the test
+    import hierarchy
+    # Built as replay.py builds it, behind L1/L2 TLBs, so both engines report their translation cost
+    L1 = hierarchy.build({'engine': 'baseline'})
     nLines = -1
     if len(sys.argv) > 1:
         nLines = int(sys.argv[1])
@@ -159,21 +497,20 @@ def test():
     warmup = 0
     if len(sys.argv) > 3:
         warmup = int(sys.argv[3])
-    for i, line in enumerate(sys.stdin):
-        if line.startswith('#eof'):
-            break
-        if i >= skip:
-            addr = int(line.split(' ')[1], 16)
-            L1.access(addr, line[0]=='W', i >= skip + warmup)
-        if i + 1 == skip + warmup + nLines and nLines != -1:
-            break
-    print("N:", L1.counter - warmup)
-    print("L1 hit:  %d (%0.3f)"%(L1.hit, L1.hit/(L1.counter-warmup)*100))
-    print("L1 miss: %d (%0.3f)"%(L1.miss, L1.miss/(L1.counter-warmup)*100))
-    print("L2 hit:  %d (%0.3f)"%(L2.hit, L2.hit/(L1.counter-warmup)*100))
-    print("L2 miss: %d (%0.3f)"%(L2.miss, L2.miss/(L1.counter-warmup)*100))
-    print("Time L1: %d, L2: %d, total: %d"%(L1.cycles, L2.cycles, L1.cycles+L2.cycles))
-    print("Energy L1: %0.3f, L2: %0.3f, total: %0.3f"%(L1.energy, L2.energy, L1.energy+L2.energy))
+    checkpointPath = None
+    if len(sys.argv) > 4:
+        checkpointPath = sys.argv[4]
+    position = skip + warmup
+    L1, restored = checkpoint.resume(L1, checkpointPath, position)
+    records = traceFile.readStdin()
+    addresses, writes, counts = traceFile.window(records, skip, warmup, nLines)
+    counter = int(counts.sum())
+    if not restored:
+        L1.access_many(addresses[:warmup], writes[:warmup], counts[:warmup])
+        if checkpointPath is not None:
+            checkpoint.save(L1, checkpointPath, position)
+    L1.access_many(addresses[warmup:], writes[warmup:], counts[warmup:])
+    print(hierarchy.report(hierarchy.results(L1, counter)))
 
 if __name__ == '__main__':
     test()
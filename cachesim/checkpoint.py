@@ -0,0 +1,143 @@
+#! /usr/bin/env python3
+import hashlib
+import io
+import json
+import os
+import pickle
+import struct
+import sys
+import zlib
+
+# Header: magic, format version, trace position, config fingerprint
+MAGIC = b'CSCKPT'
+VERSION = 8
+HEADER = struct.Struct('<6sBQ32s')
+
+# Parameters of each level which make up its configuration (everything else is state)
+CACHE_CONFIG = ('size', 'associativity', 'cacheLine', 'writeBack', 'writeAllocate', 'accessTime', 'tagTime', 'accessEnergy', 'tagEnergy')
+ETLB_CONFIG = ('nLines', 'associativity', 'pageSize')
+HUB_CONFIG = ('nLines', 'associativity', 'pageSize')
+TLB_CONFIG = ('nEntries', 'associativity', 'accessTime', 'accessEnergy')
+PAGE_TABLE_CONFIG = ('pageSize', 'regions', 'levels', 'levelTime', 'levelEnergy')
+DRAM_CONFIG = ('nChannels', 'nBanks', 'rowSize', 'cacheLine', 'rowHitTime', 'rowMissTime', 'prechargeTime',
+               'rowHitEnergy', 'rowMissEnergy', 'prechargeEnergy')
+
+# Module of each class which may be pickled from a script run as __main__ (e.g. cache.py)
+MODULES = {'Cache': 'cache', 'ETLB': 'etlb', 'ETLBEntry': 'etlb', 'Hub': 'hub', 'HubEntry': 'hub', 'DRAM': 'dram'}
+
+class Unpickler(pickle.Unpickler):
+    """Unpickler which finds the classes of a checkpoint saved by a script in their own modules."""
+
+    def find_class(self, module, name):
+        if module == '__main__' and name in MODULES:
+            module = MODULES[name]
+        return pickle.Unpickler.find_class(self, module, name)
+
+def describe(level):
+    """Configuration of a level and the levels below it, as a nested dict.
+
+    Levels are told apart by class name, so classes of a script run as __main__ match.
+    """
+    if level is None:
+        return None
+    kind = type(level).__name__
+    if kind == 'Cache':
+        config = {k: getattr(level, k) for k in CACHE_CONFIG}
+        config['child'] = describe(level.child)
+        config['tlb'] = describe(level.tlb)
+    elif kind == 'ETLB':
+        config = {k: getattr(level, k) for k in ETLB_CONFIG}
+        config['tlb'] = describe(level.tlb)
+        config['cache'] = describe(level.cache)
+        config['hub'] = describe(level.hub)
+    elif kind == 'Hub':
+        config = {k: getattr(level, k) for k in HUB_CONFIG}
+        config['cache'] = describe(level.cache)
+        config['dram'] = describe(level.dram)
+    elif kind == 'TLB':
+        config = {k: getattr(level, k) for k in TLB_CONFIG}
+        config['child'] = describe(level.child)
+        if level.child is None:
+            config['pageTable'] = {k: getattr(level.pageTable, k) for k in PAGE_TABLE_CONFIG}
+    elif kind == 'DRAM':
+        # The DRAM translates with the page table of the TLBs, which is described there
+        config = {k: getattr(level, k) for k in DRAM_CONFIG}
+        config['type'] = kind
+        return config
+    else:
+        raise TypeError("Can not checkpoint a %s"%kind)
+    if kind in ('Cache', 'ETLB'):
+        prefetcher = level.prefetcher
+        config['prefetcher'] = None if prefetcher is None else (type(prefetcher).__name__, prefetcher.degree)
+    config['type'] = kind
+    config['replacement'] = type(level.replacement).__name__
+    return config
+
+def fingerprint(top):
+    """SHA-256 of the configuration of a hierarchy, which a checkpoint must match to be restored."""
+    return hashlib.sha256(json.dumps(describe(top), sort_keys=True).encode()).digest()
+
+def dumps(top, position=0):
+    """Serialize the full state of a hierarchy (every level below `top`) to bytes.
+
+    Parameters
+    ----------
+    top (Cache or ETLB):
+        The top level, its children, Hub, TLB and replacement policies are included.
+    position (int):
+        Number of trace records which have been replayed into `top`.
+    """
+    state = zlib.compress(pickle.dumps(top, protocol=pickle.HIGHEST_PROTOCOL))
+    return HEADER.pack(MAGIC, VERSION, position, fingerprint(top)) + state
+
+def loads(data, top=None, position=None):
+    """Restore a hierarchy from `dumps`, returning (top, position).
+
+    Each call returns a new, independent copy, so one warm state can be forked into
+    many runs. If `top` is given the checkpoint must have been saved from a hierarchy
+    with the same configuration, and if `position` is given it must have been saved
+    at that trace position, otherwise ValueError is raised. As with any pickle, only
+    load checkpoints you trust.
+    """
+    magic, version, saved, digest = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a checkpoint, bad magic %r"%magic)
+    if version != VERSION:
+        raise ValueError("Unsupported checkpoint version %d, expected %d"%(version, VERSION))
+    if top is not None and digest != fingerprint(top):
+        raise ValueError("Checkpoint was saved from a different configuration")
+    if position is not None and saved != position:
+        raise ValueError("Checkpoint was saved at trace position %d, not %d"%(saved, position))
+    return Unpickler(io.BytesIO(zlib.decompress(data[HEADER.size:]))).load(), saved
+
+def save(top, path, position=0):
+    """Write the state of a hierarchy to a checkpoint file, see `dumps`."""
+    with open(path, 'wb') as f:
+        f.write(dumps(top, position))
+
+def load(path, top=None, position=None):
+    """Read a checkpoint file, see `loads`."""
+    with open(path, 'rb') as f:
+        return loads(f.read(), top, position)
+
+def resume(top, path, position):
+    """Restore `top` from the checkpoint at `path` if there is one, for the test functions.
+
+    Returns (top, restored), `top` being the restored copy if the checkpoint existed.
+    A missing `path` (or None) leaves `top` as it is, to be warmed and saved by the caller.
+    """
+    if path is None or not os.path.exists(path):
+        return top, False
+    return load(path, top, position)[0], True
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: checkpoint.py <checkpoint>")
+        sys.exit(1)
+    top, position = load(sys.argv[1])
+    print("Position:", position)
+    print("Fingerprint:", fingerprint(top).hex())
+    print(json.dumps(describe(top), indent=1, sort_keys=True))
+
+if __name__ == '__main__':
+    main()
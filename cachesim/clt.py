@@ -0,0 +1,54 @@
+# (location, way) of a line which is not cached
+NOT_CACHED = (0, 0)
+
+class CLTEntry:
+    """Cache location table (CLT) of one page, the base of eTLB and Hub entries.
+
+    The CLT is sparse: `lines` maps the index of each cached line of the page to
+    (location, way), location being where it is cached (1 L1I, 2 L1D, 3 L2) and way
+    the way within that level. Lines which are not cached (location 0) have no item,
+    so a 2 MB page costs no more than a 4 kB one, lookups are O(1) and walks are
+    O(cached lines).
+    """
+
+    __slots__ = ('nEntries', 'lines', 'transitions')
+
+    def __init__(self, pageSize=0x1000, cacheLine=64):
+        self.nEntries = pageSize // cacheLine
+        self.lines = {}
+        # [from, to] counts of location moves, set while an `instrument.Instrument` is attached
+        self.transitions = None
+
+    def place(self, pageIndex, location, way):
+        """Record that a line is cached in `way` of `location`, or not cached for location 0."""
+        if self.transitions is not None:
+            previous = self.lines.get(pageIndex, NOT_CACHED)[0]
+            if previous != location:
+                self.transitions[previous, location] += 1
+        if location:
+            self.lines[pageIndex] = (location, way)
+        else:
+            self.lines.pop(pageIndex, None)
+
+    def find(self, location, way):
+        """Index of the line of the page cached in `way` of `location`, or None."""
+        for pageIndex, line in self.lines.items():
+            if line[0] == location and line[1] == way:
+                return pageIndex
+        return None
+
+    def cached(self):
+        """(pageIndex, location, way) of every cached line, in page order."""
+        return [(pageIndex,) + self.lines[pageIndex] for pageIndex in sorted(self.lines)]
+
+    def clear(self):
+        """Mark every line of the page as not cached."""
+        if self.transitions is not None:
+            for location, way in self.lines.values():
+                self.transitions[location, 0] += 1
+        self.lines.clear()
+
+    def copyCLT(self, other):
+        """Copy the CLT of another entry into this one."""
+        self.lines.clear()
+        self.lines.update(other.lines)
@@ -0,0 +1,95 @@
+#! /usr/bin/env python3
+import argparse
+import sys
+import hierarchy
+import replay
+import store
+
+def engineParams(engine, params):
+    """The 'level.key=value' parameters which apply to the levels of an engine.
+
+    Raises ValueError for a parameter whose level is in neither engine.
+    """
+    for param in params:
+        level = param.split('.', 1)[0]
+        if level not in hierarchy.BASELINE and level not in hierarchy.ETLB_STACK:
+            raise ValueError("Unknown level '%s' of parameter '%s', expected one of %s"
+                             %(level, param, ', '.join(dict(hierarchy.BASELINE, **hierarchy.ETLB_STACK))))
+    defaults = hierarchy.BASELINE if engine == 'baseline' else hierarchy.ETLB_STACK
+    return [param for param in params if param.split('.', 1)[0] in defaults]
+
+def configs(params=(), seed=None):
+    """The (baseline, etlb) configs of a comparison, see `compare`."""
+    return (replay.makeConfig('baseline', engineParams('baseline', params), seed),
+            replay.makeConfig('etlb', engineParams('etlb', params), seed))
+
+def compare(source, params=(), seed=None, format=None, skip=0, warmup=0, nLines=-1):
+    """Replay one trace through the baseline L1/L2 hierarchy and the ETLB/Hub stack in a single pass.
+
+    The trace is parsed once and each chunk is fed to both engines, so both see the
+    same window. `params` are 'level.key=value' strings, each applied to the engines
+    which have that level (L1 and L2 are in both).
+
+    Returns the (baseline, etlb) rows of `hierarchy.results`.
+    """
+    baselineConfig, etlbConfig = configs(params, seed)
+    baseline = hierarchy.build(baselineConfig)
+    etlb = hierarchy.build(etlbConfig)
+    N = replay.replayMany([baseline, etlb], source, format, skip, warmup, nLines)
+    return hierarchy.results(baseline, N), hierarchy.results(etlb, N)
+
+def storedCompare(resultStore, tracePath, params=(), seed=None, skip=0, warmup=0, nLines=-1):
+    """`compare` memoized in a results store, simulating both engines in one pass unless both are stored."""
+    digest = resultStore.traceDigest(tracePath)
+    baselineConfig, etlbConfig = configs(params, seed)
+    baseline = resultStore.get(digest, baselineConfig, skip, warmup, nLines)
+    etlb = resultStore.get(digest, etlbConfig, skip, warmup, nLines)
+    if baseline is None or etlb is None:
+        baseline, etlb = compare(tracePath, params, seed, None, skip, warmup, nLines)
+        name = store.traceName(tracePath)
+        resultStore.put(digest, baselineConfig, baseline, skip, warmup, nLines, name)
+        resultStore.put(digest, etlbConfig, etlb, skip, warmup, nLines, name)
+    return baseline, etlb
+
+def pairedRow(baseline, etlb):
+    """One result record of a comparison, the columns of `hierarchy.results` prefixed by engine."""
+    row = {}
+    for engine, results in (('baseline', baseline), ('etlb', etlb)):
+        row.update({engine + '.' + k: v for k, v in results.items()})
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a memory trace through the baseline and ETLB engines in one pass.")
+    parser.add_argument('trace', nargs='?', default='-', help="binary, text or gem5 trace, default stdin")
+    parser.add_argument('-p', '--param', action='append', default=[], metavar='LEVEL.KEY=VALUE',
+                        help="hierarchy parameter, applied to each engine with that level (repeatable)")
+    parser.add_argument('-s', '--skip', type=int, default=0, help="accesses to drop from the start")
+    parser.add_argument('-w', '--warmup', type=int, default=0, help="accesses replayed without counting")
+    parser.add_argument('-n', '--limit', type=int, default=-1, help="accesses to count, -1 for the rest")
+    parser.add_argument('-f', '--format', choices=('text', 'gem5'), help="text trace format, detected by default")
+    parser.add_argument('--seed', type=int, help="seed of the page table offset of both engines (default 0)")
+    parser.add_argument('--csv', action='store_true', help="print one CSV record instead of the paired reports")
+    parser.add_argument('--store', metavar='DB', help="results store, runs already in it are not simulated again")
+    args = parser.parse_args()
+
+    if args.store is not None and (args.trace == '-' or args.format is not None):
+        parser.error("--store needs a trace file, with its format detected")
+    source = sys.stdin.buffer if args.trace == '-' else args.trace
+    try:
+        if args.store is not None:
+            baseline, etlb = storedCompare(store.Store(args.store), args.trace, args.param, args.seed, args.skip, args.warmup, args.limit)
+        else:
+            baseline, etlb = compare(source, args.param, args.seed, args.format, args.skip, args.warmup, args.limit)
+    except (ValueError, TypeError) as e:
+        parser.error(str(e))
+    if args.csv:
+        row = pairedRow(baseline, etlb)
+        print(','.join(row))
+        print(','.join(str(v) for v in row.values()))
+    else:
+        # Baseline then ETLB report, the pairs plot.py reads
+        print(hierarchy.report(baseline))
+        print(hierarchy.report(etlb))
+
+if __name__ == '__main__':
+    main()
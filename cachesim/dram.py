@@ -0,0 +1,210 @@
+#! /usr/bin/env python3
+import math
+from array import array
+import numpy as np
+import traceFile
+
+# Integer event counters of the DRAM, cycles and energy are priced from these when read
+DRAM_EVENTS = ('reads', 'writes', 'prefetchReads', 'rowHits', 'rowMisses', 'rowConflicts',
+               'timedRowHits', 'timedRowMisses', 'timedRowConflicts')
+# Timing (CPU cycles) and energy of the row buffer outcomes of an access, roughly DDR4-2400 behind
+# a 3 GHz core: a row hit is a column access (tCL), a row miss activates the row first (tRCD + tCL),
+# and a row conflict also precharges the open row (tRP) before the row miss
+DRAM_PRICES = {'rowHitTime': 42, 'rowMissTime': 84, 'prechargeTime': 42,
+               'rowHitEnergy': 2.5, 'rowMissEnergy': 4.5, 'prechargeEnergy': 1.0}
+
+def priceDRAM(events, prices):
+    """(cycles, energy) of the DRAM from its event counters and timing/energy, both dicts."""
+    cycles = (prices['rowHitTime'] * events['timedRowHits']
+              + prices['rowMissTime'] * (events['timedRowMisses'] + events['timedRowConflicts'])
+              + prices['prechargeTime'] * events['timedRowConflicts'])
+    energy = (prices['rowHitEnergy'] * events['rowHits']
+              + prices['rowMissEnergy'] * (events['rowMisses'] + events['rowConflicts'])
+              + prices['prechargeEnergy'] * events['rowConflicts'])
+    return cycles, energy
+
+class DRAM:
+
+
+    def __init__(self, nChannels=2, nBanks=16, rowSize=0x2000, cacheLine=64, pageTable=None):
+        """Main memory behind the last cache level, with an open row buffer per bank.
+
+        Consecutive lines fill a row, consecutive rows are interleaved over the channels and then
+        the banks of each channel (row:bank:channel:column). Each bank keeps its last row open, so
+        an access is a row hit, a row miss (the bank has no open row) or a row conflict (another row
+        is open and is precharged first). Bank contention, refresh and the bus are not modelled,
+        the open row of every bank is held in one flat array.
+
+        Parameters
+        ----------
+        nChannels (int):
+            Number of channels. (Default 2)
+        nBanks (int):
+            Number of banks per channel. (Default 16)
+        rowSize (int):
+            Bytes per row (the row buffer of a bank). (Default 0x2000 (8 kB))
+        cacheLine (int):
+            Bytes per access, the line size of the parent level. (Default 64)
+        pageTable (tlb.PageTable):
+            Translates the (virtual) addresses of the parent level to physical addresses, default is
+            None, which means addresses are physical.
+        """
+        self.nChannels = nChannels
+        self.nBanks = nBanks
+        self.rowSize = rowSize
+        self.cacheLine = cacheLine
+        self.pageTable = pageTable
+
+        self.rowBits = int(math.ceil(math.log2(self.rowSize)))
+        # Banks of every channel, indexed by bank * nChannels + channel
+        self.nBankTotal = self.nChannels * self.nBanks
+        # Open row of each bank, -1 when the bank is precharged
+        self.openRows = array('q', [-1] * self.nBankTotal)
+
+        self.rowHitTime = DRAM_PRICES['rowHitTime']
+        self.rowMissTime = DRAM_PRICES['rowMissTime']
+        self.prechargeTime = DRAM_PRICES['prechargeTime']
+        self.rowHitEnergy = DRAM_PRICES['rowHitEnergy']
+        self.rowMissEnergy = DRAM_PRICES['rowMissEnergy']
+        self.prechargeEnergy = DRAM_PRICES['prechargeEnergy']
+
+        # Line reads and writes (writebacks), and reads of the parent's prefetches
+        self.reads = 0
+        self.writes = 0
+        self.prefetchReads = 0
+        # Row buffer outcomes which cost energy, and those of them on the critical path (timed)
+        self.rowHits = 0
+        self.rowMisses = 0
+        self.rowConflicts = 0
+        self.timedRowHits = 0
+        self.timedRowMisses = 0
+        self.timedRowConflicts = 0
+
+    @property
+    def cycles(self):
+        """Cycles spent in the DRAM, priced from the event counters at the current timing."""
+        return priceDRAM(self.events(), self.prices())[0]
+
+    @property
+    def energy(self):
+        """Energy spent in the DRAM, priced from the event counters at the current energies."""
+        return priceDRAM(self.events(), self.prices())[1]
+
+    def events(self):
+        """The event counters of the DRAM, as a dict."""
+        return {k: getattr(self, k) for k in DRAM_EVENTS}
+
+    def prices(self):
+        """The timing and energy of the DRAM, as a dict."""
+        return {k: getattr(self, k) for k in DRAM_PRICES}
+
+    def access(self, address, write=False, count=True, countTime=None, countEnergy=None, batched=False, prefetch=False):
+        """Read or write the line holding an address.
+
+        Parameters
+        ----------
+        address (int):
+            The address which is accessed.
+        write (bool):
+            True if the access is a write, False for a read (default read).
+        count (bool):
+            Whether the access should be counted (default is True).
+        batched (bool):
+            Unused, accepted as for a Cache child.
+        prefetch (bool):
+            True for a prefetch of the parent level, counted in prefetchReads.
+        """
+        if countTime is None:
+            countTime = count
+
+        if countEnergy is None:
+            countEnergy = count
+
+        if self.pageTable is not None:
+            shift = self.pageTable.shift
+            address = (self.pageTable.translateVirt(address >> shift) << shift) | (address & ((1 << shift) - 1))
+        rows = address >> self.rowBits
+        bank = rows % self.nBankTotal
+        row = rows // self.nBankTotal
+        openRow = self.openRows[bank]
+        self.openRows[bank] = row
+
+        if countEnergy:
+            if prefetch:
+                self.prefetchReads += 1
+            elif write:
+                self.writes += 1
+            else:
+                self.reads += 1
+        if openRow == row:
+            if countEnergy:
+                self.rowHits += 1
+            if countTime:
+                self.timedRowHits += 1
+        elif openRow < 0:
+            if countEnergy:
+                self.rowMisses += 1
+            if countTime:
+                self.timedRowMisses += 1
+        else:
+            if countEnergy:
+                self.rowConflicts += 1
+            if countTime:
+                self.timedRowConflicts += 1
+
+    def access_many(self, addresses, writes=None, count_mask=None, chunkSize=0x10000):
+        """Access a batch of addresses, equivalent to calling `access` on each in order.
+
+        Banks and rows are computed with NumPy a chunk at a time, then the row buffers are walked in order.
+        """
+        addresses = np.asarray(addresses, dtype=np.uint64)
+        n = len(addresses)
+        if writes is None:
+            writes = np.zeros(n, dtype=bool)
+        if count_mask is None:
+            count_mask = np.ones(n, dtype=bool)
+        writes = np.asarray(writes, dtype=bool)
+        count_mask = np.asarray(count_mask, dtype=bool)
+
+        openRows = self.openRows
+        for start in range(0, n, chunkSize):
+            chunk = addresses[start:start + chunkSize]
+            if self.pageTable is not None:
+                shift = np.uint64(self.pageTable.shift)
+                # As PageTable.translateVirt, for the whole chunk
+                pages = (((chunk >> shift).astype(np.int64) - self.pageTable.offset) % (1 << self.pageTable.bits)).astype(np.uint64)
+                chunk = (pages << shift) | (chunk & ((np.uint64(1) << shift) - np.uint64(1)))
+            rows = chunk >> np.uint64(self.rowBits)
+            banks = (rows % np.uint64(self.nBankTotal)).tolist()
+            rows = (rows // np.uint64(self.nBankTotal)).tolist()
+            counts = count_mask[start:start + chunkSize]
+            chunkWrites = writes[start:start + chunkSize]
+            self.writes += int((chunkWrites & counts).sum())
+            self.reads += int((~chunkWrites & counts).sum())
+            for bank, row, count in zip(banks, rows, counts.tolist()):
+                openRow = openRows[bank]
+                openRows[bank] = row
+                if openRow == row:
+                    if count:
+                        self.rowHits += 1
+                        self.timedRowHits += 1
+                elif openRow < 0:
+                    if count:
+                        self.rowMisses += 1
+                        self.timedRowMisses += 1
+                elif count:
+                    self.rowConflicts += 1
+                    self.timedRowConflicts += 1
+
+def test():
+    dram = DRAM()
+    records = traceFile.readStdin()
+    addresses, writes, counts = traceFile.window(records)
+    dram.access_many(addresses, writes, counts)
+    N = int(counts.sum())
+    print("N:", N)
+    print("DRAM row hits: %d (%s), misses: %d, conflicts: %d"%(dram.rowHits, "%0.3f"%(dram.rowHits/N*100) if N else "n/a", dram.rowMisses, dram.rowConflicts))
+    print("DRAM time: %d, energy: %0.3f"%(dram.cycles, dram.energy))
+
+if __name__ == '__main__':
+    test()
@@ -1,27 +1,47 @@
 #! /usr/bin/env python
 import math
 import sys
+import numpy as np
 from hub import Hub
 from cache import Cache
-from tlb import TLB
+from tlb import TLB, PageTable
+from replacement import makePolicy
+from clt import CLTEntry, NOT_CACHED
+from prefetch import makePrefetcher
+import traceFile
+import checkpoint
 
 class ETLB:
     
 
-    def __init__(self, nLines=64, associativity=8, pageSize=0x1000, tlb=None, cache=None, hub=None):
-        """Simple associative cache.
+    def __init__(self, nLines=64, associativity=8, pageSize=0x1000, tlb=None, cache=None, hub=None, replacement='lru',
+                 prefetcher=None, prefetchDegree=None):
+        """Extended TLB (eTLB), an associative table of virtual pages holding the CLTs of the pages in the L1.
 
         Parameters
         ----------
 
-        size (int):
-            Cache size in bytes. (Default 0x8000 (32 kB))
-        associtivilty (int):
-            Number of ways for an associative cache, -1 for fully associative.
-        cacheLine (int):
-            Number of bytes per cache line, determiines the number of offset bits.
-        child (Cache):
-            The next level of cache, must be a hub for etlb, default is None, which means default Hub.
+        nLines (int):
+            Number of eTLB entries (pages). (Default 64)
+        associativity (int):
+            Number of ways, -1 for fully associative. (Default 8)
+        pageSize (int):
+            Bytes per page. (Default 0x1000 (4 kB))
+        tlb (tlb.TLB):
+            TLB translating the pages of eTLB misses (the eTLB takes the place of the L1 TLB), its
+            page table must have the eTLB page size. Default is None, which means a 1536 entry, 12 way TLB.
+        cache (Cache):
+            The L1, default is None, which means a 32 kB, 16 way L1.
+        hub (Hub):
+            The Hub and, behind it, the L2 and DRAM, default is None, which means a Hub of the eTLB's
+            associativity and page size, without DRAM.
+        replacement (str or class):
+            Replacement policy for eTLB entries, a name from `replacement.POLICIES` or a policy class (default 'lru').
+        prefetcher (str or class):
+            Prefetcher trained on the accesses to the eTLB, filling the L1 with lines of pages which have an
+            eTLB entry (see `prefetch`), default is None, which means no prefetching.
+        prefetchDegree (int):
+            How far ahead the prefetcher fetches, default is None, which means the prefetcher's default.
         """
         self.nLines = nLines
         self.associativity = associativity
@@ -29,6 +49,7 @@ class ETLB:
         self.cache = cache
         self.tlb = tlb
         self.pageSize = pageSize
+        self.prefetcher = makePrefetcher(prefetcher, prefetchDegree)
 
 
         if self.associativity == -1:
@@ -56,10 +77,16 @@ class ETLB:
         self.tagBits = 48 - self.setBits - self.pageBits - self.offsetBits
 
         if self.tlb is None:
-            self.tlb = TLB(512, self.tagBits + self.setBits)
+            self.tlb = TLB(1536, associativity=12, pageTable=PageTable(self.pageSize))
+            self.tlb.accessTime = 7
+            self.tlb.accessEnergy = 0.00221937
+        if self.tlb.pageTable.pageSize != self.pageSize:
+            raise ValueError("The page table must have the page size of the eTLB, 0x%x, not 0x%x"%(self.pageSize, self.tlb.pageTable.pageSize))
 
         self.freeList = [list(range(self.associativity)) for i in range(self.nSets)]
 
+        self.replacement = makePolicy(replacement, self.nSets, self.associativity)
+
         self.counter = 0
         self.entries = [[ETLBEntry(self.pageSize, self.cacheLine) for i in range(self.associativity)] for j in range(self.nSets)]
 
@@ -89,8 +116,73 @@ class ETLB:
 
         tag = address >> (self.setBits + self.pageBits + self.offsetBits)
 
+        self.accessDecoded(address, offset, pageIndex, setIndex, tag, write, count, countTime, countEnergy)
+        if self.prefetcher is not None:
+            for line in self.prefetcher.observe(address >> self.offsetBits):
+                self.prefetch(line << self.offsetBits, count if countEnergy is None else countEnergy)
+
+    def access_many(self, addresses, writes=None, count_mask=None, chunkSize=0x10000):
+        """Access a batch of addresses, equivalent to calling `access` on each in order.
+
+        Offsets, page indices, sets and tags are computed with NumPy a chunk at a time, and
+        the prefetcher is trained on a chunk at once.
+
+        Parameters
+        ----------
+        addresses (array of int):
+            The addresses which are accessed.
+        writes (array of bool):
+            True for each access which is a write, default None means all reads.
+        count_mask (array of bool):
+            Whether each access should be counted, default None counts all.
+        chunkSize (int):
+            Number of addresses decomposed at once.
+        """
+        addresses = np.asarray(addresses, dtype=np.uint64)
+        n = len(addresses)
+        if writes is None:
+            writes = np.zeros(n, dtype=bool)
+        if count_mask is None:
+            count_mask = np.ones(n, dtype=bool)
+        writes = np.asarray(writes, dtype=bool)
+        count_mask = np.asarray(count_mask, dtype=bool)
+
+        accessDecoded = self.accessDecoded
+        for start in range(0, n, chunkSize):
+            chunk = addresses[start:start + chunkSize]
+            offsets = (chunk % np.uint64(self.cacheLine)).tolist()
+            pageIndices = ((chunk >> np.uint64(self.offsetBits)) % np.uint64(1 << self.pageBits)).tolist()
+            setIndices = ((chunk >> np.uint64(self.offsetBits + self.pageBits)) % np.uint64(self.nSets)).tolist()
+            tags = (chunk >> np.uint64(self.setBits + self.pageBits + self.offsetBits)).tolist()
+            if self.prefetcher is None:
+                for address, offset, pageIndex, setIndex, tag, write, count in zip(chunk.tolist(), offsets, pageIndices, setIndices, tags,
+                                                                                   writes[start:start + chunkSize].tolist(),
+                                                                                   count_mask[start:start + chunkSize].tolist()):
+                    accessDecoded(address, offset, pageIndex, setIndex, tag, write, count, count, count)
+                continue
+            # Prefetches to issue after the access at each position, -1 ends the list
+            positions, candidates = self.prefetcher.observeMany((chunk >> np.uint64(self.offsetBits)).astype(np.int64))
+            positions = positions.tolist() + [-1]
+            candidates = (candidates << self.offsetBits).tolist()
+            p = 0
+            for i, (address, offset, pageIndex, setIndex, tag, write, count) in enumerate(zip(chunk.tolist(), offsets, pageIndices, setIndices, tags,
+                                                                                               writes[start:start + chunkSize].tolist(),
+                                                                                               count_mask[start:start + chunkSize].tolist())):
+                accessDecoded(address, offset, pageIndex, setIndex, tag, write, count, count, count)
+                while positions[p] == i:
+                    self.prefetch(candidates[p], count)
+                    p += 1
+
+    def accessDecoded(self, address, offset, pageIndex, setIndex, tag, write=False, count=True, countTime=None, countEnergy=None, memoryTime=None):
+        """Access an address which has already been split into offset, page index, set and tag.
+
+        `memoryTime` is whether a read of the line from DRAM is timed, default None means as
+        `countTime` (the refill after an eTLB miss times only its DRAM read).
+        """
         if countTime is None:
             countTime = count
+        if memoryTime is None:
+            memoryTime = countTime
 
         if countEnergy is None:
             countEnergy = count
@@ -100,38 +192,33 @@ class ETLB:
         for i,entry in enumerate(self.entries[setIndex]):
             if entry.valid and entry.vtag == tag:
                 hit = True
-                loc = entry.location[pageIndex]
-                way = entry.way[pageIndex]
+                loc, way = entry.lines.get(pageIndex, NOT_CACHED)
                 if count:
                     self.hit[loc] += 1
                 # Not in cache fig2c
                 if loc == 0:
-                    # Access to DRAM not simulated, send to CPU (step 2/3)
-                    # ((entry.paddr << self.pageBits) + pageIndex ) <<self.offsetBits) + offset
+                    # Access to DRAM, send to CPU (step 2/3)
+                    dram = self.hub.dram
+                    if dram is not None:
+                        dram.access(((entry.paddr << self.pageBits) + pageIndex) << self.offsetBits, False, False, memoryTime, countEnergy)
                     # Evict from L1 (step 4)
                     L1Set = (address >> (self.offsetBits + self.pageBits))  % self.cache.nSets
                     if len(self.cache.freeList[L1Set]) == 0:
                         self.evictCache(L1Set, countEnergy=countEnergy)
                     # Update Hub pointer, place data (step 5)
-                    L1Way = self.cache.freeList[L1Set].pop()
-                    self.cache.accessDirect(L1Set, L1Way, countTime=False, countEnergy=countEnergy)
-                    etlbPointer = (i << self.setBits) + setIndex
-                    hubWay = 0
-                    hubSet = entry.paddr % self.hub.nSets
-                    for j in range(self.hub.associativity):
-                        if self.hub.entries[hubSet][j].valid and self.hub.entries[hubSet][j].eTLBPointer == etlbPointer:
-                            hubWay = j
-                            break
-                    self.cache.tags[L1Set][L1Way] = (hubWay << self.hub.setBits) + (entry.paddr % self.hub.nSets)
+                    L1Way = self.cache.allocate(L1Set)
+                    self.cache.accessDirect(L1Set, L1Way, write, countTime=False, countEnergy=countEnergy)
+                    hubSet, hubWay = self.hub.pointers[(i << self.setBits) + setIndex]
+                    self.cache.setTag(L1Set, L1Way, (hubWay << self.hub.setBits) + hubSet)
     
                     # Update the CLT (step 6)
-                    entry.location[pageIndex] = 2 #L1D (unified L1)
-                    entry.way[pageIndex] = L1Way
+                    entry.place(pageIndex, 2, L1Way) #L1D (unified L1)
                 # In L1 (data and instruction caches unified, this needs to be split if those are split) fig2a
                 elif loc == 1 or loc == 2:
                     # access the L1 cache entry, send to CPU (step 2/3)
-                    cacheSetIndex = (address >> self.offsetBits) % self.cache.nSets
-                    self.cache.accessDirect(cacheSetIndex, way, countTime=countTime, countEnergy=countEnergy)
+                    # The L1 is indexed by virtual page, as where the line was placed
+                    L1Set = (address >> (self.offsetBits + self.pageBits))  % self.cache.nSets
+                    self.cache.accessDirect(L1Set, way, write, countTime=countTime, countEnergy=countEnergy)
                 # In L2 fig2b
                 elif loc == 3:
                     # access the L2 cache entry, send to CPU (step 2/3)
@@ -141,17 +228,27 @@ class ETLB:
                     L1Set = (address >> (self.offsetBits + self.pageBits))  % self.cache.nSets
                     if len(self.cache.freeList[L1Set]) == 0:
                         self.evictCache(L1Set, countEnergy=countEnergy)
+                        # The L1 victim moves into the L2 set of this line, and a replacement policy
+                        # other than LRU may evict this line from it to make room
+                        loc, way = entry.lines.get(pageIndex, NOT_CACHED)
                     # Update Hub pointer, place data (step 5)
-                    L1Way = self.cache.freeList[L1Set].pop()
-                    self.cache.accessDirect(L1Set, L1Way, countTime=False, countEnergy=countEnergy)
-                    self.cache.tags[L1Set][L1Way] = self.hub.cache.tags[cacheSetIndex][way]
+                    L1Way = self.cache.allocate(L1Set)
+                    self.cache.accessDirect(L1Set, L1Way, write, countTime=False, countEnergy=countEnergy)
+                    if loc == 3:
+                        self.cache.setTag(L1Set, L1Way, self.hub.cache.getTag(cacheSetIndex, way))
+                        # The line moves with its dirty state, so the L2 copy is not written back
+                        if self.hub.cache.clean(cacheSetIndex, way):
+                            self.cache.markDirty(L1Set, L1Way)
+
+                        # Free the L2 entry so it can be used again (Only one copy, which is now in L1)
+                        self.hub.cache.evict(cacheSetIndex, way, countEnergy=countEnergy)
+                    else:
+                        # The line was written back from the L2 and is placed as read from DRAM
+                        hubSet, hubWay = self.hub.pointers[(i << self.setBits) + setIndex]
+                        self.cache.setTag(L1Set, L1Way, (hubWay << self.hub.setBits) + hubSet)
     
                     # Update the CLT (step 6)
-                    entry.location[pageIndex] = 2 #L1D (unified L1)
-                    entry.way[pageIndex] = L1Way
-
-                    # Free the L2 entry so it can be used again (Only one copy, which is now in L1)
-                    self.hub.cache.evict(cacheSetIndex, way, countEnergy=countEnergy)
+                    entry.place(pageIndex, 2, L1Way) #L1D (unified L1)
                 # Invalid location
                 else:
                     raise ValueError("Location in CLT is invalid, expected 2 bit int, got %d"%loc)
@@ -166,65 +263,100 @@ class ETLB:
             if len(self.freeList[setIndex]) == 0:
                 self.evict(setIndex)
             way = self.freeList[setIndex].pop()
+            self.replacement.insert(setIndex, way)
             entry = self.entries[setIndex][way]
 
             # Update the virtual and physical address, calling the TLB (step 3)
             entry.vtag = tag
-            entry.paddr = self.tlb.translateVirt((tag << self.setBits) + setIndex)
+            entry.paddr = self.tlb.translateVirt((tag << self.setBits) + setIndex, count, countTime, countEnergy)
             addr = (((entry.paddr << self.pageBits) + pageIndex) << self.offsetBits) + offset
             # access the Hub (step 4)
             hubEntry = self.hub.access(addr, write=write, count=count, countEnergy=countEnergy, countTime=countTime)
 
             # Copy the CLT (step 5)
-            entry.way = hubEntry.way.copy()
-            entry.location = hubEntry.location.copy()
+            entry.copyCLT(hubEntry)
             entry.valid = True
 
-            hubSet = entry.paddr % self.hub.nSets
-
             # Update the eTLBPointer, and Valid bit (step 6)
-            hubEntry.eTLBValid = True
-            hubEntry.eTLBPointer = (way << self.setBits) + setIndex
-            self.access(address, write, count=False, countEnergy=True, countTime=False)
+            self.hub.link(addr, (way << self.setBits) + setIndex)
+            self.accessDecoded(address, offset, pageIndex, setIndex, tag, write, count=False, countTime=False, countEnergy=True, memoryTime=countTime)
         
         self.counter += 1
-        self.entries[setIndex][way].lastAccess = self.counter
+        self.replacement.touch(setIndex, way)
+
+    def prefetch(self, address, countEnergy=True):
+        """Fetch the line holding a virtual address into the L1 ahead of demand.
+
+        Only lines of pages with an eTLB entry are prefetched, found through its CLT as a
+        demand access finds them: a line in the L1 is dropped, a line in the L2 is moved up
+        and any other line is fetched from DRAM. The line is marked as prefetched in the L1
+        and every event is counted in the prefetch counters of the L1 and L2.
+        """
+        pageIndex = (address >> self.offsetBits) % (1 << self.pageBits)
+        setIndex = (address >> (self.offsetBits + self.pageBits)) % self.nSets
+        tag = address >> (self.setBits + self.pageBits + self.offsetBits)
+        for i, entry in enumerate(self.entries[setIndex]):
+            if entry.valid and entry.vtag == tag:
+                break
+        else:
+            # Prefetches do not cross into pages which are not in the eTLB
+            return
+        loc, way = entry.lines.get(pageIndex, NOT_CACHED)
+        if loc == 1 or loc == 2:
+            if countEnergy:
+                self.cache.prefetchHits += 1
+            return
+        if countEnergy:
+            self.cache.prefetchMisses += 1
+        L1Set = (address >> (self.offsetBits + self.pageBits)) % self.cache.nSets
+        if len(self.cache.freeList[L1Set]) == 0:
+            self.evictCache(L1Set, countEnergy=countEnergy)
+            # The L1 victim moves into the L2, which may evict this line from its L2 set
+            loc, way = entry.lines.get(pageIndex, NOT_CACHED)
+        L1Way = self.cache.allocate(L1Set)
+        if loc == 0:
+            # From DRAM, the L1 tag is the Hub pointer as for a demand access
+            if self.hub.dram is not None:
+                self.hub.dram.access(self.hub.lineAddress(entry.paddr, pageIndex), False, False, False, countEnergy, prefetch=True)
+            hubSet, hubWay = self.hub.pointers[(i << self.setBits) + setIndex]
+            self.cache.setTag(L1Set, L1Way, (hubWay << self.hub.setBits) + hubSet)
+        else:
+            # Moved up from the L2 with its dirty state, freeing the L2 way
+            cacheSetIndex = entry.paddr % self.hub.cache.nSets
+            if countEnergy:
+                self.hub.cache.prefetchReads += 1
+            self.cache.setTag(L1Set, L1Way, self.hub.cache.getTag(cacheSetIndex, way))
+            if self.hub.cache.clean(cacheSetIndex, way):
+                self.cache.markDirty(L1Set, L1Way)
+            self.hub.cache.evict(cacheSetIndex, way, countEnergy=countEnergy)
+        self.cache.markPrefetched(L1Set, L1Way, countEnergy)
+        entry.place(pageIndex, 2, L1Way) #L1D (unified L1)
 
     def evict(self, setNumber, way=None):
         """Evict (i.e. add to the free list) a cache line.
         
-        If `way` is None, LRU replacement policy is used among occupied lines.
+        If `way` is None, the replacement policy selects among occupied lines.
         If `way` is an integer, that integer is added to the free list.
         """
         if way is not None:
             if way not in self.freeList[setNumber]:
                 self.freeList[setNumber].append(way)
+                self.replacement.remove(setNumber, way)
             return way
         else:
-            way = 0
-            minAccess = self.entries[setNumber][0].lastAccess
-            entry = self.entries[setNumber][0]
-            for i,ent in enumerate(self.entries[setNumber]):
-                if i not in self.freeList[setNumber] and self.entries[setNumber][i].lastAccess < minAccess:
-                    way = i
-                    minAccess = self.entries[setNumber][i].lastAccess
-                    entry = self.entries[setNumber][i]
+            way = self.replacement.victim(setNumber)
+            entry = self.entries[setNumber][way]
 
             eTLBPointer = (way << self.setBits) + setNumber
-            hubSet = entry.paddr % self.hub.nSets
-            hubWay = -1
-            for i in range(self.hub.associativity):
-                if self.hub.entries[hubSet][i].eTLBPointer == eTLBPointer:
-                    hubWay = i
-                    break
-            if hubWay == -1:
+            if eTLBPointer not in self.hub.pointers:
                 raise RuntimeError("Entry not in hub when expected")
-            self.hub.entries[hubSet][hubWay].location = entry.location.copy()
-            self.hub.entries[hubSet][hubWay].way = entry.way.copy()
-            self.hub.entries[hubSet][hubWay].eTLBValid = False
+            hubSet, hubWay = self.hub.pointers[eTLBPointer]
+            self.hub.entries[hubSet][hubWay].copyCLT(entry)
+            self.hub.unlink(hubSet, hubWay)
 
             if way not in self.freeList[setNumber]:
                 self.freeList[setNumber].append(way)
+                self.replacement.remove(setNumber, way)
             return way
 
     def evictCache(self, setNumber, way=None, countEnergy=True):
@@ -232,64 +364,55 @@ class ETLB:
         # Select A Victim, acess its hub pointer (step 1)
         if way == None:
             way = self.cache.selectEviction(setNumber)
-        hubPointer = self.cache.tags[setNumber][way]
+        hubPointer = self.cache.getTag(setNumber, way)
+        hubSet = hubPointer % self.hub.nSets
+        hubWay = hubPointer >> self.hub.setBits
+        hubEntry = self.hub.entries[hubSet][hubWay]
 
-        # Find the set (step 2)
-        L2Set = hubPointer % self.hub.cache.nSets
+        # Find the set (step 2), the L2 is indexed by physical page as in the Hub and eTLB
+        L2Set = ((hubEntry.ptag << self.hub.setBits) + hubSet) % self.hub.cache.nSets
 
         # If needed, evict a line (step 3)
         if len(self.hub.cache.freeList[L2Set]) == 0:
             self.hub.evictCache(L2Set, countEnergy=countEnergy)
         # Move the data/hub pointer (step 4)
-        L2Way = self.hub.cache.freeList[L2Set].pop()
+        L2Way = self.hub.cache.allocate(L2Set)
         self.hub.cache.accessDirect(L2Set, L2Way, countTime=False, countEnergy=countEnergy)
-        self.hub.cache.tags[L2Set][L2Way] = hubPointer
+        self.hub.cache.setTag(L2Set, L2Way, hubPointer)
+        if self.cache.clean(setNumber, way):
+            self.hub.cache.markDirty(L2Set, L2Way)
 
         # Update the active CLT (step 5)
-        hubSet = hubPointer % self.hub.nSets
-        hubWay = hubPointer >> self.hub.setBits
-
-        hubEntry = self.hub.entries[hubSet][hubWay]
-
         if hubEntry.eTLBValid:
             etlbSet = hubEntry.eTLBPointer % self.nSets
             etlbWay = hubEntry.eTLBPointer >> self.setBits
             
-            entry = self.entries[etlbSet][etlbWay]
-            for pageIndex in range(entry.nEntries):
-                if entry.location[pageIndex] == 2 and entry.location[pageIndex] == way:
-                    entry.location[pageIndex] = 3 #L2
-                    entry.way[pageIndex] = L2Way
+            clt = self.entries[etlbSet][etlbWay]
         else:
-            for pageIndex in range(hubEntry.nEntries):
-                if hubEntry.location[pageIndex] == 2 and hubEntry.location[pageIndex] == way:
-                    hubEntry.location[pageIndex] = 3 #L2
-                    hubEntry.way[pageIndex] = L2Way
+            clt = hubEntry
+        # The victim is the line of the page in this way of the L1 (every line of a page shares an L1 set)
+        pageIndex = clt.find(2, way)
+        if pageIndex is not None:
+            clt.place(pageIndex, 3, L2Way) #L2
         # Actually evict
         self.cache.evict(setNumber, way, countEnergy=countEnergy)    
 
-class ETLBEntry:
-    
+class ETLBEntry(CLTEntry):
+
+    __slots__ = ('vtag', 'paddr', 'valid')
 
     def __init__(self, pageSize=0x1000, cacheLine=64):
+        CLTEntry.__init__(self, pageSize, cacheLine)
         self.vtag = 0
         self.paddr = 0
 
-        self.lastAccess = 0
-
-        self.pageSize = pageSize
-        self.cacheLine = cacheLine
-
-        self.nEntries = self.pageSize // self.cacheLine
-
         self.valid = False
-        self.location = [0] * self.nEntries
-        self.way = [0] * self.nEntries
-
-    
 
 def test():
-    etlb = ETLB()
+    # hierarchy builds on this module, so it is only imported to run the test
+    import hierarchy
+    # Built as replay.py builds it, with its L2 TLB, so both engines report their translation cost
+    etlb = hierarchy.build({'engine': 'etlb'})
     nLines = -1
     if len(sys.argv) > 1:
         nLines = int(sys.argv[1])
@@ -299,31 +422,20 @@ def test():
     warmup = 0
     if len(sys.argv) > 3:
         warmup = int(sys.argv[3])
-    counter = 0
-    for i, line in enumerate(sys.stdin):
-        if line.startswith('#eof'):
-            break
-        if i >= skip:
-            if i >= skip+warmup:
-                counter += 1
-            addr = int(line.split(' ')[1], 16)
-            #print(line, i)
-            etlb.access(addr, line[0]=='W', i >= skip + warmup)
-        if i + 1 == skip + warmup + nLines and nLines != -1:
-            break
-    print("N:", counter)
-    print("ETLB Hit, NIC %d, (%03f)"%(etlb.hit[0], etlb.hit[0]/(counter)*100))
-    print("ETLB Hit, L1D %d, (%03f)"%(etlb.hit[2], etlb.hit[2]/(counter)*100))
-    print("ETLB Hit, L2  %d, (%03f)"%(etlb.hit[3], etlb.hit[3]/(counter)*100))
-    print("ETLB Miss,    %d, (%03f)"%(etlb.miss, etlb.miss/(counter)*100))
-    print("Hub Hit, NIC %d, (%03f)"%(etlb.hub.hit[0], etlb.hub.hit[0]/(counter)*100))
-    print("Hub Hit, L1  %d, (%03f)"%(etlb.hub.hit[2], etlb.hub.hit[2]/(counter)*100))
-    print("Hub Hit, L2  %d, (%03f)"%(etlb.hub.hit[3], etlb.hub.hit[3]/(counter)*100))
-    print("Hub Miss,    %d, (%03f)"%(etlb.hub.miss, etlb.hub.miss/(counter)*100))
-
-    print("Time L1: %d, L2: %d, total: %d"%(etlb.cache.cycles, etlb.hub.cache.cycles, etlb.cache.cycles+etlb.hub.cache.cycles))
-    print("Energy L1: %0.3f, L2: %0.3f, total: %0.3f"%(etlb.cache.energy, etlb.hub.cache.energy, etlb.cache.energy+etlb.hub.cache.energy))
-
+    checkpointPath = None
+    if len(sys.argv) > 4:
+        checkpointPath = sys.argv[4]
+    position = skip + warmup
+    etlb, restored = checkpoint.resume(etlb, checkpointPath, position)
+    records = traceFile.readStdin()
+    addresses, writes, counts = traceFile.window(records, skip, warmup, nLines)
+    counter = int(counts.sum())
+    if not restored:
+        etlb.access_many(addresses[:warmup], writes[:warmup], counts[:warmup])
+        if checkpointPath is not None:
+            checkpoint.save(etlb, checkpointPath, position)
+    etlb.access_many(addresses[warmup:], writes[warmup:], counts[warmup:])
+    print(hierarchy.report(hierarchy.results(etlb, counter)))
 
 if __name__ == '__main__':
     test()
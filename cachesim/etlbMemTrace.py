@@ -1,9 +1,12 @@
 #! /usr/bin/env python3
 import sys
-from etlb import ETLB
+import hierarchy
+import traceFile
+import checkpoint
 
 def test():
-    etlb = ETLB()
+    # Built as replay.py builds it, with its L2 TLB, so both engines report their translation cost
+    etlb = hierarchy.build({'engine': 'etlb'})
     nLines = -1
     if len(sys.argv) > 1:
         nLines = int(sys.argv[1])
@@ -13,29 +16,20 @@ def test():
     warmup = 0
     if len(sys.argv) > 3:
         warmup = int(sys.argv[3])
-    counter = 0
-    for i, line in enumerate(sys.stdin):
-        if i >= skip:
-            if i >= skip+warmup:
-                counter += 1
-            addr = int(line.split(' ')[-3])
-            #print(line, i)
-            etlb.access(addr, 'Write' in line, i >= skip + warmup)
-        if i + 1 == skip + warmup + nLines and nLines != -1:
-            break
-    print("N:", counter)
-    print("ETLB Hit, NIC %d, (%03f)"%(etlb.hit[0], etlb.hit[0]/(counter)*100))
-    print("ETLB Hit, L1D %d, (%03f)"%(etlb.hit[2], etlb.hit[2]/(counter)*100))
-    print("ETLB Hit, L2  %d, (%03f)"%(etlb.hit[3], etlb.hit[3]/(counter)*100))
-    print("ETLB Miss,    %d, (%03f)"%(etlb.miss, etlb.miss/(counter)*100))
-    print("Hub Hit, NIC %d, (%03f)"%(etlb.hub.hit[0], etlb.hub.hit[0]/(counter)*100))
-    print("Hub Hit, L1  %d, (%03f)"%(etlb.hub.hit[2], etlb.hub.hit[2]/(counter)*100))
-    print("Hub Hit, L2  %d, (%03f)"%(etlb.hub.hit[3], etlb.hub.hit[3]/(counter)*100))
-    print("Hub Miss,    %d, (%03f)"%(etlb.hub.miss, etlb.hub.miss/(counter)*100))
-
-    print("Time L1: %d, L2: %d, total: %d"%(etlb.cache.cycles, etlb.hub.cache.cycles, etlb.cache.cycles+etlb.hub.cache.cycles))
-    print("Energy L1: %0.3f, L2: %0.3f, total: %0.3f"%(etlb.cache.energy, etlb.hub.cache.energy, etlb.cache.energy+etlb.hub.cache.energy))
-
+    checkpointPath = None
+    if len(sys.argv) > 4:
+        checkpointPath = sys.argv[4]
+    position = skip + warmup
+    etlb, restored = checkpoint.resume(etlb, checkpointPath, position)
+    records = traceFile.readStdin()
+    addresses, writes, counts = traceFile.window(records, skip, warmup, nLines)
+    counter = int(counts.sum())
+    if not restored:
+        etlb.access_many(addresses[:warmup], writes[:warmup], counts[:warmup])
+        if checkpointPath is not None:
+            checkpoint.save(etlb, checkpointPath, position)
+    etlb.access_many(addresses[warmup:], writes[warmup:], counts[warmup:])
+    print(hierarchy.report(hierarchy.results(etlb, counter)))
 
 if __name__ == '__main__':
     test()
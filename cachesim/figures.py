@@ -0,0 +1,195 @@
+#! /usr/bin/env python3
+import argparse
+import os
+import numpy as np
+import store
+
+# Accesses per level (per 1000 accesses) of each engine, sums of result columns.
+# The ETLB stack has two series: every access to a level, and those made directly by the eTLB
+ACCESSES = {
+    'baseline': {'total': {'L1': ('L1Hit',), 'L2': ('L2Hit',), 'Main Memory': ('L2Miss',)}},
+    'etlb': {'total': {'L1': ('etlbHitL1', 'hubHitL1'), 'L2': ('etlbHitL2', 'hubHitL2'),
+                       'Main Memory': ('etlbHitNIC', 'hubHitNIC', 'hubMiss')},
+             'direct': {'L1': ('etlbHitL1',), 'L2': ('etlbHitL2',), 'Main Memory': ('etlbHitNIC',)}},
+}
+LEVELS = ('L1', 'L2', 'Main Memory')
+# Time and energy are broken down into the caches, address translation (TLBs and page walks) and DRAM
+COSTS = {'L1': ('L1',), 'L2': ('L2',), 'TLB': ('L1TLB', 'L2TLB', 'pageTable'), 'DRAM': ('DRAM',)}
+# Prefetches are off the critical path, they add to the energy of the L1 and L2 but not to their time
+PREFETCH_ENERGY = {'L1': ('L1PrefetchEnergy',), 'L2': ('L2PrefetchEnergy',)}
+HATCHES = ('', '//', '..', 'xx', '\\\\', 'oo')
+# Run columns which are not part of the config but still tell configs apart
+RUN_COLUMNS = ('skip', 'warmup', 'nLines', 'seed')
+
+def column(runs, name):
+    """A column of the runs as floats, NaN where a run does not have it."""
+    if name not in runs.dtype.names:
+        return np.full(len(runs), np.nan)
+    values = runs[name]
+    if values.dtype.kind == 'U':
+        return np.full(len(runs), np.nan)
+    return values.astype(np.float64)
+
+def labels(runs):
+    """A label per run of its config: the engine and the parameters (and `RUN_COLUMNS`) which differ between its runs."""
+    out = np.asarray(runs['engine'], dtype=object)
+    for engine in np.unique(runs['engine']):
+        mask = runs['engine'] == engine
+        for name in runs.dtype.names:
+            if ('.' in name or name in RUN_COLUMNS) and len(np.unique(runs[name][mask])) > 1:
+                out[mask] = out[mask] + ' ' + name + '=' + runs[name][mask].astype(str).astype(object)
+    return out.astype(str)
+
+def grid(runs):
+    """Arrange runs by benchmark and config.
+
+    Returns (benchmarks, configs, engines, index), `index[b, c]` being the run of benchmark
+    b under config c or -1 where it was not run. Configs are in order of first appearance.
+    Raises ValueError when a benchmark has two runs with the same label, e.g. of two
+    different traces stored under one name.
+    """
+    benchmarks, b = np.unique(runs['name'], return_inverse=True)
+    configLabels = labels(runs)
+    configs, first, c = np.unique(configLabels, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    index = np.full((len(benchmarks), len(configs)), -1)
+    cells = b * len(configs) + c
+    unique, counts = np.unique(cells, return_counts=True)
+    if (counts > 1).any():
+        cell = unique[counts > 1][0]
+        raise ValueError("Benchmark '%s' has %d runs of config '%s', select one with --where"
+                         %(benchmarks[cell // len(configs)], counts[counts > 1][0], configs[cell % len(configs)]))
+    index[b, rank[c]] = np.arange(len(runs))
+    return benchmarks, configs[order], runs['engine'][first[order]], index
+
+def gather(values, index):
+    """values[index] with NaN where index is -1."""
+    out = np.where(index >= 0, values[np.maximum(index, 0)], np.nan)
+    return out
+
+def breakdowns(runs, reference=0):
+    """Access, time and energy breakdowns of every benchmark under every config, as arrays.
+
+    Parameters
+    ----------
+    runs (structured array):
+        Runs from `store.Store.table`.
+    reference (int):
+        Config which time and energy are normalised to (default the first).
+
+    Returns a dict of benchmarks, configs, engines and
+    accesses {(series, level): array [benchmark, config]} per 1000 accesses (NaN where a series does not apply),
+    time and energy {'L1'|'L2'|'TLB': array [benchmark, config]} relative to the reference total.
+    """
+    benchmarks, configs, engines, index = grid(runs)
+    # Runs which counted no access have no rates (NaN) rather than dividing by zero
+    N = gather(column(runs, 'N'), index)
+    N = np.where(N > 0, N, np.nan)
+    accesses = {}
+    for series in ('total', 'direct'):
+        for level in LEVELS:
+            values = np.full(index.shape, np.nan)
+            for engine, seriesColumns in ACCESSES.items():
+                if series not in seriesColumns:
+                    continue
+                total = sum(column(runs, name) for name in seriesColumns[series][level])
+                mask = np.asarray(engines == engine)[np.newaxis, :] & (index >= 0)
+                values = np.where(mask, gather(total, index) / N * 1000, values)
+            accesses[(series, level)] = values
+    out = {'benchmarks': benchmarks, 'configs': configs, 'engines': engines, 'accesses': accesses}
+    for metric, suffix in (('time', 'Cycles'), ('energy', 'Energy')):
+        # Runs stored before translation or DRAM were modelled have no TLB or DRAM columns, which then cost nothing
+        costs = {part: gather(sum(np.nan_to_num(column(runs, name)) for name in
+                                  [level + suffix for level in levels] + list(PREFETCH_ENERGY.get(part, ()) if metric == 'energy' else ())), index)
+                 for part, levels in COSTS.items()}
+        norm = sum(costs.values())[:, reference:reference + 1]
+        norm = np.where(norm > 0, norm, np.nan)
+        out[metric] = {part: cost / norm for part, cost in costs.items()}
+    return out
+
+def writeCSV(result, path):
+    """Write the breakdowns as one row per benchmark and config."""
+    benchmarks, configs = result['benchmarks'], result['configs']
+    columns = [('accesses', series, level) for series, level in result['accesses']]
+    columns += [(metric, '', part) for metric in ('time', 'energy') for part in COSTS]
+    with open(path, 'w') as f:
+        f.write('benchmark,config,' + ','.join(('%s %s %s'%c).replace('  ', ' ') for c in columns) + '\n')
+        for b, benchmark in enumerate(benchmarks):
+            for c, config in enumerate(configs):
+                values = [result[metric][(series, level)] if metric == 'accesses' else result[metric][level] for metric, series, level in columns]
+                f.write('%s,%s,'%(benchmark, config) + ','.join('%g'%v[b, c] for v in values) + '\n')
+
+def plot(result, directory='.'):
+    """Save Accesses.png, Time.png and Energy.png in `directory`, without a display."""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    from matplotlib.patches import Patch
+
+    benchmarks, configs = result['benchmarks'], result['configs']
+    nBench, nConfig = len(benchmarks), len(configs)
+    # One bar per config and series present, grouped by benchmark
+    bars = [(c, series) for c in range(nConfig) for series in ('total', 'direct')
+            if not np.isnan(result['accesses'][(series, 'L1')][:, c]).all()]
+    width = 0.8 / len(bars)
+    index = np.arange(nBench)
+    colours = {c: 'C%d'%(c % 10) for c in range(nConfig)}
+
+    fig, axes = plt.subplots(len(LEVELS), 1, sharex=True, figsize=(max(6.4, nBench * 0.6), 4.8))
+    for ax, level in zip(axes, LEVELS):
+        for i, (c, series) in enumerate(bars):
+            label = configs[c] + (' (direct)' if series == 'direct' else '')
+            ax.bar(index + i * width, result['accesses'][(series, level)][:, c], width=width, color=colours[c],
+                   hatch='//' if series == 'direct' else None, label=label)
+        ax.set_ylabel(level)
+    axes[-1].set_xticks(index + width * (len(bars) - 1) / 2)
+    axes[-1].set_xticklabels(benchmarks, rotation=90 if nBench > 12 else 0)
+    axes[0].legend(fontsize='small', loc='upper left', bbox_to_anchor=(1, 1))
+    fig.savefig(os.path.join(directory, 'Accesses.png'), bbox_inches='tight')
+    plt.close(fig)
+
+    # Stacked L1/L2/TLB/DRAM bars, one per config told apart by its hatch
+    width = 0.8 / nConfig
+    for metric, ylabel, colours in (('time', 'Relative speed', ('C0', 'C1', 'C4', 'C7')), ('energy', 'Relative Energy Use', ('C3', 'C2', 'C4', 'C7'))):
+        fig, ax = plt.subplots(figsize=(max(6.4, nBench * 0.6), 4.8))
+        for c in range(nConfig):
+            hatch = HATCHES[c % len(HATCHES)]
+            bottom = np.zeros(nBench)
+            for part, colour in zip(COSTS, colours):
+                values = result[metric][part][:, c]
+                ax.bar(index + c * width, values, width=width, color=colour, hatch=hatch, bottom=bottom, label=part if c == 0 else None)
+                bottom = bottom + np.nan_to_num(values)
+        ax.set_ylabel(ylabel)
+        ax.set_xticks(index + width * (nConfig - 1) / 2)
+        ax.set_xticklabels(benchmarks, rotation=90 if nBench > 12 else 0)
+        handles = ax.get_legend_handles_labels()[0]
+        handles += [Patch(facecolor='white', edgecolor='black', hatch=HATCHES[c % len(HATCHES)], label=configs[c]) for c in range(nConfig)]
+        ax.legend(handles=handles, fontsize='small', loc='upper left', bbox_to_anchor=(1, 1))
+        fig.savefig(os.path.join(directory, metric.capitalize() + '.png'), bbox_inches='tight')
+        plt.close(fig)
+
+def main():
+    parser = argparse.ArgumentParser(description="Access, time and energy figures of the runs in a results store.")
+    parser.add_argument('store', help="results store (see store.py)")
+    parser.add_argument('-o', '--output', default='.', help="directory of the figures and breakdowns.csv")
+    parser.add_argument('--where', default='', help="SQL condition selecting runs, e.g. \"skip = 0\"")
+    parser.add_argument('--reference', type=int, default=0, help="config time and energy are normalised to (default the first)")
+    parser.add_argument('--no-plot', action='store_true', help="only write breakdowns.csv")
+    args = parser.parse_args()
+
+    runs = store.Store(args.store).table(args.where)
+    if len(runs) == 0:
+        parser.error("no runs in %s"%args.store)
+    try:
+        result = breakdowns(runs, args.reference)
+    except ValueError as e:
+        parser.error(str(e))
+    os.makedirs(args.output, exist_ok=True)
+    writeCSV(result, os.path.join(args.output, 'breakdowns.csv'))
+    if not args.no_plot:
+        plot(result, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+import inspect
+import random
+from cache import Cache, EVENTS, PREFETCH_EVENTS, DEFAULT_PRICES, priceCycles, priceEnergy, pricePrefetches
+from hub import Hub
+from etlb import ETLB
+from tlb import TLB, PageTable, TLB_EVENTS, WALK_EVENTS, TLB_PRICES, WALK_PRICES, priceTLB, priceWalks, parseRegions
+from dram import DRAM, DRAM_EVENTS, DRAM_PRICES, priceDRAM
+
+# Cache arguments which are passed to the constructor, everything else is set as an attribute
+CACHE_ARGS = ('size', 'associativity', 'cacheLine', 'replacement', 'writeBack', 'writeAllocate', 'prefetcher', 'prefetchDegree')
+TLB_ARGS = ('nEntries', 'associativity', 'replacement')
+PAGE_TABLE_ARGS = ('pageSize', 'regions', 'levels')
+DRAM_ARGS = ('nChannels', 'nBanks', 'rowSize')
+# TLB levels, the eTLB takes the place of the L1 TLB so only the baseline has one
+TLB_LEVELS = ('L1TLB', 'L2TLB')
+
+# Defaults of the hierarchies in cache.test() and etlb.test()
+BASELINE = {
+    'L1': {'size': 0x8000},
+    'L2': {'size': 0x100000, 'associativity': 16, 'accessTime': 8, 'tagTime': 3,
+           'accessEnergy': 0.137789, 'tagEnergy': 0.00538836},
+    # The L1 TLB is looked up in parallel with the (virtually indexed) L1 tags
+    'L1TLB': {'nEntries': 64, 'associativity': 4, 'accessTime': 0},
+    'L2TLB': {'nEntries': 1536, 'associativity': 12, 'accessTime': 7, 'accessEnergy': 0.00221937},
+    'pageTable': {},
+    'DRAM': {},
+}
+ETLB_STACK = {
+    'etlb': {'nLines': 64, 'associativity': 8, 'pageSize': 0x1000},
+    'hub': {'nLines': 0x1000},
+    'L1': {'size': 0x8000, 'associativity': 16, 'accessTime': 4, 'tagTime': 1,
+           'accessEnergy': 0.0111033, 'tagEnergy': 0.000539962},
+    'L2': {'size': 0x100000, 'associativity': 16, 'accessTime': 7, 'tagTime': 3,
+           'accessEnergy': 0.136191, 'tagEnergy': 0.00221937},
+    'L2TLB': {'nEntries': 1536, 'associativity': 12, 'accessTime': 7, 'accessEnergy': 0.00221937},
+    'pageTable': {},
+    'DRAM': {},
+}
+ENGINES = ('baseline', 'etlb')
+
+def makeLevel(cls, args, params, **kwargs):
+    """Build a level from a dict of constructor arguments (those in `args`) and timing/energy attributes."""
+    level = cls(**kwargs, **{k: v for k, v in params.items() if k in args})
+    for k, v in params.items():
+        if k not in args:
+            if not hasattr(level, k):
+                raise ValueError("Unknown %s parameter '%s'"%(cls.__name__, k))
+            setattr(level, k, v)
+    return level
+
+def makeCache(params, child=None, tlb=None):
+    """Build a Cache from a dict of constructor arguments and timing/energy attributes."""
+    return makeLevel(Cache, CACHE_ARGS, params, child=child, tlb=tlb)
+
+def makeTLB(params, child=None, pageTable=None):
+    """Build a TLB from a dict of constructor arguments and timing/energy attributes."""
+    return makeLevel(TLB, TLB_ARGS, params, child=child, pageTable=pageTable)
+
+def makePageTable(params, seed=None):
+    """Build a PageTable from a dict of constructor arguments and timing/energy attributes.
+
+    Pages are mapped at the offset drawn from `seed` (seed 0 if None), so every build of a config translates alike.
+    """
+    pageTable = makeLevel(PageTable, PAGE_TABLE_ARGS, params)
+    pageTable.offset = random.Random(0 if seed is None else seed).randint(0, (1 << pageTable.bits) - 1)
+    return pageTable
+
+def makeDRAM(params, cacheParams, pageTable=None):
+    """Build the DRAM behind a last level cache (of parameters `cacheParams`) from a dict of constructor arguments and timing/energy attributes."""
+    return makeLevel(DRAM, DRAM_ARGS, params, cacheLine=cacheParams.get('cacheLine', defaults(Cache)['cacheLine']), pageTable=pageTable)
+
+def levels(config):
+    """Per level parameters of a config, merged over the defaults of its engine."""
+    engine = config.get('engine', 'baseline')
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine '%s', expected one of %s"%(engine, ', '.join(ENGINES)))
+    defaults = BASELINE if engine == 'baseline' else ETLB_STACK
+    for level in config:
+        if level not in ('engine', 'seed') and level not in defaults:
+            raise ValueError("Unknown %s level '%s', expected one of %s"%(engine, level, ', '.join(defaults)))
+    return {level: dict(params, **config.get(level, {})) for level, params in defaults.items()}
+
+def defaults(cls):
+    """Constructor defaults of a level class."""
+    return {k: p.default for k, p in inspect.signature(cls).parameters.items() if p.default is not inspect.Parameter.empty}
+
+def fullConfig(config):
+    """A config with the defaults of every level filled in, so equal hierarchies have equal configs."""
+    engine = config.get('engine', 'baseline')
+    seed = config.get('seed')
+    full = {'engine': engine, 'seed': 0 if seed is None else seed}
+    cacheDefaults = dict({k: v for k, v in defaults(Cache).items() if k in CACHE_ARGS}, **DEFAULT_PRICES)
+    tlbDefaults = dict({k: v for k, v in defaults(TLB).items() if k in TLB_ARGS}, **TLB_PRICES)
+    pageTableDefaults = dict({k: v for k, v in defaults(PageTable).items() if k in PAGE_TABLE_ARGS}, **WALK_PRICES)
+    dramDefaults = dict({k: v for k, v in defaults(DRAM).items() if k in DRAM_ARGS}, **DRAM_PRICES)
+    for level, params in levels(config).items():
+        if level in ('L1', 'L2'):
+            full[level] = dict(cacheDefaults, **params)
+        elif level in TLB_LEVELS:
+            full[level] = dict(tlbDefaults, **params)
+        elif level == 'pageTable':
+            full[level] = dict(pageTableDefaults, **params)
+        elif level == 'DRAM':
+            full[level] = dict(dramDefaults, **params)
+        elif level == 'etlb':
+            full[level] = dict({k: v for k, v in defaults(ETLB).items() if k not in ('tlb', 'cache', 'hub')}, **params)
+    if engine == 'etlb':
+        # The Hub takes its associativity and page size from the eTLB unless they are given,
+        # the page table always has the eTLB page size
+        hubDefaults = dict({k: v for k, v in defaults(Hub).items() if k != 'cache'},
+                           associativity=full['etlb']['associativity'], pageSize=full['etlb']['pageSize'])
+        full['hub'] = dict(hubDefaults, **levels(config)['hub'])
+        full['pageTable']['pageSize'] = full['etlb']['pageSize']
+    full['pageTable']['regions'] = [list(region) for region in parseRegions(full['pageTable']['regions'])]
+    return full
+
+def baseline(config=None):
+    """Build the L1/L2 hierarchy of cache.test() behind an L1/L2 TLB and in front of DRAM, returning (L1, L2).
+
+    `config['seed']` fixes the page table offset the DRAM sees physical addresses at (seed 0 by default).
+    """
+    config = config or {}
+    params = levels(dict(config, engine='baseline'))
+    pageTable = makePageTable(params['pageTable'], config.get('seed'))
+    # The caches are virtually addressed, the DRAM maps physical addresses to banks and rows
+    L2 = makeCache(params['L2'], child=makeDRAM(params['DRAM'], params['L2'], pageTable))
+    L2TLB = makeTLB(params['L2TLB'], pageTable=pageTable)
+    L1 = makeCache(params['L1'], child=L2, tlb=makeTLB(params['L1TLB'], child=L2TLB))
+    return L1, L2
+
+def etlbStack(config=None):
+    """Build the ETLB/Hub stack of etlb.test().
+
+    `config['seed']` fixes the page table offset (seed 0 by default).
+    """
+    config = config or {}
+    params = levels(dict(config, engine='etlb'))
+    for level in ('L1', 'L2'):
+        if params[level].get('prefetcher') is not None:
+            raise ValueError("The eTLB stack prefetches into the L1 through etlb.prefetcher, not %s.prefetcher"%level)
+    etlbParams = params['etlb']
+    hubParams = dict({'associativity': etlbParams.get('associativity', 8),
+                      'pageSize': etlbParams.get('pageSize', 0x1000)}, **params['hub'])
+    hub = Hub(cache=makeCache(params['L2']), dram=makeDRAM(params['DRAM'], params['L2']), **hubParams)
+    pageTable = makePageTable(dict(params['pageTable'], pageSize=etlbParams.get('pageSize', 0x1000)), config.get('seed'))
+    etlb = ETLB(cache=makeCache(params['L1']), hub=hub, tlb=makeTLB(params['L2TLB'], pageTable=pageTable), **etlbParams)
+    return etlb
+
+def build(config):
+    """Build the top level of a config, the object whose access/access_many is called."""
+    if config.get('engine', 'baseline') == 'baseline':
+        return baseline(config)[0]
+    return etlbStack(config)
+
+def results(top, N):
+    """Counters of a built hierarchy after a run of N counted accesses, as a flat dict."""
+    if isinstance(top, ETLB):
+        L1, L2, dram = top.cache, top.hub.cache, top.hub.dram
+        row = {'N': N,
+               'etlbHitNIC': top.hit[0], 'etlbHitL1': top.hit[2], 'etlbHitL2': top.hit[3], 'etlbMiss': top.miss,
+               'hubHitNIC': top.hub.hit[0], 'hubHitL1': top.hub.hit[2], 'hubHitL2': top.hub.hit[3], 'hubMiss': top.hub.miss}
+    else:
+        L1, L2, dram = top, top.child, top.child.child
+        row = {'N': N, 'L1Hit': L1.hit, 'L1Miss': L1.miss, 'L2Hit': L2.hit, 'L2Miss': L2.miss}
+    row.update({'L1Cycles': L1.cycles, 'L2Cycles': L2.cycles, 'L1Energy': L1.energy, 'L2Energy': L2.energy})
+    for level, cache in (('L1', L1), ('L2', L2)):
+        for event in EVENTS[2:]:
+            row[column(level, event)] = getattr(cache, event)
+    if any(prefetcher is not None for prefetcher in (top.prefetcher, L1.prefetcher, L2.prefetcher)):
+        for level, cache in (('L1', L1), ('L2', L2)):
+            row.update({level + 'PrefetchCycles': cache.prefetchCycles, level + 'PrefetchEnergy': cache.prefetchEnergy})
+            for event in PREFETCH_EVENTS:
+                row[column(level, event)] = getattr(cache, event)
+    if dram is not None:
+        row.update({'DRAMCycles': dram.cycles, 'DRAMEnergy': dram.energy})
+        for event in DRAM_EVENTS:
+            row[column('DRAM', event)] = getattr(dram, event)
+    tlbs = tlbLevels(top)
+    for level, tlb in tlbs:
+        row.update({level + 'Hit': tlb.hit, level + 'Miss': tlb.miss, level + 'Cycles': tlb.cycles, level + 'Energy': tlb.energy})
+        for event in TLB_EVENTS[2:]:
+            row[column(level, event)] = getattr(tlb, event)
+    if tlbs:
+        pageTable = tlbs[-1][1].pageTable
+        row.update({'pageTableCycles': pageTable.cycles, 'pageTableEnergy': pageTable.energy})
+        for event in WALK_EVENTS:
+            row[column('pageTable', event)] = getattr(pageTable, event)
+    return row
+
+def tlbLevels(top):
+    """(level, TLB) of each TLB of a built hierarchy, first to last."""
+    if isinstance(top, ETLB):
+        return [('L2TLB', top.tlb)]
+    out = []
+    tlb = top.tlb
+    for level in TLB_LEVELS:
+        if tlb is None:
+            break
+        out.append((level, tlb))
+        tlb = tlb.child
+    return out
+
+def percent(count, N, format='%0.3f'):
+    """`count` as a percentage of N accesses, or "n/a" when no access was counted."""
+    return format%(count/N*100) if N else "n/a"
+
+def report(row):
+    """Text report of a results row, in the format printed by cache.py and etlb.py (read by plot.py)."""
+    N = row['N']
+    if 'etlbMiss' in row:
+        lines = ["N: %d"%N]
+        for name, key in (("ETLB Hit, NIC", 'etlbHitNIC'), ("ETLB Hit, L1D", 'etlbHitL1'), ("ETLB Hit, L2 ", 'etlbHitL2'), ("ETLB Miss,   ", 'etlbMiss'),
+                          ("Hub Hit, NIC", 'hubHitNIC'), ("Hub Hit, L1 ", 'hubHitL1'), ("Hub Hit, L2 ", 'hubHitL2'), ("Hub Miss,   ", 'hubMiss')):
+            lines.append("%s %d, (%s)"%(name, row[key], percent(row[key], N, '%03f')))
+    else:
+        lines = ["N: %d"%N]
+        for name, key in (("L1 hit: ", 'L1Hit'), ("L1 miss:", 'L1Miss'), ("L2 hit: ", 'L2Hit'), ("L2 miss:", 'L2Miss')):
+            lines.append("%s %d (%s)"%(name, row[key], percent(row[key], N)))
+    lines.append("Time L1: %d, L2: %d, total: %d"%(row['L1Cycles'], row['L2Cycles'], row['L1Cycles']+row['L2Cycles']))
+    lines.append("Energy L1: %0.3f, L2: %0.3f, total: %0.3f"%(row['L1Energy'], row['L2Energy'], row['L1Energy']+row['L2Energy']))
+    if 'L1PrefetchFills' in row:
+        lines.append("Prefetch " + ", ".join("%s fills: %d, useful: %d"%(level, row[level + 'PrefetchFills'], row[level + 'UsefulPrefetches']) for level in ('L1', 'L2'))
+                     + ", time: %d, energy: %0.3f"%(row['L1PrefetchCycles'] + row['L2PrefetchCycles'], row['L1PrefetchEnergy'] + row['L2PrefetchEnergy']))
+    if 'DRAMCycles' in row:
+        lines.append("DRAM reads: %d, writes: %d, row hits: %d, misses: %d, conflicts: %d"%(row['DRAMReads'], row['DRAMWrites'], row['DRAMRowHits'], row['DRAMRowMisses'], row['DRAMRowConflicts']))
+        lines.append("DRAM time: %d, energy: %0.3f"%(row['DRAMCycles'], row['DRAMEnergy']))
+    if 'pageTableCycles' in row:
+        tlbs = [level for level in TLB_LEVELS if level + 'Hit' in row]
+        lines.append("TLB " + ", ".join("%s hit: %d, miss: %d"%(level[:2], row[level + 'Hit'], row[level + 'Miss']) for level in tlbs)
+                     + ", walks: %d"%row['pageTableWalks'])
+        translation = tlbs + ['pageTable']
+        lines.append("Translation time: %d, energy: %0.3f"%(sum(row[level + 'Cycles'] for level in translation), sum(row[level + 'Energy'] for level in translation)))
+    return '\n'.join(lines)
+
+def column(level, event):
+    """Name of the results column of an event counter, e.g. 'L1TagProbes'."""
+    return level + event[0].upper() + event[1:]
+
+def price(row, config=None):
+    """Cycles and energy of a results row re-priced under the timing and energy of a config.
+
+    Only the event counters of the row are used, so a run can be re-priced under any
+    timing/energy model without simulating it again. Returns a new row.
+    """
+    config = dict(config or {}, engine=row.get('engine', (config or {}).get('engine', 'baseline')))
+    params = levels(config)
+    row = dict(row)
+    for level in ('L1', 'L2'):
+        prices = dict(DEFAULT_PRICES, **{k: v for k, v in params[level].items() if k in DEFAULT_PRICES})
+        events = {event: row.get(column(level, event), 0) for event in EVENTS[2:]}
+        row[level + 'Cycles'] = priceCycles(events, prices)
+        row[level + 'Energy'] = priceEnergy(events, prices)
+        if level + 'PrefetchCycles' in row:
+            events = {event: row.get(column(level, event), 0) for event in PREFETCH_EVENTS}
+            row[level + 'PrefetchCycles'], row[level + 'PrefetchEnergy'] = pricePrefetches(events, prices)
+    for level in TLB_LEVELS:
+        if level + 'Hit' in row:
+            prices = dict(TLB_PRICES, **{k: v for k, v in params.get(level, {}).items() if k in TLB_PRICES})
+            events = {event: row.get(column(level, event), 0) for event in TLB_EVENTS[2:]}
+            row[level + 'Cycles'], row[level + 'Energy'] = priceTLB(events, prices)
+    if 'pageTableWalks' in row:
+        prices = dict(WALK_PRICES, **{k: v for k, v in params['pageTable'].items() if k in WALK_PRICES})
+        events = {event: row.get(column('pageTable', event), 0) for event in WALK_EVENTS}
+        row['pageTableCycles'], row['pageTableEnergy'] = priceWalks(events, prices)
+    if 'DRAMCycles' in row:
+        prices = dict(DRAM_PRICES, **{k: v for k, v in params['DRAM'].items() if k in DRAM_PRICES})
+        events = {event: row.get(column('DRAM', event), 0) for event in DRAM_EVENTS}
+        row['DRAMCycles'], row['DRAMEnergy'] = priceDRAM(events, prices)
+    return row
@@ -2,29 +2,40 @@
 import math
 import sys
 from cache import Cache
+from replacement import makePolicy
+from clt import CLTEntry, NOT_CACHED
 
 class Hub:
     
 
-    def __init__(self, nLines=0x1000, associativity=8, pageSize=0x1000, cache=None):
-        """Simple associative cache.
+    def __init__(self, nLines=0x1000, associativity=8, pageSize=0x1000, cache=None, replacement='lru', dram=None):
+        """Hub of the eTLB stack, an associative table of physical pages in front of the L2.
+
+        Each entry holds the CLT of a page, which is copied to the eTLB while the page
+        has an eTLB entry. The L2 lines hold hub pointers instead of address tags.
 
         Parameters
         ----------
 
-        size (int):
-            Cache size in bytes. (Default 0x8000 (32 kB))
-        associtivilty (int):
-            Number of ways for an associative cache, -1 for fully associative.
-        cacheLine (int):
-            Number of bytes per cache line, determiines the number of offset bits.
-        child (Cache):
-            The next level of cache, must be a hub for etlb, default is None, which means default Hub.
+        nLines (int):
+            Number of Hub entries (pages). (Default 0x1000)
+        associativity (int):
+            Number of ways, -1 for fully associative. (Default 8)
+        pageSize (int):
+            Bytes per page, must be the eTLB page size. (Default 0x1000 (4 kB))
+        cache (Cache):
+            The L2, whose line size is that of the stack, default is None, which means a 1 MB, 16 way L2.
+        replacement (str or class):
+            Replacement policy for Hub entries, a name from `replacement.POLICIES` or a policy class (default 'lru').
+        dram (dram.DRAM):
+            The memory behind the L2, read by the eTLB for lines which are not cached and written by
+            writebacks, default is None, which means DRAM is not simulated.
         """
         self.nLines = nLines
         self.associativity = associativity
         self.pageSize = pageSize
         self.cache = cache
+        self.dram = dram
         self.eTLB = None #set in ETLB, circular refererence
 
         if self.associativity == -1:
@@ -48,8 +59,16 @@ class Hub:
 
         self.freeList = [list(range(self.associativity)) for i in range(self.nSets)]
 
+        self.replacement = makePolicy(replacement, self.nSets, self.associativity)
+
         self.counter = 0
         self.entries = [[HubEntry(self.pageSize, self.cacheLine) for i in range(self.associativity)] for j in range(self.nSets)]
+        # Lowest way holding each ptag in a set, and the number of ways holding a ptag
+        # already held by a lower way (every entry starts out with ptag 0)
+        self.tagIndex = [{0: 0} for i in range(self.nSets)]
+        self.duplicates = [self.associativity - 1] * self.nSets
+        # eTLBPointer -> (hubSet, hubWay) of the entry whose CLT is active in that eTLB entry
+        self.pointers = {}
 
         self.hit = [0,0,0,0] #DRAM,L1I,L1D,L2  Note: L1 is actually a unified cache at present, for forward compatability if separate caches are ever implemented
         self.miss = 0
@@ -63,9 +82,11 @@ class Hub:
             The address which is accessed.
         write (bool):
             True if the access is a write, False for a read (default read).
-            This parameter is unused currently, but maintained for future use.
+            The lookup is the same for both, the eTLB marks the line dirty when it places it.
         count (bool):
             Whether hit/miss rate should be counted (default is True).
+
+        Returns the entry of the page, which is installed on a miss.
         """
         offset = address % self.cacheLine
         pageIndex = (address >> self.offsetBits) % (1 << self.pageBits)
@@ -80,87 +101,149 @@ class Hub:
             countEnergy = count
 
         # Hub Hit
-        hit = False
-        for i,entry in enumerate(self.entries[setIndex]):
-            if entry.ptag == tag:
-                hit = True
-                loc = entry.location[pageIndex]
-                way = entry.way[pageIndex]
-                if count:
-                    self.hit[loc] += 1
-                return entry
+        way = self.tagIndex[setIndex].get(tag)
+        if way is not None:
+            entry = self.entries[setIndex][way]
+            if entry.valid:
+                self.replacement.touch(setIndex, way)
+            else:
+                # Entry which was never installed (tag 0), take it off the free list
+                self.freeList[setIndex].remove(way)
+                self.replacement.insert(setIndex, way)
+                entry.valid = True
+            loc = entry.lines.get(pageIndex, NOT_CACHED)[0]
+            if count:
+                self.hit[loc] += 1
+            return entry
 
         # Hub Miss fig3e
-        if not hit:
-            if count:
-                self.miss += 1
-
-            # select a victim step 1
-            if len(self.freeList[setIndex]) == 0:
-                way = self.evict(setIndex)
-                hubEntry = self.entrys[setIndex][way]
-                L1Set = hubEntry.eTLBPointer % self.eTLB.cache.nSets
-                L2Set = hubEntry.ptag % self.cache.nSets
-
-                # Walk CLT, and evict (step 2)
-                for i,loc,w in zip(range(hubEntry.nEntries), hubentry.location, hubentry.way):
-                    if loc == 0: # not in cache
-                        pass
-                    elif loc == 1 or loc == 2: # In L1, combined instr/data, split if caches split
-                        self.eTLB.evictCache(L1Set, w, countEnergy=countEnergy)
-                    elif loc == 3: # In L2
-                        self.evictCache(L2Set, w, countEnergy=countEnergy)
-                
-                etlbSet = hubEntry.eTLBPointer % self.eTLB.nSets
-                etlbWay = hubEntry.eTLBPointer >> self.eTLB.setBits
-
-                # invalidate the eTLB CLT (step 3)
-                self.eTLB.entries[etlbSet][etlbWay].valid = False
-                
-            # Install the new page (step 4)
-            way = self.freeList[setIndex].pop()
-            entry = self.entries[setIndex][way]
-            entry.ptag = tag
-            entry.eTLBValid = False
-            entry.location = [0] * entry.nEntries
-            entry.valid = True
-            
-        
+        if count:
+            self.miss += 1
+
+        # select a victim step 1
+        if len(self.freeList[setIndex]) == 0:
+            self.evict(setIndex, countEnergy=countEnergy)
+
+        # Install the new page (step 4)
+        way = self.freeList[setIndex].pop()
+        self.replacement.insert(setIndex, way)
+        self.setTag(setIndex, way, tag)
+        entry = self.entries[setIndex][way]
+        entry.eTLBValid = False
+        # Lines left in the CLT are stale, moved through the eTLB entry of the page last held here
+        entry.lines.clear()
+        entry.valid = True
+
         self.counter += 1
-        self.entries[setIndex][way].lastAccess = self.counter
-        return self.entries[setIndex][way]
+        return entry
+
+    def setTag(self, setIndex, way, tag):
+        """Store `tag` in an entry, keeping the per set ptag index up to date."""
+        index = self.tagIndex[setIndex]
+        entries = self.entries[setIndex]
+        oldTag = entries[way].ptag
+        if index[oldTag] != way:
+            self.duplicates[setIndex] -= 1
+        elif self.duplicates[setIndex] == 0:
+            del index[oldTag]
+        else:
+            for other in range(way + 1, self.associativity):
+                if entries[other].ptag == oldTag:
+                    index[oldTag] = other
+                    self.duplicates[setIndex] -= 1
+                    break
+            else:
+                del index[oldTag]
+        entries[way].ptag = tag
+        lowest = index.get(tag)
+        if lowest is None:
+            index[tag] = way
+        else:
+            self.duplicates[setIndex] += 1
+            if way < lowest:
+                index[tag] = way
+
+    def lineAddress(self, paddr, pageIndex):
+        """Physical address of line `pageIndex` of physical page `paddr`."""
+        return ((paddr << self.pageBits) + pageIndex) << self.offsetBits
 
-    def evict(self, setNumber, way=None):
-        """Evict (i.e. add to the free list) a cache line.
+    def link(self, address, eTLBPointer):
+        """Mark the entry for a physical address as active in the eTLB entry at `eTLBPointer`."""
+        setIndex = (address >> (self.offsetBits + self.pageBits))  % self.nSets
+        tag = address >> (self.setBits + self.pageBits + self.offsetBits)
+        way = self.tagIndex[setIndex][tag]
+        if eTLBPointer in self.pointers:
+            self.unlink(*self.pointers[eTLBPointer])
+        entry = self.entries[setIndex][way]
+        entry.eTLBValid = True
+        entry.eTLBPointer = eTLBPointer
+        self.pointers[eTLBPointer] = (setIndex, way)
+
+    def unlink(self, setIndex, way):
+        """Mark an entry as no longer active in the eTLB."""
+        entry = self.entries[setIndex][way]
+        if entry.eTLBValid:
+            entry.eTLBValid = False
+            if self.pointers.get(entry.eTLBPointer) == (setIndex, way):
+                del self.pointers[entry.eTLBPointer]
+
+    def evict(self, setNumber, way=None, countEnergy=True):
+        """Evict (i.e. add to the free list) a page, evicting its lines from the caches.
         
-        If `way` is None, LRU replacement policy is used among occupied lines.
+        If `way` is None, the replacement policy selects among occupied lines.
         If `way` is an integer, that integer is added to the free list.
         """
-        if way is not None:
+        if way is None:
+            way = self.replacement.victim(setNumber)
+        entry = self.entries[setNumber][way]
+        if entry.valid:
+            self.evictPage(setNumber, way, countEnergy=countEnergy)
+            entry.valid = False
             self.freeList[setNumber].append(way)
-            return way
-        else:
-            index = 0
-            minAccess = self.entries[setNumber][0].lastAccess
-            for i,acc in enumerate(self.entries[setNumber]):
-                if i not in self.freeList[setNumber] and self.entries[setNumber][i].lastAccess < minAccess:# and self.entries[setNumber][i].etlbValid == False:
-                    index = i
-                    minAccess = self.entries[setNumber][i].lastAccess
-            if index not in self.freeList[setNumber]:
-                self.freeList[setNumber].append(index)
-            self.entries[setNumber][index].eTLBValid = False
-            return index
+            self.replacement.remove(setNumber, way)
+        return way
+
+    def evictPage(self, setNumber, way, countEnergy=True):
+        """Evict every cached line of a page and invalidate its eTLB entry (fig3e steps 2 and 3)."""
+        entry = self.entries[setNumber][way]
+        clt = entry
+        if entry.eTLBValid:
+            etlbSet = entry.eTLBPointer % self.eTLB.nSets
+            etlbWay = entry.eTLBPointer >> self.eTLB.setBits
+            clt = self.eTLB.entries[etlbSet][etlbWay]
+
+        paddr = (entry.ptag << self.setBits) + setNumber
+        # The L1 is indexed by the virtual page, which the eTLB's TLB translates back to
+        L1Set = self.eTLB.tlb.translatePhys(paddr) % self.eTLB.cache.nSets
+        L2Set = paddr % self.cache.nSets
+
+        # Walk CLT, and evict (step 2), only the cached lines are stored
+        for pageIndex, loc, w in clt.cached():
+            if loc == 1 or loc == 2: # In L1, combined instr/data, split if caches split
+                if self.dram is not None and self.eTLB.cache.dirty[L1Set * self.eTLB.cache.associativity + w]:
+                    self.dram.access(self.lineAddress(paddr, pageIndex), True, False, countEnergy=countEnergy)
+                self.eTLB.cache.evict(L1Set, w, countEnergy=countEnergy)
+            elif loc == 3: # In L2
+                self.evictCache(L2Set, w, countEnergy=countEnergy)
+        clt.clear()
+
+        # invalidate the eTLB CLT (step 3)
+        if entry.eTLBValid:
+            clt.valid = False
+            self.unlink(setNumber, way)
+            self.eTLB.evict(etlbSet, etlbWay)
 
     def evictCache(self, setNumber, way=None, countEnergy=True):
         # Fig3f
         # Select A Victim, acess its hub pointer (step 1)
         if way == None:
             way = self.cache.selectEviction(setNumber)
-        hubPointer = self.cache.tags[setNumber][way]
+        hubPointer = self.cache.getTag(setNumber, way)
 
-        # Move the data/hub pointer (step 4)
-        # Access to DRAM not simultated
-        self.cache.accessDirect(setNumber, way, write=False, countEnergy=countEnergy)
+        # Move the data/hub pointer (step 4), only dirty lines are read out to be written back
+        dirty = self.cache.dirty[setNumber * self.cache.associativity + way]
+        if dirty:
+            self.cache.accessDirect(setNumber, way, write=False, countEnergy=countEnergy)
 
         # Update the active CLT (step 5)
         hubSet = hubPointer % self.nSets
@@ -169,38 +252,31 @@ class Hub:
         hubEntry = self.entries[hubSet][hubWay]
 
         if hubEntry.eTLBValid:
-            etlbSet = hubEntry.eTLBPointer % self.nSets
-            etlbWay = hubEntry.eTLBPointer >> self.setBits
+            etlbSet = hubEntry.eTLBPointer % self.eTLB.nSets
+            etlbWay = hubEntry.eTLBPointer >> self.eTLB.setBits
 
-            entry = self.entries[etlbSet][etlbWay]
-            for pageIndex in range(entry.nEntries):
-                if entry.location[pageIndex] == 2 and entry.location[pageIndex] == way:
-                    entry.location[pageIndex] = 0 #NIC
+            clt = self.eTLB.entries[etlbSet][etlbWay]
         else:
-            for pageIndex in range(hubEntry.nEntries):
-                if hubEntry.location[pageIndex] == 2 and hubEntry.location[pageIndex] == way:
-                    hubEntry.location[pageIndex] = 0 #NIC
+            clt = hubEntry
+        # The victim is the line of the page in this way of the L2 (every line of a page shares an L2 set)
+        pageIndex = clt.find(3, way)
+        if pageIndex is not None:
+            clt.place(pageIndex, 0, 0) #NIC
+            if dirty and self.dram is not None:
+                self.dram.access(self.lineAddress((hubEntry.ptag << self.setBits) + hubSet, pageIndex), True, False, countEnergy=countEnergy)
         # Actually evict
         self.cache.evict(setNumber, way, countEnergy=countEnergy)
 
 
-class HubEntry:
-    
+class HubEntry(CLTEntry):
+
+    __slots__ = ('ptag', 'eTLBValid', 'instrOrData', 'eTLBPointer', 'valid')
 
     def __init__(self, pageSize=0x1000, cacheLine=64):
+        CLTEntry.__init__(self, pageSize, cacheLine)
         self.ptag = 0
         self.eTLBValid = False
         self.instrOrData = True # Data, unused at present
         self.eTLBPointer = 0
 
-        self.lastAccess = 0
-
-        self.pageSize = pageSize
-        self.cacheLine = cacheLine
-
-        self.nEntries = self.pageSize // self.cacheLine
-
         self.valid = False
-        self.location = [0] * self.nEntries
-        self.way = [0] * self.nEntries
-
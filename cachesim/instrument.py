@@ -0,0 +1,350 @@
+#! /usr/bin/env python3
+import sys
+import time
+import numpy as np
+from cache import Cache
+from etlb import ETLB
+
+# Wall clock phases of the simulator, lookup excludes the evictions made within it
+PHASES = ('parse', 'lookup', 'evict')
+# CLT locations: not cached, L1I, L1D, L2
+LOCATIONS = ('NIC', 'L1I', 'L1D', 'L2')
+# Reuse buckets: 0 for the first access of a line, k for a reuse time in [2**(k-1), 2**k)
+REUSE_BUCKETS = 65
+
+def reuseBuckets(distances):
+    """Log2 bucket of each reuse time (>= 1), see REUSE_BUCKETS."""
+    return np.frexp(distances.astype(np.float64))[1]
+
+class Instrument:
+
+
+    def __init__(self):
+        """Optional instrumentation of a built hierarchy.
+
+        `attach` shadows the methods of each level with wrappers on the instance and points
+        the CLT entries of an ETLB stack at the transition counts, so a hierarchy which is
+        not attached runs the same code as before, and `detach` removes them again.
+        Everything is counted in NumPy arrays:
+
+        - per set accesses, misses and evictions of every level (`<level>.accesses`, ...),
+        - a histogram of reuse times (accesses to the level since the previous access to
+          the same line, in log2 buckets) of each level accessed as a cache,
+        - CLT location moves between NIC/L1I/L1D/L2 of an ETLB stack (`clt.transitions`),
+          counted where the CLT is written (`CLTEntry.place` and `clear`),
+        - wall clock time of the parse, lookup and evict phases (`phases.seconds`).
+
+        Accesses and misses are those which are counted, so they sum to the hit/miss
+        counters of the level. The L1 and L2 of an ETLB stack are accessed directly by
+        the eTLB and Hub, their accesses are their timed data accesses and they have no
+        misses or reuse histogram. An attached hierarchy can not be checkpointed.
+        """
+        self.arrays = {}
+        self.transitions = np.zeros((len(LOCATIONS), len(LOCATIONS)), dtype=np.int64)
+        self.seconds = np.zeros(len(PHASES))
+        self.calls = np.zeros(len(PHASES), dtype=np.int64)
+        self.wrapped = []
+        # CLT entries counting into self.transitions
+        self.counting = []
+        self.looking = False
+        self.evicting = False
+
+    def attach(self, top):
+        """Instrument every level of a hierarchy built by `hierarchy.build`, returning top."""
+        if isinstance(top, ETLB):
+            self.attachCLT(top)
+            self.attachETLB(top)
+            self.attachHub(top.hub)
+            self.attachCache('L1', top.cache, owned=True)
+            self.attachCache('L2', top.hub.cache, owned=True)
+            self.timeLookup(top, 'access_many', 'access')
+        else:
+            level = top
+            depth = 1
+            # Every Cache level, down to the DRAM
+            while isinstance(level, Cache):
+                self.attachCache('L%d'%depth, level)
+                level = level.child
+                depth += 1
+            self.timeLookup(top, 'access_many', 'access')
+        return top
+
+    def detach(self):
+        """Remove every wrapper, restoring the methods of the levels."""
+        for level, name in reversed(self.wrapped):
+            level.__dict__.pop(name, None)
+        self.wrapped = []
+        for entry in self.counting:
+            entry.transitions = None
+        self.counting = []
+
+    def wrap(self, level, name, wrapper):
+        """Shadow a method of a level with `wrapper(method)` on the instance."""
+        setattr(level, name, wrapper(getattr(level, name)))
+        self.wrapped.append((level, name))
+
+    def counters(self, name, nSets, keys):
+        arrays = {}
+        for key in keys:
+            arrays[key] = self.arrays['%s.%s'%(name, key)] = np.zeros(REUSE_BUCKETS if key == 'reuse' else nSets, dtype=np.int64)
+        return arrays
+
+    def attachCache(self, name, cache, owned=False):
+        """Instrument a Cache, `owned` when it is the L1 or L2 of an ETLB stack."""
+        if owned:
+            arrays = self.counters(name, cache.nSets, ('accesses', 'evictions'))
+            accesses = arrays['accesses']
+
+            def accessDirect(method):
+                def accessDirect(setIndex, way, write=False, countTime=True, countEnergy=True):
+                    if countTime:
+                        accesses[setIndex] += 1
+                    return method(setIndex, way, write, countTime, countEnergy)
+                return accessDirect
+            self.wrap(cache, 'accessDirect', accessDirect)
+        else:
+            arrays = self.counters(name, cache.nSets, ('accesses', 'misses', 'evictions', 'reuse'))
+            accesses, misses, reuse = arrays['accesses'], arrays['misses'], arrays['reuse']
+            # Last position in the level's access stream of each line, and the position of the last access
+            lastUse = {}
+            state = {'position': 0, 'batch': False}
+
+            def access(method):
+                def access(address, write=False, count=True, countTime=None, countEnergy=None, batched=False, prefetch=False):
+                    if prefetch:
+                        # Prefetches of the parent level are not demand accesses
+                        return method(address, write, count, countTime, countEnergy, batched, prefetch)
+                    setIndex = (address >> cache.offsetBits) % cache.nSets
+                    if count and cache.tagIndex[setIndex].get(address >> (cache.setBits + cache.offsetBits)) is None:
+                        misses[setIndex] += 1
+                    if not state['batch']:
+                        state['position'] += 1
+                        line = address >> cache.offsetBits
+                        previous = lastUse.get(line)
+                        lastUse[line] = state['position']
+                        if count:
+                            accesses[setIndex] += 1
+                            reuse[0 if previous is None else (state['position'] - previous).bit_length()] += 1
+                    return method(address, write, count, countTime, countEnergy, batched, prefetch)
+                return access
+
+            def access_many(method):
+                def access_many(addresses, writes=None, count_mask=None, chunkSize=0x10000):
+                    addresses = np.asarray(addresses, dtype=np.uint64)
+                    mask = np.ones(len(addresses), dtype=bool) if count_mask is None else np.asarray(count_mask, dtype=bool)
+                    lines = addresses >> np.uint64(cache.offsetBits)
+                    sets = (lines % np.uint64(cache.nSets)).astype(np.intp)
+                    accesses[:] += np.bincount(sets[mask], minlength=cache.nSets)
+                    reuse[:] += np.bincount(self.reuseTimes(lines, lastUse, state)[mask], minlength=REUSE_BUCKETS)
+                    state['batch'] = True
+                    try:
+                        return method(addresses, writes, count_mask, chunkSize)
+                    finally:
+                        state['batch'] = False
+                return access_many
+            self.wrap(cache, 'access', access)
+            self.wrap(cache, 'access_many', access_many)
+        self.wrap(cache, 'evict', self.countEvictions(cache, arrays['evictions']))
+
+    def reuseTimes(self, lines, lastUse, state):
+        """Reuse bucket of each of a batch of line accesses, updating `lastUse` once per distinct line."""
+        n = len(lines)
+        positions = state['position'] + 1 + np.arange(n, dtype=np.int64)
+        state['position'] += n
+        order = np.argsort(lines, kind='stable')
+        ordered = lines[order]
+        repeat = ordered[1:] == ordered[:-1]
+        previous = np.zeros(n, dtype=np.int64)
+        previous[order[1:][repeat]] = positions[order[:-1][repeat]]
+        first = order[np.concatenate(([True], ~repeat))]
+        previous[first] = [lastUse.get(line, 0) for line in lines[first].tolist()]
+        last = order[np.concatenate((~repeat, [True]))]
+        lastUse.update(zip(lines[last].tolist(), positions[last].tolist()))
+        return np.where(previous == 0, 0, reuseBuckets(positions - previous))
+
+    def countEvictions(self, level, evictions):
+        """Wrapper of an evict method counting the ways it frees, timed as an evict phase."""
+        def wrapper(method):
+            def evict(setNumber, *args, **kwargs):
+                free = len(level.freeList[setNumber])
+                result = self.timeEvict(method, setNumber, *args, **kwargs)
+                evictions[setNumber] += len(level.freeList[setNumber]) - free
+                return result
+            return evict
+        return wrapper
+
+    def attachCLT(self, etlb):
+        """Count the location moves of the CLT of every eTLB and Hub entry into `transitions`."""
+        for entries in (etlb.entries, etlb.hub.entries):
+            for entrySet in entries:
+                for entry in entrySet:
+                    entry.transitions = self.transitions
+                    self.counting.append(entry)
+
+    def attachETLB(self, etlb):
+        arrays = self.counters('etlb', etlb.nSets, ('accesses', 'misses', 'evictions'))
+        accesses, misses = arrays['accesses'], arrays['misses']
+
+        def accessDecoded(method):
+            def accessDecoded(address, offset, pageIndex, setIndex, tag, write=False, count=True, countTime=None, countEnergy=None, memoryTime=None):
+                if count:
+                    accesses[setIndex] += 1
+                    if not any(entry.valid and entry.vtag == tag for entry in etlb.entries[setIndex]):
+                        misses[setIndex] += 1
+                return method(address, offset, pageIndex, setIndex, tag, write, count, countTime, countEnergy, memoryTime)
+            return accessDecoded
+
+        def evictCache(method):
+            def evictCache(setNumber, way=None, countEnergy=True):
+                return self.timeEvict(method, setNumber, way, countEnergy)
+            return evictCache
+
+        self.wrap(etlb, 'accessDecoded', accessDecoded)
+        self.wrap(etlb, 'evict', self.countEvictions(etlb, arrays['evictions']))
+        self.wrap(etlb, 'evictCache', evictCache)
+
+    def attachHub(self, hub):
+        arrays = self.counters('hub', hub.nSets, ('accesses', 'misses', 'evictions'))
+        accesses, misses = arrays['accesses'], arrays['misses']
+
+        def access(method):
+            def access(address, write=False, count=True, countTime=None, countEnergy=None):
+                if count:
+                    setIndex = (address >> (hub.offsetBits + hub.pageBits)) % hub.nSets
+                    accesses[setIndex] += 1
+                    if hub.tagIndex[setIndex].get(address >> (hub.setBits + hub.pageBits + hub.offsetBits)) is None:
+                        misses[setIndex] += 1
+                return method(address, write, count, countTime, countEnergy)
+            return access
+
+        def evictPage(method):
+            def evictPage(setNumber, way, countEnergy=True):
+                return self.timeEvict(method, setNumber, way, countEnergy)
+            return evictPage
+
+        def evictCache(method):
+            def evictCache(setNumber, way=None, countEnergy=True):
+                return self.timeEvict(method, setNumber, way, countEnergy)
+            return evictCache
+
+        self.wrap(hub, 'access', access)
+        self.wrap(hub, 'evict', self.countEvictions(hub, arrays['evictions']))
+        self.wrap(hub, 'evictPage', evictPage)
+        self.wrap(hub, 'evictCache', evictCache)
+
+    def timeEvict(self, method, *args, **kwargs):
+        """Call an evict method, timing the outermost one as the evict phase."""
+        if self.evicting:
+            return method(*args, **kwargs)
+        self.evicting = True
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.evicting = False
+            self.seconds[2] += elapsed
+            self.calls[2] += 1
+            if self.looking:
+                self.seconds[1] -= elapsed
+
+    def timeLookup(self, top, *names):
+        """Time the outermost calls of the access methods of the top level as the lookup phase."""
+        def wrapper(method):
+            def timed(*args, **kwargs):
+                if self.looking:
+                    return method(*args, **kwargs)
+                self.looking = True
+                start = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    self.looking = False
+                    self.seconds[1] += time.perf_counter() - start
+                    self.calls[1] += 1
+            return timed
+        for name in names:
+            self.wrap(top, name, wrapper)
+
+    def timed(self, chunks):
+        """Iterate over chunks (e.g. of `traceFile.readChunks`), timing each as the parse phase."""
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                self.seconds[0] += time.perf_counter() - start
+            self.calls[0] += 1
+            yield chunk
+
+    def stats(self):
+        """Every counter as a dict of arrays, keyed '<level>.<counter>', 'clt.transitions' and 'phases.*'."""
+        stats = dict(self.arrays)
+        stats['clt.transitions'] = self.transitions
+        stats['phases.seconds'] = self.seconds
+        stats['phases.calls'] = self.calls
+        return stats
+
+    def save(self, path):
+        """Save the counters to a compressed .npz file."""
+        np.savez_compressed(path, **self.stats())
+
+def summary(stats, top=5):
+    """Text summary of instrumentation counters (`Instrument.stats` or a loaded .npz)."""
+    lines = []
+    for name in sorted({key.split('.')[0] for key in stats} - {'clt', 'phases'}):
+        accesses = stats[name + '.accesses']
+        evictions = stats[name + '.evictions']
+        line = "%-5s accesses %d, evictions %d"%(name, accesses.sum(), evictions.sum())
+        if name + '.misses' in stats:
+            line += ", misses %d"%stats[name + '.misses'].sum()
+        lines.append(line)
+        if accesses.sum():
+            hottest = np.argsort(accesses, kind='stable')[::-1][:top]
+            lines.append("      hottest sets: " + ", ".join("%d (%d)"%(s, accesses[s]) for s in hottest))
+            lines.append("      set accesses min/mean/max: %d/%0.1f/%d"%(accesses.min(), accesses.mean(), accesses.max()))
+        if name + '.reuse' in stats and stats[name + '.reuse'].sum():
+            reuse = stats[name + '.reuse']
+            lines.append("      reuse: first use %d, "%reuse[0] + ", ".join("<%d: %d"%(1 << k, reuse[k]) for k in np.flatnonzero(reuse[1:]) + 1))
+    transitions = stats['clt.transitions']
+    if transitions.sum():
+        lines.append("CLT moves (from \\ to): " + " ".join("%6s"%l for l in LOCATIONS))
+        for i, l in enumerate(LOCATIONS):
+            lines.append("%21s: "%l + " ".join("%6d"%v for v in transitions[i]))
+    lines.append("Phases: " + ", ".join("%s %0.3fs (%d calls)"%(phase, s, c) for phase, s, c in zip(PHASES, stats['phases.seconds'], stats['phases.calls'])))
+    return '\n'.join(lines)
+
+def heatmaps(stats, path, width=64):
+    """Draw the per set accesses, misses and evictions of every level into one image, without a display."""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+
+    maps = [(key, stats[key]) for key in sorted(stats) if key.split('.')[1] in ('accesses', 'misses', 'evictions')]
+    fig, axes = plt.subplots(len(maps), 1, figsize=(6.4, 1.6 * len(maps)), squeeze=False)
+    for ax, (key, counts) in zip(axes[:, 0], maps):
+        rows = -(-len(counts) // width)
+        grid = np.full(rows * width, np.nan)
+        grid[:len(counts)] = counts
+        image = ax.imshow(grid.reshape(rows, width), aspect='auto', interpolation='nearest')
+        ax.set_title(key, fontsize='small')
+        ax.set_yticks([])
+        fig.colorbar(image, ax=ax)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+def main():
+    if len(sys.argv) < 2:
+        print("usage: instrument.py <profile.npz> [heatmaps.png]")
+        sys.exit(1)
+    stats = dict(np.load(sys.argv[1]))
+    print(summary(stats))
+    if len(sys.argv) > 2:
+        heatmaps(stats, sys.argv[2])
+
+if __name__ == '__main__':
+    main()
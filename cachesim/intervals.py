@@ -0,0 +1,161 @@
+#! /usr/bin/env python3
+import sys
+import numpy as np
+import hierarchy
+
+class Intervals:
+
+
+    def __init__(self, period=100000, capacity=1024):
+        """Interval statistics: the counters of a hierarchy every `period` accesses.
+
+        `attach` shadows access/access_many of the top level on the instance (as
+        `instrument.Instrument` does), splitting batches at interval boundaries and
+        snapshotting the counters of `hierarchy.results` (hits, misses, cycles, energy and
+        event counters of every level) into a preallocated array, so nothing is allocated
+        per access. `series` returns the per interval deltas.
+
+        Parameters
+        ----------
+        period (int):
+            Accesses (counted or not) per interval.
+        capacity (int):
+            Intervals allocated up front, doubled whenever it runs out
+            (e.g. the trace length // period + 1 for a single allocation).
+        """
+        self.period = period
+        self.top = None
+        self.columns = None
+        self.data = None
+        self.starts = np.zeros(capacity + 1, dtype=np.int64)
+        self.nRows = 0
+        self.position = 0
+        self.counted = 0
+        self.busy = False
+
+    def attach(self, top):
+        """Start recording the intervals of a built top level, returning it."""
+        self.top = top
+        first = hierarchy.results(top, 0)
+        self.columns = tuple(first)
+        self.data = np.zeros((len(self.starts), len(self.columns)))
+        self.snapshot(first)
+
+        access = top.access
+        access_many = top.access_many
+
+        def accessOne(address, write=False, count=True, countTime=None, countEnergy=None, **kwargs):
+            # Inner calls (an eTLB refill, access_many falling back to access) are part of the outer access
+            if self.busy:
+                return access(address, write, count, countTime, countEnergy, **kwargs)
+            self.busy = True
+            try:
+                access(address, write, count, countTime, countEnergy, **kwargs)
+            finally:
+                self.busy = False
+            self.position += 1
+            self.counted += bool(count)
+            if self.position % self.period == 0:
+                self.snapshot()
+
+        def accessMany(addresses, writes=None, count_mask=None, chunkSize=0x10000):
+            n = len(addresses)
+            start = 0
+            while start < n:
+                end = min(n, start + self.period - self.position % self.period)
+                mask = None if count_mask is None else count_mask[start:end]
+                self.busy = True
+                try:
+                    access_many(addresses[start:end], None if writes is None else writes[start:end], mask, chunkSize)
+                finally:
+                    self.busy = False
+                self.counted += end - start if mask is None else int(np.count_nonzero(mask))
+                self.position += end - start
+                if self.position % self.period == 0:
+                    self.snapshot()
+                start = end
+
+        # Methods already shadowed on the instance (e.g. by an Instrument), restored by detach
+        self.shadowed = {k: top.__dict__[k] for k in ('access', 'access_many') if k in top.__dict__}
+        top.access = accessOne
+        top.access_many = accessMany
+        return top
+
+    def detach(self):
+        """Stop recording, restoring the methods of the top level and closing the last interval."""
+        self.finish()
+        for k in ('access', 'access_many'):
+            self.top.__dict__.pop(k, None)
+        self.top.__dict__.update(self.shadowed)
+
+    def snapshot(self, row=None):
+        """Record the counters at the current position."""
+        if row is None:
+            row = hierarchy.results(self.top, self.counted)
+        if self.nRows == len(self.starts):
+            self.starts = np.concatenate((self.starts, np.zeros_like(self.starts)))
+            self.data = np.concatenate((self.data, np.zeros_like(self.data)))
+        self.starts[self.nRows] = self.position
+        self.data[self.nRows] = [row[k] for k in self.columns]
+        self.nRows += 1
+
+    def finish(self):
+        """Close the last, partial, interval."""
+        if self.starts[self.nRows - 1] != self.position:
+            self.snapshot()
+
+    def series(self):
+        """Per interval counters as a structured array.
+
+        Each record holds 'start' and 'end' (positions among the accesses replayed) and the
+        change of every counter of `hierarchy.results` over it, 'N' being the number of
+        counted accesses.
+        """
+        self.finish()
+        starts = self.starts[:self.nRows]
+        deltas = np.diff(self.data[:self.nRows], axis=0)
+        dtype = [('start', np.int64), ('end', np.int64)]
+        dtype += [(k, np.float64 if k.endswith(('Cycles', 'Energy')) else np.int64) for k in self.columns]
+        out = np.empty(len(deltas), dtype=dtype)
+        out['start'] = starts[:-1]
+        out['end'] = starts[1:]
+        for i, k in enumerate(self.columns):
+            out[k] = deltas[:, i]
+        return out
+
+    def write(self, path):
+        """Write the series to a .csv file, or a .npz file of one array per column."""
+        series = self.series()
+        if path.endswith('.npz'):
+            np.savez_compressed(path, **{k: series[k] for k in series.dtype.names})
+            return
+        with open(path, 'w') as f:
+            f.write(','.join(series.dtype.names) + '\n')
+            for record in series.tolist():
+                f.write(','.join(str(v) for v in record) + '\n')
+
+def test():
+    if len(sys.argv) < 2:
+        print("usage: intervals.py <series.csv|series.npz> [column ...] > plot.png")
+        sys.exit(1)
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+
+    path = sys.argv[1]
+    if path.endswith('.npz'):
+        series = dict(np.load(path))
+    else:
+        table = np.genfromtxt(path, delimiter=',', names=True)
+        series = {k: table[k] for k in table.dtype.names}
+    columns = sys.argv[2:] or [k for k in series if k.endswith(('Hit', 'Miss')) or k.startswith(('etlbHit', 'hubHit'))]
+    fig, ax = plt.subplots()
+    for k in columns:
+        ax.plot(series['start'], series[k] / np.maximum(series['N'], 1), label=k)
+    ax.set_xlabel('Access')
+    ax.set_ylabel('Fraction of accesses')
+    ax.legend(fontsize='small')
+    fig.savefig(sys.stdout.buffer, format='png')
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,116 @@
+#! /usr/bin/env python3
+import copy
+import multiprocessing
+import sys
+import numpy as np
+from cache import Cache, priceCycles, priceEnergy
+import hierarchy
+import replacement
+import traceFile
+
+# Cache and trace of the current worker, set by loadPartitions
+PARTITION = None
+
+def partitionable(cache):
+    """Reason why a cache can not be simulated one group of sets at a time, or None if it can.
+
+    Sets only interact through `counter`, of which only the order within a set matters,
+    unless the level has a child (which sees the misses and writebacks of every set
+    interleaved), a TLB (which every set looks up, and whose counters are not merged) or
+    a prefetcher (which is trained across sets, and whose prefetch counters are not merged),
+    is already warm, or uses a replacement policy with shared state.
+    """
+    if not isinstance(cache, Cache):
+        return "only a single Cache level can be partitioned"
+    if cache.child is not None:
+        return "the cache has a child level"
+    if cache.tlb is not None:
+        return "the cache has a TLB"
+    if cache.prefetcher is not None:
+        return "the cache has a prefetcher"
+    if cache.counter != 0:
+        return "the cache is not cold"
+    if isinstance(cache.replacement, replacement.Random):
+        return "random replacement shares one generator between sets"
+    if cache.nSets < 2:
+        return "the cache has a single set"
+    return None
+
+def loadPartitions(cache, addresses, writes, count_mask, nPartitions):
+    global PARTITION
+    PARTITION = (cache, addresses, writes, count_mask, nPartitions)
+
+def counters(cache):
+    """The event counters and `counter` of a level, as a dict."""
+    return dict(cache.events(), counter=cache.counter)
+
+def runPartition(partition):
+    """Simulate the sets with setIndex % nPartitions == partition on a copy of the cache.
+
+    Returns the counts of the partition, as `counters` less those of the copy before.
+    """
+    cache, addresses, writes, count_mask, nPartitions = PARTITION
+    before = counters(cache)
+    sets = (addresses >> np.uint64(cache.offsetBits)) % np.uint64(cache.nSets)
+    mask = sets % np.uint64(nPartitions) == np.uint64(partition)
+    cache.access_many(addresses[mask], writes[mask], count_mask[mask])
+    return {k: v - before[k] for k, v in counters(cache).items()}
+
+def simulate(cache, addresses, writes=None, count_mask=None, processes=None):
+    """Counters of a batch of addresses accessed on a single level, splitting its sets between processes.
+
+    The counters are those `cache.access_many` would leave, but `cache` itself is not
+    changed: every partition accesses its own copy, whose line state is dropped. When
+    the cache can not be partitioned (see `partitionable`) a single copy is accessed
+    in this process.
+
+    Parameters
+    ----------
+    cache (Cache):
+        The level to simulate.
+    addresses, writes, count_mask (array):
+        As for `Cache.access_many`.
+    processes (int):
+        Number of worker processes, default None uses every core.
+
+    Returns (nPartitions, counters), nPartitions being 1 when the run was serial, and
+    counters the events of `Cache.events` and 'counter' as in `counters`.
+    """
+    addresses = np.asarray(addresses, dtype=np.uint64)
+    if writes is None:
+        writes = np.zeros(len(addresses), dtype=bool)
+    if count_mask is None:
+        count_mask = np.ones(len(addresses), dtype=bool)
+    writes = np.asarray(writes, dtype=bool)
+    count_mask = np.asarray(count_mask, dtype=bool)
+
+    nPartitions = min(processes or multiprocessing.cpu_count(), cache.nSets)
+    if nPartitions < 2 or partitionable(cache) is not None:
+        serial = copy.deepcopy(cache)
+        serial.access_many(addresses, writes, count_mask)
+        return 1, counters(serial)
+
+    with multiprocessing.Pool(nPartitions, loadPartitions, (cache, addresses, writes, count_mask, nPartitions)) as pool:
+        partials = pool.map(runPartition, range(nPartitions), chunksize=1)
+    total = counters(cache)
+    for partial in partials:
+        for k, v in partial.items():
+            total[k] += v
+    return nPartitions, total
+
+def test():
+    cache = Cache(size=0x100000, associativity=16)
+    processes = None
+    if len(sys.argv) > 1:
+        processes = int(sys.argv[1])
+    nPartitions, total = simulate(cache, *traceFile.window(traceFile.readStdin()), processes=processes)
+    N = total['counter']
+    print("Partitions:", nPartitions)
+    print("N:", N)
+    print("hit:  %d (%s)"%(total['hit'], hierarchy.percent(total['hit'], N)))
+    print("miss: %d (%s)"%(total['miss'], hierarchy.percent(total['miss'], N)))
+    print("Time: %d"%priceCycles(total, cache.prices()))
+    print("Energy: %0.3f"%priceEnergy(total, cache.prices()))
+
+if __name__ == '__main__':
+    test()
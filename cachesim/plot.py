@@ -47,9 +47,16 @@ for line in sys.stdin:
             Hub[-1][-1] = int(spl[-2][:-1])
 
     elif spl[0] == 'Time':
-        time.append([int(spl[2][:-1]), int(spl[4][:-1])])
+        time.append([int(spl[2][:-1]), int(spl[4][:-1]), 0, 0])
     elif spl[0] == 'Energy':
-        energy.append([float(spl[2][:-1]), float(spl[4][:-1])])
+        energy.append([float(spl[2][:-1]), float(spl[4][:-1]), 0., 0.])
+    # Reports without DRAM or translation lines (not simulated) leave their time and energy at 0
+    elif spl[0] == 'DRAM' and spl[1] == 'time:':
+        time[-1][2] = int(spl[2][:-1])
+        energy[-1][2] = float(spl[4])
+    elif spl[0] == 'Translation':
+        time[-1][3] = int(spl[2][:-1])
+        energy[-1][3] = float(spl[4])
 
 
 labels = sys.argv[1:]
@@ -94,15 +101,23 @@ ax.set_xticklabels(labels)
 #Time
 plt.figure()
 for i in range(0,len(time), 2):
-    normtime = time[i][0] + time[i][1]
+    normtime = time[i][0] + time[i][1] + time[i][2] + time[i][3]
     L1ref = time[i][0]/normtime
     L2ref = time[i][1]/normtime
+    DRAMref = time[i][2]/normtime
+    TLBref = time[i][3]/normtime
     L1etlb = time[i+1][0]/normtime
     L2etlb = time[i+1][1]/normtime
+    DRAMetlb = time[i+1][2]/normtime
+    TLBetlb = time[i+1][3]/normtime
     plt.bar(i//2, L1ref, color='C0', width=bar_width)
     plt.bar(i//2, L2ref, color='C1', bottom=L1ref, width=bar_width)
+    plt.bar(i//2, DRAMref, color='C7', bottom=L1ref+L2ref, width=bar_width)
+    plt.bar(i//2, TLBref, color='C8', bottom=L1ref+L2ref+DRAMref, width=bar_width)
     plt.bar(i//2+bar_width, L1etlb, color='C0', width=bar_width)
     plt.bar(i//2+bar_width, L2etlb, color='C1', bottom=L1etlb, width=bar_width)
+    plt.bar(i//2+bar_width, DRAMetlb, color='C7', bottom=L1etlb+L2etlb, width=bar_width)
+    plt.bar(i//2+bar_width, TLBetlb, color='C8', bottom=L1etlb+L2etlb+DRAMetlb, width=bar_width)
 
 ax = plt.gca()
 plt.ylabel("Relative speed")
@@ -113,15 +128,23 @@ ax.set_xticklabels(labels)
 #Energy
 plt.figure()
 for i in range(0,len(energy), 2):
-    normenergy = energy[i][0] + energy[i][1]
+    normenergy = energy[i][0] + energy[i][1] + energy[i][2] + energy[i][3]
     L1ref = energy[i][0]/normenergy
     L2ref = energy[i][1]/normenergy
+    DRAMref = energy[i][2]/normenergy
+    TLBref = energy[i][3]/normenergy
     L1etlb = energy[i+1][0]/normenergy
     L2etlb = energy[i+1][1]/normenergy
+    DRAMetlb = energy[i+1][2]/normenergy
+    TLBetlb = energy[i+1][3]/normenergy
     plt.bar(i//2, L1ref, color='C3', width=bar_width)
     plt.bar(i//2, L2ref, color='C2', bottom=L1ref, width=bar_width)
+    plt.bar(i//2, DRAMref, color='C7', bottom=L1ref+L2ref, width=bar_width)
+    plt.bar(i//2, TLBref, color='C8', bottom=L1ref+L2ref+DRAMref, width=bar_width)
     plt.bar(i//2+bar_width, L1etlb, color='C3', width=bar_width)
     plt.bar(i//2+bar_width, L2etlb, color='C2', bottom=L1etlb, width=bar_width)
+    plt.bar(i//2+bar_width, DRAMetlb, color='C7', bottom=L1etlb+L2etlb, width=bar_width)
+    plt.bar(i//2+bar_width, TLBetlb, color='C8', bottom=L1etlb+L2etlb+DRAMetlb, width=bar_width)
 
 ax = plt.gca()
 ax.set_ylabel("Relative Energy Use")
@@ -0,0 +1,204 @@
+import numpy as np
+
+# Empty (positions, candidates) of a chunk without prefetches
+NONE = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+def pack(positions, candidates):
+    """(positions, candidates) ordered by position, as int64 arrays."""
+    positions = np.asarray(positions, dtype=np.int64)
+    candidates = np.asarray(candidates, dtype=np.int64)
+    order = np.argsort(positions, kind='stable')
+    return positions[order], candidates[order]
+
+class NextLine:
+
+
+    def __init__(self, degree=1):
+        """Next line prefetching: the `degree` lines after each newly accessed line.
+
+        Prefetchers are trained on the demand line numbers (address >> offset bits) of
+        a level. `observe` takes one access and returns the lines to prefetch after it,
+        `observeMany` takes a chunk and returns (positions, candidates), the lines to
+        prefetch after the access at each position, ordered by position. Both give the
+        same candidates, so a batch can be trained in one NumPy pass.
+
+        Parameters
+        ----------
+        degree (int):
+            Number of lines prefetched ahead. (Default 1)
+        """
+        self.degree = degree
+        self.last = -1
+
+    def observe(self, line):
+        if line == self.last:
+            return []
+        self.last = line
+        return [line + k for k in range(1, self.degree + 1)]
+
+    def observeMany(self, lines):
+        lines = np.asarray(lines, dtype=np.int64)
+        if len(lines) == 0:
+            return NONE
+        # Only an access to another line than the one before prefetches
+        new = np.flatnonzero(lines != np.concatenate(([self.last], lines[:-1])))
+        self.last = int(lines[-1])
+        ahead = np.arange(1, self.degree + 1)
+        return pack(np.repeat(new, self.degree), (lines[new, np.newaxis] + ahead).ravel())
+
+class Stride:
+
+
+    def __init__(self, degree=1, tableSize=64, pageLines=64):
+        """PC-less stride prefetching per page.
+
+        A direct mapped table, indexed by page, holds the last line and stride seen in a
+        page. When an access to a new line of a page repeats the last stride, the `degree`
+        lines that stride ahead, within the page, are prefetched.
+
+        Parameters
+        ----------
+        degree (int):
+            Number of strides prefetched ahead. (Default 1)
+        tableSize (int):
+            Number of pages tracked. (Default 64)
+        pageLines (int):
+            Lines per page, a power of two. (Default 64, 4 kB pages of 64 B lines)
+        """
+        self.degree = degree
+        self.tableSize = tableSize
+        self.pageShift = pageLines.bit_length() - 1
+        self.pages = np.full(tableSize, -1, dtype=np.int64)
+        self.lastLines = np.zeros(tableSize, dtype=np.int64)
+        # 0 while no stride has been seen in the page
+        self.strides = np.zeros(tableSize, dtype=np.int64)
+
+    def observe(self, line):
+        page = line >> self.pageShift
+        slot = page % self.tableSize
+        stride = previous = 0
+        if self.pages[slot] == page:
+            if line == self.lastLines[slot]:
+                return []
+            stride = line - int(self.lastLines[slot])
+            previous = int(self.strides[slot])
+        self.pages[slot] = page
+        self.lastLines[slot] = line
+        self.strides[slot] = stride
+        if stride == 0 or stride != previous:
+            return []
+        candidates = [line + k * stride for k in range(1, self.degree + 1)]
+        return [c for c in candidates if c >> self.pageShift == page]
+
+    def observeMany(self, lines):
+        lines = np.asarray(lines, dtype=np.int64)
+        if len(lines) == 0:
+            return NONE
+        pages = lines >> self.pageShift
+        slots = pages % self.tableSize
+        # Accesses grouped by table slot, in order within each slot
+        order = np.argsort(slots, kind='stable')
+        lines, pages, slots = lines[order], pages[order], slots[order]
+        first = np.concatenate(([True], slots[1:] != slots[:-1]))
+
+        # The state before each access: the previous access to its slot, or the table
+        previousPages = np.where(first, self.pages[slots], np.concatenate(([0], pages[:-1])))
+        previousLines = np.where(first, self.lastLines[slots], np.concatenate(([0], lines[:-1])))
+        # Repeated accesses to a line leave the state as it is
+        keep = ~((previousPages == pages) & (previousLines == lines))
+        order, lines, pages, slots = order[keep], lines[keep], pages[keep], slots[keep]
+        if len(lines) == 0:
+            return NONE
+        first = np.concatenate(([True], slots[1:] != slots[:-1]))
+        previousPages = np.where(first, self.pages[slots], np.concatenate(([0], pages[:-1])))
+        previousLines = np.where(first, self.lastLines[slots], np.concatenate(([0], lines[:-1])))
+        strides = np.where(previousPages == pages, lines - previousLines, 0)
+        previousStrides = np.where(first, np.where(self.pages[slots] == pages, self.strides[slots], 0),
+                                   np.concatenate(([0], strides[:-1])))
+
+        last = np.concatenate((slots[1:] != slots[:-1], [True]))
+        self.pages[slots[last]] = pages[last]
+        self.lastLines[slots[last]] = lines[last]
+        self.strides[slots[last]] = strides[last]
+
+        match = np.flatnonzero((strides != 0) & (strides == previousStrides))
+        ahead = np.arange(1, self.degree + 1)
+        candidates = lines[match, np.newaxis] + strides[match, np.newaxis] * ahead
+        inPage = (candidates >> self.pageShift) == pages[match, np.newaxis]
+        positions = np.repeat(order[match], self.degree).reshape(candidates.shape)
+        return pack(positions[inPage], candidates[inPage])
+
+class Stream:
+
+
+    def __init__(self, degree=4, nStreams=4):
+        """Stream buffers: ascending streams of lines, prefetched `degree` lines ahead.
+
+        An access to a new line which no stream expects allocates a stream (replacing
+        the least recently used). An access within `degree` lines of the head of a stream
+        confirms it, advancing the head past the line and prefetching up to `degree` lines
+        ahead of it, each line once.
+
+        Parameters
+        ----------
+        degree (int):
+            Depth of each stream buffer, in lines. (Default 4)
+        nStreams (int):
+            Number of stream buffers. (Default 4)
+        """
+        self.degree = degree
+        self.nStreams = nStreams
+        # [head, next line to prefetch] per stream, least recently used first
+        self.streams = []
+        self.last = -1
+
+    def observe(self, line):
+        if line == self.last:
+            return []
+        self.last = line
+        streams = self.streams
+        for i, stream in enumerate(streams):
+            if stream[0] <= line < stream[0] + self.degree:
+                del streams[i]
+                streams.append(stream)
+                stream[0] = line + 1
+                start = max(stream[1], line + 1)
+                stream[1] = line + self.degree + 1
+                return list(range(start, stream[1]))
+        if len(streams) == self.nStreams:
+            del streams[0]
+        streams.append([line + 1, line + 1])
+        return []
+
+    def observeMany(self, lines):
+        lines = np.asarray(lines, dtype=np.int64)
+        if len(lines) == 0:
+            return NONE
+        # Streams are sequential state, only the accesses to a new line are walked
+        new = np.flatnonzero(lines != np.concatenate(([self.last], lines[:-1])))
+        positions = []
+        candidates = []
+        observe = self.observe
+        for position, line in zip(new.tolist(), lines[new].tolist()):
+            found = observe(line)
+            if found:
+                positions.extend([position] * len(found))
+                candidates.extend(found)
+        return pack(positions, candidates)
+
+PREFETCHERS = {'nextline': NextLine, 'stride': Stride, 'stream': Stream}
+
+def makePrefetcher(prefetcher, degree=None):
+    """Build the prefetcher of a level.
+
+    `prefetcher` is None for no prefetching, a name from PREFETCHERS, or a class (or any
+    callable) taking `degree`, e.g. `functools.partial(Stride, tableSize=256)`. A degree
+    of None keeps the default of the prefetcher.
+    """
+    if prefetcher is None:
+        return None
+    if isinstance(prefetcher, str):
+        if prefetcher.lower() not in PREFETCHERS:
+            raise ValueError("Unknown prefetcher '%s', expected one of %s"%(prefetcher, ', '.join(PREFETCHERS)))
+        prefetcher = PREFETCHERS[prefetcher.lower()]
+    return prefetcher() if degree is None else prefetcher(degree)
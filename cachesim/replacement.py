@@ -0,0 +1,188 @@
+import random
+from collections import OrderedDict
+
+class LRU:
+
+
+    def __init__(self, nSets, associativity):
+        """True least recently used replacement.
+
+        Each set keeps its resident ways in an ordered dict from least to most
+        recently used, so updates and victim selection are O(1).
+
+        Parameters
+        ----------
+
+        nSets (int):
+            Number of sets tracked.
+        associativity (int):
+            Number of ways per set.
+        """
+        self.nSets = nSets
+        self.associativity = associativity
+        self.order = [OrderedDict() for i in range(nSets)]
+
+    def insert(self, setIndex, way):
+        """A way has been filled."""
+        order = self.order[setIndex]
+        order[way] = None
+        order.move_to_end(way)
+
+    def touch(self, setIndex, way):
+        """A resident way has been accessed."""
+        self.order[setIndex].move_to_end(way)
+
+    def remove(self, setIndex, way):
+        """A way has been evicted."""
+        self.order[setIndex].pop(way, None)
+
+    def victim(self, setIndex):
+        """Select the way to evict from a full set."""
+        for way in self.order[setIndex]:
+            return way
+        return 0
+
+class FIFO(LRU):
+    """First in first out replacement, accesses do not change the order."""
+
+    def touch(self, setIndex, way):
+        pass
+
+class TreePLRU:
+
+
+    def __init__(self, nSets, associativity):
+        """Tree pseudo LRU replacement.
+
+        Each set has a binary tree of `associativity - 1` bits, stored heap style,
+        each pointing towards the half of the ways which was used less recently.
+
+        Parameters
+        ----------
+
+        nSets (int):
+            Number of sets tracked.
+        associativity (int):
+            Number of ways per set, must be a power of two.
+        """
+        if associativity & (associativity - 1):
+            raise ValueError("Tree PLRU requires a power of two associativity, got %d"%associativity)
+        self.nSets = nSets
+        self.associativity = associativity
+        self.levels = associativity.bit_length() - 1
+        # Node n of a set is at setIndex * associativity + n, node 0 is unused
+        self.bits = bytearray(nSets * associativity)
+
+    def touch(self, setIndex, way):
+        bits = self.bits
+        base = setIndex * self.associativity
+        node = 1
+        for level in range(self.levels - 1, -1, -1):
+            direction = (way >> level) & 1
+            bits[base + node] = direction ^ 1
+            node = 2 * node + direction
+
+    insert = touch
+
+    def remove(self, setIndex, way):
+        pass
+
+    def victim(self, setIndex):
+        bits = self.bits
+        base = setIndex * self.associativity
+        node = 1
+        for level in range(self.levels):
+            node = 2 * node + bits[base + node]
+        return node - self.associativity
+
+class Random:
+
+
+    def __init__(self, nSets, associativity, seed=None):
+        """Random replacement.
+
+        Parameters
+        ----------
+
+        nSets (int):
+            Number of sets tracked.
+        associativity (int):
+            Number of ways per set.
+        seed (int):
+            Seed for the victim selection, default None seeds from the system.
+        """
+        self.nSets = nSets
+        self.associativity = associativity
+        self.random = random.Random(seed)
+
+    def insert(self, setIndex, way):
+        pass
+
+    def touch(self, setIndex, way):
+        pass
+
+    def remove(self, setIndex, way):
+        pass
+
+    def victim(self, setIndex):
+        return self.random.randrange(self.associativity)
+
+class SRRIP:
+
+
+    def __init__(self, nSets, associativity, bits=2):
+        """Static re-reference interval prediction (Jaleel et al., ISCA 2010).
+
+        Lines are inserted with a long predicted re-reference interval and
+        promoted to the shortest on a hit. The victim is the first way with the
+        distant interval, ageing the whole set when there is none.
+
+        Parameters
+        ----------
+
+        nSets (int):
+            Number of sets tracked.
+        associativity (int):
+            Number of ways per set.
+        bits (int):
+            Bits of re-reference prediction value per line (default 2).
+        """
+        self.nSets = nSets
+        self.associativity = associativity
+        self.maxRRPV = (1 << bits) - 1
+        self.rrpv = bytearray([self.maxRRPV]) * (nSets * associativity)
+        # age[n] adds n to every prediction value of a set in one translate
+        self.age = [bytes(min(v + n, 255) for v in range(256)) for n in range(self.maxRRPV + 1)]
+
+    def insert(self, setIndex, way):
+        self.rrpv[setIndex * self.associativity + way] = self.maxRRPV - 1
+
+    def touch(self, setIndex, way):
+        self.rrpv[setIndex * self.associativity + way] = 0
+
+    def remove(self, setIndex, way):
+        self.rrpv[setIndex * self.associativity + way] = self.maxRRPV
+
+    def victim(self, setIndex):
+        base = setIndex * self.associativity
+        end = base + self.associativity
+        way = self.rrpv.find(self.maxRRPV, base, end)
+        if way == -1:
+            oldest = max(self.rrpv[base:end])
+            self.rrpv[base:end] = self.rrpv[base:end].translate(self.age[self.maxRRPV - oldest])
+            way = self.rrpv.find(self.maxRRPV, base, end)
+        return way - base
+
+POLICIES = {'lru': LRU, 'plru': TreePLRU, 'fifo': FIFO, 'random': Random, 'srrip': SRRIP}
+
+def makePolicy(replacement, nSets, associativity):
+    """Build a replacement policy for a level.
+
+    `replacement` is either a name from POLICIES, or a class (or any callable)
+    taking `(nSets, associativity)`, e.g. `functools.partial(Random, seed=1)`.
+    """
+    if isinstance(replacement, str):
+        if replacement.lower() not in POLICIES:
+            raise ValueError("Unknown replacement policy '%s', expected one of %s"%(replacement, ', '.join(POLICIES)))
+        replacement = POLICIES[replacement.lower()]
+    return replacement(nSets, associativity)
@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+import argparse
+import sys
+import hierarchy
+import instrument
+import intervals
+import sweep
+import traceFile
+
+def parseValue(text):
+    """A parameter value from the command line: an int (any base), a float or a string."""
+    for convert in (lambda v: int(v, 0), float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+def makeConfig(engine, params=(), seed=None):
+    """Config for `hierarchy.build` from an engine and 'level.key=value' parameters."""
+    config = {'engine': engine}
+    for param in params:
+        path, sep, value = param.partition('=')
+        if not sep or '.' not in path:
+            raise ValueError("Parameters are given as level.key=value, e.g. L1.size=0x8000, not '%s'"%param)
+        config = sweep.expand(config, {path: [parseValue(value)]})[0]
+    if seed is not None:
+        config['seed'] = seed
+    hierarchy.levels(config)
+    return config
+
+def replay(top, source, format=None, skip=0, warmup=0, nLines=-1, instrument=None):
+    """Stream a trace through a hierarchy a chunk at a time, returning the number of counted accesses.
+
+    Parameters
+    ----------
+    top (Cache or ETLB):
+        The top level of a hierarchy, as built by `hierarchy.build`.
+    source (str or file):
+        Trace path or binary file object (e.g. sys.stdin.buffer), binary, text or gem5.
+    format (str):
+        'text' or 'gem5' to override the detected text format.
+    skip, warmup, nLines (int):
+        The window of the trace which is replayed, as in the test functions.
+    instrument (Instrument):
+        Instrumentation which times the parsing of the trace, default None.
+    """
+    return replayMany([top], source, format, skip, warmup, nLines, instrument)
+
+def replayMany(tops, source, format=None, skip=0, warmup=0, nLines=-1, instrument=None):
+    """Stream a trace through several hierarchies, parsing it once, see `replay`.
+
+    Every hierarchy sees each chunk in turn, so all replay exactly the same window.
+    """
+    N = 0
+    chunks = traceFile.readChunks(source, format)
+    if instrument is not None:
+        chunks = instrument.timed(chunks)
+    for addresses, writes, counts in traceFile.windowChunks(chunks, skip, warmup, nLines):
+        for top in tops:
+            top.access_many(addresses, writes, counts)
+        N += int(counts.sum())
+    return N
+
+def main():
+    # store replays the runs it does not hold through this module, so it is only imported by the CLI
+    import store
+    parser = argparse.ArgumentParser(description="Replay a memory trace through a simulated hierarchy.")
+    parser.add_argument('trace', nargs='?', default='-', help="binary, text or gem5 trace, default stdin")
+    parser.add_argument('-e', '--engine', choices=hierarchy.ENGINES, default='baseline')
+    parser.add_argument('-p', '--param', action='append', default=[], metavar='LEVEL.KEY=VALUE',
+                        help="hierarchy parameter, e.g. L1.size=0x8000 or hub.nLines=2048 (repeatable)")
+    parser.add_argument('-s', '--skip', type=int, default=0, help="accesses to drop from the start")
+    parser.add_argument('-w', '--warmup', type=int, default=0, help="accesses replayed without counting")
+    parser.add_argument('-n', '--limit', type=int, default=-1, help="accesses to count, -1 for the rest")
+    parser.add_argument('-f', '--format', choices=('text', 'gem5'), help="text trace format, detected by default")
+    parser.add_argument('--seed', type=int, help="seed of the page table offset (default 0)")
+    parser.add_argument('--store', metavar='DB', help="results store, runs already in it are not simulated again")
+    parser.add_argument('--profile', metavar='NPZ', help="instrument the run, saving per set, reuse, CLT and phase counters (see instrument.py)")
+    parser.add_argument('--intervals', type=int, metavar='N', help="record the counters every N accesses (see intervals.py)")
+    parser.add_argument('--series', default='intervals.csv', metavar='PATH', help="where --intervals writes its time series, .csv or .npz")
+    args = parser.parse_args()
+
+    if args.store is not None and (args.trace == '-' or args.format is not None):
+        parser.error("--store needs a trace file, with its format detected")
+    if args.store is not None and (args.profile is not None or args.intervals is not None):
+        parser.error("--profile and --intervals run the simulation, they can not be used with --store")
+    try:
+        config = makeConfig(args.engine, args.param, args.seed)
+        top = hierarchy.build(config)
+    except (ValueError, TypeError) as e:
+        parser.error(str(e))
+    profile = None
+    if args.store is not None:
+        row = store.Store(args.store).run(args.trace, config, args.skip, args.warmup, args.limit)
+    else:
+        source = sys.stdin.buffer if args.trace == '-' else args.trace
+        if args.profile is not None:
+            profile = instrument.Instrument()
+            profile.attach(top)
+        series = None
+        if args.intervals is not None:
+            series = intervals.Intervals(args.intervals)
+            series.attach(top)
+        N = replay(top, source, args.format, args.skip, args.warmup, args.limit, profile)
+        row = hierarchy.results(top, N)
+        if series is not None:
+            series.write(args.series)
+    print(hierarchy.report(row))
+    if profile is not None:
+        profile.save(args.profile)
+        print(instrument.summary(profile.stats()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#! /usr/bin/env python3
+import math
+import statistics
+import sys
+import numpy as np
+import hierarchy
+import traceFile
+
+WARMING = ('functional', 'none')
+
+def counters(top):
+    """Numeric counters of a hierarchy, as in `hierarchy.results`, without N."""
+    row = hierarchy.results(top, 0)
+    del row['N']
+    return row
+
+def sample(top, addresses, writes=None, period=100000, unit=1000, detailedWarmup=0, warming='functional', confidence=0.95, offset=0):
+    """Estimate the counters of a full run from periodic measurement units (SMARTS style sampling).
+
+    Every `period` accesses, `unit` accesses are simulated with counting on. Between
+    units the hierarchy is kept warm by replaying the accesses with counting off
+    (functional warming: tags and replacement state are updated, hit/miss, time and
+    energy are not), or, with `warming='none'`, only the `detailedWarmup` accesses
+    before each unit are replayed and the rest are skipped.
+
+    Parameters
+    ----------
+    top (Cache or ETLB):
+        The top level of a hierarchy, as built by `hierarchy.build`.
+    addresses, writes (array):
+        As for `Cache.access_many`.
+    period (int):
+        Accesses between the starts of consecutive units.
+    unit (int):
+        Accesses per measurement unit.
+    detailedWarmup (int):
+        Accesses replayed uncounted just before each unit when `warming` is 'none'.
+    warming (str):
+        'functional' or 'none'.
+    confidence (float):
+        Confidence level of the intervals.
+    offset (int):
+        Start of the first unit, e.g. drawn at random to avoid aliasing with program phases.
+
+    Returns (estimates, nSamples), estimates mapping each counter of `hierarchy.results`
+    to (estimate over the whole trace, half width of the confidence interval).
+    """
+    if warming not in WARMING:
+        raise ValueError("Unknown warming '%s', expected one of %s"%(warming, ', '.join(WARMING)))
+    if unit > period:
+        raise ValueError("unit (%d) must not be longer than period (%d)"%(unit, period))
+    addresses = np.asarray(addresses, dtype=np.uint64)
+    n = len(addresses)
+    if writes is None:
+        writes = np.zeros(n, dtype=bool)
+    writes = np.asarray(writes, dtype=bool)
+
+    rates = {}
+    position = 0
+    for start in range(offset, n - unit + 1, period):
+        warmFrom = position if warming == 'functional' else max(position, start - detailedWarmup)
+        top.access_many(addresses[warmFrom:start], writes[warmFrom:start], np.zeros(start - warmFrom, dtype=bool))
+        before = counters(top)
+        top.access_many(addresses[start:start + unit], writes[start:start + unit])
+        for k, v in counters(top).items():
+            rates.setdefault(k, []).append((v - before[k]) / unit)
+        position = start + unit
+
+    nSamples = len(next(iter(rates.values()), []))
+    if nSamples == 0:
+        raise ValueError("The trace (%d accesses) is too short for a single unit"%n)
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    estimates = {}
+    for k, values in rates.items():
+        mean = statistics.fmean(values)
+        halfWidth = z * statistics.stdev(values) / math.sqrt(nSamples) if nSamples > 1 else math.inf
+        estimates[k] = (mean * n, halfWidth * n)
+    return estimates, nSamples
+
+def test():
+    if len(sys.argv) > 1 and sys.argv[1] not in hierarchy.ENGINES:
+        print("usage: sample.py [baseline|etlb] [period] [unit] [detailedWarmup] [functional|none] < trace")
+        sys.exit(1)
+    engine = sys.argv[1] if len(sys.argv) > 1 else 'baseline'
+    period = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    unit = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    detailedWarmup = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+    warming = sys.argv[5] if len(sys.argv) > 5 else 'functional'
+    addresses, writes, counts = traceFile.window(traceFile.readStdin())
+    top = hierarchy.build({'engine': engine})
+    estimates, nSamples = sample(top, addresses, writes, period, unit, detailedWarmup, warming)
+    print("N: %d, samples: %d (%d accesses)"%(len(addresses), nSamples, nSamples * unit))
+    for k, (estimate, halfWidth) in estimates.items():
+        print("%-11s %14.3f +- %.3f (%0.3f%%)"%(k, estimate, halfWidth, halfWidth / estimate * 100 if estimate else 0))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,116 @@
+#! /usr/bin/env python3
+import math
+import sys
+import numpy as np
+import traceFile
+
+def setDistances(tags):
+    """LRU stack distances of the tags accessed in one set, in order.
+
+    A Fenwick tree over the accesses marks the most recent access of each tag,
+    so the distinct tags used since the previous access of a tag are a prefix
+    sum away. 0 is returned for the first access of a tag (a cold miss).
+
+    As in `Cache`, every way starts out holding tag 0, so the first access of
+    tag 0 is treated as a reuse of a line at the bottom of the stack.
+    """
+    n = len(tags)
+    tree = [0] * (n + 1)
+    last = {}
+    distances = [0] * n
+    distinct = 0
+    for t, tag in enumerate(tags):
+        prev = last.get(tag)
+        if prev is None:
+            if tag == 0:
+                distances[t] = distinct + 1
+            distinct += 1
+        else:
+            i = prev + 1
+            before = 0
+            while i > 0:
+                before += tree[i]
+                i -= i & -i
+            distances[t] = distinct - before + 1
+            i = prev + 1
+            while i <= n:
+                tree[i] -= 1
+                i += i & -i
+        i = t + 1
+        while i <= n:
+            tree[i] += 1
+            i += i & -i
+        last[tag] = t
+    return distances
+
+def stackDistances(addresses, nSets, cacheLine=64):
+    """LRU stack distance of every access for a cache with `nSets` sets.
+
+    Sets and tags are computed as `Cache` does. An access hits in an LRU cache
+    with `nSets` sets of `associativity` ways if its distance is between 1 and
+    `associativity`, 0 marks a cold miss.
+    """
+    addresses = np.asarray(addresses, dtype=np.uint64)
+    offsetBits = int(math.ceil(math.log2(cacheLine)))
+    setBits = int(math.ceil(math.log2(nSets)))
+    sets = (addresses >> np.uint64(offsetBits)) % np.uint64(nSets)
+    tags = (addresses >> np.uint64(offsetBits + setBits)).tolist()
+
+    distances = np.zeros(len(addresses), dtype=np.int64)
+    order = np.argsort(sets, kind='stable')
+    bounds = np.flatnonzero(np.diff(sets[order])) + 1
+    for group in np.split(order, bounds):
+        distances[group] = setDistances([tags[i] for i in group.tolist()])
+    return distances
+
+def missCurves(addresses, configs, cacheLine=64, count_mask=None):
+    """Hit and miss counts of LRU caches of many sizes from one pass per set count.
+
+    Parameters
+    ----------
+    addresses (array of int):
+        The addresses which are accessed.
+    configs (list of (int, int)):
+        (size, associativity) pairs, as passed to `Cache`, -1 meaning fully associative.
+    cacheLine (int):
+        Number of bytes per cache line.
+    count_mask (array of bool):
+        Whether each access is counted, default None counts all.
+
+    Returns a dict from each (size, associativity) to (hit, miss), equal to
+    `Cache.hit` and `Cache.miss` after accessing the same addresses.
+    """
+    bySets = {}
+    for size, associativity in configs:
+        nLines = size // cacheLine
+        ways = nLines if associativity == -1 else associativity
+        bySets.setdefault(nLines // ways, []).append((size, associativity, ways))
+
+    results = {}
+    for nSets, group in bySets.items():
+        distances = stackDistances(addresses, nSets, cacheLine)
+        if count_mask is not None:
+            distances = distances[np.asarray(count_mask, dtype=bool)]
+        maxWays = max(ways for size, associativity, ways in group)
+        hist = np.bincount(np.minimum(distances, maxWays + 1), minlength=maxWays + 2)
+        hits = np.cumsum(hist) - hist[0]
+        for size, associativity, ways in group:
+            hit = int(hits[ways])
+            results[(size, associativity)] = (hit, len(distances) - hit)
+    return results
+
+def test():
+    cacheLine = 64
+    if len(sys.argv) > 1:
+        cacheLine = int(sys.argv[1])
+    records = traceFile.readStdin()
+    configs = [(1 << bits, associativity) for bits in range(12, 23) for associativity in (1, 2, 4, 8, 16, -1)
+               if (1 << bits) // cacheLine >= max(associativity, 1)]
+    results = missCurves(records['address'], configs, cacheLine)
+    print("N:", len(records))
+    print("%10s %6s %10s %10s %8s"%("size", "assoc", "hit", "miss", "miss%"))
+    for (size, associativity), (hit, miss) in sorted(results.items(), key=lambda item: (item[0][0], item[0][1] % (1 << 62))):
+        print("%10d %6d %10d %10d %8.3f"%(size, associativity, hit, miss, miss/max(len(records), 1)*100))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,153 @@
+#! /usr/bin/env python3
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import hierarchy
+import replay
+import sweep
+
+# Version of the simulators and of the results rows, part of every run's key: bump it whenever
+# a change makes an unchanged config give other results, so older runs are simulated again
+STORE_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS traces (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime INTEGER,
+    digest TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    key TEXT PRIMARY KEY,
+    trace TEXT,
+    name TEXT,
+    engine TEXT,
+    skip INTEGER,
+    warmup INTEGER,
+    nLines INTEGER,
+    config TEXT,
+    results TEXT,
+    created TEXT,
+    version INTEGER
+);
+CREATE INDEX IF NOT EXISTS runsByTrace ON runs (trace, engine);
+'''
+
+def canonical(config):
+    """JSON of the full config, equal for configs which build the same hierarchy."""
+    return json.dumps(hierarchy.fullConfig(config), sort_keys=True, default=repr)
+
+def runKey(digest, config, skip=0, warmup=0, nLines=-1):
+    """Key of a run, from the store version, the trace content, the full config and the window."""
+    text = json.dumps([STORE_VERSION, digest, canonical(config), skip, warmup, nLines])
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class Store:
+    """SQLite store of structured run results, which memoizes runs.
+
+    Each run is keyed on `STORE_VERSION`, the SHA-256 of its trace file, its config with
+    every default filled in (`hierarchy.fullConfig`) and its skip/warmup/nLines window, and
+    stores the row of `hierarchy.results` along with the config. Runs of older versions
+    are kept but neither returned nor listed. The page table offset of both
+    engines is drawn from the config's 'seed' (0 by default), so stored runs are reproducible.
+    """
+
+    def __init__(self, path='results.db'):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        # Stores created before runs were versioned hold version 0 runs
+        if 'version' not in [column[1] for column in self.db.execute("PRAGMA table_info(runs)")]:
+            with self.db:
+                self.db.execute("ALTER TABLE runs ADD COLUMN version INTEGER DEFAULT 0")
+
+    def close(self):
+        self.db.close()
+
+    def traceDigest(self, path):
+        """SHA-256 of a trace file, cached on its path, size and modification time."""
+        stat = os.stat(path)
+        path = os.path.abspath(path)
+        cached = self.db.execute("SELECT digest FROM traces WHERE path = ? AND size = ? AND mtime = ?",
+                                 (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if cached is not None:
+            return cached[0]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        digest = digest.hexdigest()
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO traces VALUES (?, ?, ?, ?)", (path, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+    def get(self, digest, config, skip=0, warmup=0, nLines=-1):
+        """The results row of a stored run, or None if it has not been run."""
+        found = self.db.execute("SELECT results FROM runs WHERE key = ?", (runKey(digest, config, skip, warmup, nLines),)).fetchone()
+        return None if found is None else json.loads(found[0])
+
+    def put(self, digest, config, row, skip=0, warmup=0, nLines=-1, name=''):
+        """Store the results row of a run, `name` labels the trace (e.g. the benchmark)."""
+        full = hierarchy.fullConfig(config)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (runKey(digest, config, skip, warmup, nLines), digest, name, full['engine'],
+                             skip, warmup, nLines, canonical(config), json.dumps(row), time.strftime('%Y-%m-%d %H:%M:%S'),
+                             STORE_VERSION))
+
+    def run(self, tracePath, config, skip=0, warmup=0, nLines=-1):
+        """Results row of a config over a trace, simulated only if it is not stored yet."""
+        digest = self.traceDigest(tracePath)
+        row = self.get(digest, config, skip, warmup, nLines)
+        if row is None:
+            top = hierarchy.build(config)
+            N = replay.replay(top, tracePath, skip=skip, warmup=warmup, nLines=nLines)
+            row = hierarchy.results(top, N)
+            self.put(digest, config, row, skip, warmup, nLines, traceName(tracePath))
+        return row
+
+    def rows(self, where='', *parameters):
+        """Stored runs of the current version as flat dicts of run columns, dotted config keys and results.
+
+        `where` is an optional SQL condition on the runs table, e.g. "engine = ?" with parameters.
+        """
+        query = "SELECT trace, name, engine, skip, warmup, nLines, config, results FROM runs WHERE version = ?"
+        if where:
+            query += " AND (" + where + ")"
+        query += " ORDER BY created, rowid"
+        rows = []
+        for trace, name, engine, skip, warmup, nLines, config, results in self.db.execute(query, (STORE_VERSION,) + parameters):
+            row = {'trace': trace, 'name': name, 'engine': engine, 'skip': skip, 'warmup': warmup, 'nLines': nLines}
+            config = json.loads(config)
+            del config['engine']
+            row.update(sweep.flatten(config))
+            row.update(json.loads(results))
+            rows.append(row)
+        return rows
+
+    def table(self, where='', *parameters):
+        """Stored runs as a structured array, see `rows` and `sweep.table`."""
+        return sweep.table(self.rows(where, *parameters))
+
+def traceName(path):
+    """Label of a trace, its file name without extension (e.g. the benchmark)."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+def test():
+    if len(sys.argv) < 2:
+        print("usage: store.py <results.db> [engine]")
+        sys.exit(1)
+    store = Store(sys.argv[1])
+    if len(sys.argv) > 2:
+        rows = store.table("engine = ?", sys.argv[2])
+    else:
+        rows = store.table()
+    print(','.join(rows.dtype.names or ()))
+    for row in rows:
+        print(','.join(str(v) for v in row.tolist()))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,158 @@
+#! /usr/bin/env python3
+import copy
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import numpy as np
+import hierarchy
+import traceFile
+
+# Trace of the current worker, (addresses, writes, counts), set by loadTrace
+TRACE = None
+
+def expand(base, axes):
+    """Cross product of parameter values over a base config.
+
+    `axes` maps a dotted path (e.g. 'L1.size', 'etlb.pageSize', 'engine') to a list of
+    values, every combination of which gives one config.
+    """
+    configs = []
+    paths = list(axes)
+    for values in itertools.product(*(axes[path] for path in paths)):
+        config = copy.deepcopy(base)
+        for path, value in zip(paths, values):
+            *levels, key = path.split('.')
+            target = config
+            for level in levels:
+                target = target.setdefault(level, {})
+            target[key] = value
+        configs.append(config)
+    return configs
+
+def flatten(config, prefix=''):
+    """Flatten a nested config into dotted keys."""
+    flat = {}
+    for key, value in config.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + key + '.'))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+def loadTrace(path, skip=0, warmup=0, nLines=-1):
+    """Worker initializer, memory maps the binary trace so every worker shares its pages."""
+    global TRACE
+    TRACE = traceFile.window(traceFile.openTrace(path), skip, warmup, nLines)
+
+def runConfig(config):
+    """Run one config over the worker's trace, returning its counters (`hierarchy.results`)."""
+    addresses, writes, counts = TRACE
+    top = hierarchy.build(config)
+    top.access_many(addresses, writes, counts)
+    return hierarchy.results(top, int(counts.sum()))
+
+def resultRow(config, results):
+    """A row of a sweep, the flattened config followed by its counters."""
+    row = flatten(dict(config, engine=config.get('engine', 'baseline')))
+    row.update(results)
+    return row
+
+def table(rows):
+    """Combine result rows into one structured array, columns missing from a row are 0 (or '')."""
+    columns = []
+    for row in rows:
+        columns.extend(key for key in row if key not in columns)
+    dtypes = []
+    for column in columns:
+        values = [row[column] for row in rows if column in row]
+        if all(isinstance(v, (bool, int, np.integer)) for v in values):
+            dtypes.append((column, np.int64))
+        elif all(isinstance(v, (bool, int, float, np.number)) for v in values):
+            dtypes.append((column, np.float64))
+        else:
+            dtypes.append((column, 'U%d'%max(len(str(v)) for v in values)))
+    out = np.zeros(len(rows), dtype=dtypes)
+    for i, row in enumerate(rows):
+        for column, value in row.items():
+            out[column][i] = value if out.dtype[column].kind != 'U' else str(value)
+    return out
+
+def sweep(tracePath, configs, processes=None, skip=0, warmup=0, nLines=-1, db=None):
+    """Run many configs over one trace on a process pool.
+
+    Parameters
+    ----------
+    tracePath (str):
+        The trace, binary traces are memory mapped by each worker, text traces are converted
+        to a temporary binary trace once first.
+    configs (list of dict):
+        Configs as understood by `hierarchy.build`, e.g. from `expand`.
+    processes (int):
+        Number of worker processes, default None uses every core, 1 runs in this process.
+    skip, warmup, nLines (int):
+        The window of the trace which is replayed, as in the test functions.
+    db (store.Store):
+        Results store, configs already run over this trace and window are not simulated
+        again, and the results of the others are added to it.
+
+    Returns a structured array with one row per config.
+    """
+    results = [None] * len(configs)
+    if db is not None:
+        digest = db.traceDigest(tracePath)
+        results = [db.get(digest, config, skip, warmup, nLines) for config in configs]
+    pending = [config for config, result in zip(configs, results) if result is None]
+    if pending:
+        done = iter(runConfigs(tracePath, pending, processes, skip, warmup, nLines))
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = next(done)
+                if db is not None:
+                    db.put(digest, configs[i], results[i], skip, warmup, nLines, os.path.splitext(os.path.basename(tracePath))[0])
+    return table([resultRow(config, result) for config, result in zip(configs, results)])
+
+def runConfigs(tracePath, configs, processes=None, skip=0, warmup=0, nLines=-1):
+    """Counters of each config over a trace, on a process pool (see `sweep`)."""
+    with open(tracePath, 'rb') as f:
+        binary = traceFile.isBinary(f.read(traceFile.HEADER.size))
+    tmp = None
+    if not binary:
+        fd, tmp = tempfile.mkstemp(suffix='.bin')
+        os.close(fd)
+        with open(tracePath, 'rb') as f:
+            traceFile.convert(f, tmp)
+        tracePath = tmp
+    try:
+        if processes == 1:
+            loadTrace(tracePath, skip, warmup, nLines)
+            return [runConfig(config) for config in configs]
+        with multiprocessing.Pool(processes, loadTrace, (tracePath, skip, warmup, nLines)) as pool:
+            return pool.map(runConfig, configs, chunksize=1)
+    finally:
+        if tmp is not None:
+            os.remove(tmp)
+
+def test():
+    # store uses the helpers of this module, so it is only imported to run a sweep
+    import store
+    if len(sys.argv) < 3:
+        print("usage: sweep.py <trace> <grid.json> [processes] [results.db]")
+        print('grid.json: {"base": {...}, "axes": {"L1.size": [...]}, "skip": 0, "warmup": 0, "nLines": -1}')
+        sys.exit(1)
+    with open(sys.argv[2]) as f:
+        grid = json.load(f)
+    processes = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] != '-' else None
+    resultStore = None
+    if len(sys.argv) > 4:
+        resultStore = store.Store(sys.argv[4])
+    configs = expand(grid.get('base', {}), grid.get('axes', {}))
+    result = sweep(sys.argv[1], configs, processes, grid.get('skip', 0), grid.get('warmup', 0), grid.get('nLines', -1), resultStore)
+    print(','.join(result.dtype.names))
+    for row in result:
+        print(','.join(str(v) for v in row.tolist()))
+
+if __name__ == '__main__':
+    test()
@@ -1,39 +1,305 @@
+import bisect
+import math
 import random
-class TLB:
-    """TLB which only implements offset translation for now.
+import numpy as np
+from replacement import makePolicy
+
+# Integer event counters of a TLB and of the page table walker, cycles and energy are priced from these
+TLB_EVENTS = ('hit', 'miss', 'lookups', 'timedLookups')
+WALK_EVENTS = ('walks', 'levelReads', 'timedLevelReads')
+# Timing (cycles) and energy of a TLB lookup and of reading one level of the page table
+# (by default a read of the page table is priced as an L2 hit)
+TLB_PRICES = {'accessTime': 1, 'accessEnergy': 0.000539962}
+WALK_PRICES = {'levelTime': 11, 'levelEnergy': 0.143178}
+# Bits of the page number translated by each level of the page table (512 entries per table),
+# and log2 of the smallest (4 kB) page, which is reached by a walk of every level
+LEVEL_BITS = 9
+SMALLEST_SHIFT = 12
+
+def priceTLB(events, prices):
+    """(cycles, energy) of a TLB from its event counters and timing/energy, both dicts."""
+    return prices['accessTime'] * events['timedLookups'], prices['accessEnergy'] * events['lookups']
+
+def priceWalks(events, prices):
+    """(cycles, energy) of the page table walks from their event counters and timing/energy, both dicts."""
+    return prices['levelTime'] * events['timedLevelReads'], prices['levelEnergy'] * events['levelReads']
 
-    add and some of the bits required for "real" TLB translation are preserved here, but currently only functions as an offset calculator.
+def parseRegions(regions):
+    """Regions of pages of another size as a sorted list of (start, end, pageSize).
+
+    Accepts a list of (start, end, pageSize) or a string 'start:end:pageSize,...' of
+    ints in any base (as given on the command line).
     """
-    
-    def __init__(self, nEntries, bits):
+    if isinstance(regions, str):
+        regions = [[int(v, 0) for v in region.split(':')] for region in regions.split(',') if region]
+    regions = sorted(tuple(region) for region in regions)
+    for (start, end, pageSize), following in zip(regions, regions[1:] + [None]):
+        if pageSize & (pageSize - 1) or start % pageSize or end % pageSize:
+            raise ValueError("Region 0x%x-0x%x is not aligned to its page size 0x%x"%(start, end, pageSize))
+        if following is not None and following[0] < end:
+            raise ValueError("Regions 0x%x-0x%x and 0x%x-0x%x overlap"%(start, end, following[0], following[1]))
+    return regions
+
+class PageTable:
+
+
+    def __init__(self, pageSize=0x1000, regions=(), levels=4):
+        """Page table of the simulated process, mapping virtual to physical pages and walked on a TLB miss.
+
+        Pages are mapped to physical pages at a fixed (random) offset. Every page is
+        `pageSize` bytes except in `regions`, which are mapped with other page sizes. A
+        walk reads every level for a 4 kB page and ends `log2(size / 4 kB) / 9` levels
+        early for larger pages (e.g. 2 MB or 1 GB).
+
+        Parameters
+        ----------
+        pageSize (int):
+            Base page size in bytes, page numbers passed to translateVirt/translatePhys are in these pages. (Default 0x1000)
+        regions (list or str):
+            (start, end, pageSize) virtual address ranges mapped with other page sizes, see `parseRegions`. (Default none)
+        levels (int):
+            Levels of the page table read by the walk of a 4 kB page. (Default 4)
+        """
+        self.pageSize = pageSize
+        self.regions = parseRegions(regions)
+        self.levels = levels
+
+        self.shift = int(math.ceil(math.log2(self.pageSize)))
+        self.bits = 48 - self.shift
+        self.offset = random.randint(0, (1<<self.bits)-1)
+
+        self.starts = [start for start, end, size in self.regions]
+        self.ends = [end for start, end, size in self.regions]
+        self.shifts = [int(math.log2(size)) for start, end, size in self.regions]
+        # Levels read by the walk of each page size, by page shift
+        self.walkLevels = {shift: max(1, self.levels - (shift - SMALLEST_SHIFT) // LEVEL_BITS) for shift in [self.shift] + self.shifts}
+
+        self.levelTime = WALK_PRICES['levelTime']
+        self.levelEnergy = WALK_PRICES['levelEnergy']
+
+        # Walks, page table levels read (which cost energy) and those on the critical path (timed)
+        self.walks = 0
+        self.levelReads = 0
+        self.timedLevelReads = 0
+
+    @property
+    def cycles(self):
+        """Cycles spent walking the page table, priced from the event counters at the current timing."""
+        return priceWalks(self.events(), self.prices())[0]
+
+    @property
+    def energy(self):
+        """Energy spent walking the page table, priced from the event counters at the current energies."""
+        return priceWalks(self.events(), self.prices())[1]
+
+    def events(self):
+        """The event counters of the walker, as a dict."""
+        return {k: getattr(self, k) for k in WALK_EVENTS}
+
+    def prices(self):
+        """The timing and energy of the walker, as a dict."""
+        return {k: getattr(self, k) for k in WALK_PRICES}
+
+    def pageShift(self, address):
+        """log2 of the size of the page holding a virtual address."""
+        i = bisect.bisect_right(self.starts, address) - 1
+        if i >= 0 and address < self.ends[i]:
+            return self.shifts[i]
+        return self.shift
+
+    def pageShifts(self, addresses):
+        """`pageShift` of an array of virtual addresses (uint64), as an array."""
+        shifts = np.full(len(addresses), self.shift, dtype=np.uint64)
+        if self.regions:
+            i = np.searchsorted(np.array(self.starts, dtype=np.uint64), addresses, side='right') - 1
+            inside = (i >= 0) & (addresses < np.array(self.ends, dtype=np.uint64)[np.maximum(i, 0)])
+            shifts[inside] = np.array(self.shifts, dtype=np.uint64)[i[inside]]
+        return shifts
+
+    def walk(self, shift, countTime=True, countEnergy=True):
+        """Walk the page table for a page of size 1 << shift."""
+        levels = self.walkLevels[shift]
+        if countEnergy:
+            self.walks += 1
+            self.levelReads += levels
+        if countTime:
+            self.timedLevelReads += levels
+
+    def translateVirt(self, virtualPage):
+        """Physical page of a virtual page."""
+        return (virtualPage - self.offset) % (1<<self.bits)
+
+    def translatePhys(self, physicalPage):
+        """Virtual page of a physical page."""
+        return (physicalPage + self.offset) % (1<<self.bits)
+
+class TLB:
+
+
+    def __init__(self, nEntries=64, associativity=4, child=None, pageTable=None, replacement='lru'):
+        """Set associative TLB, a hash indexed set of ways per set.
+
+        A page of any size is looked up in the set of its page number (as when every page
+        size is probed in parallel), a miss is passed to the child TLB or, in the last
+        level, walks the page table.
+
+        Parameters
+        ----------
+        nEntries (int):
+            Number of translations held. (Default 64)
+        associativity (int):
+            Number of ways, -1 for fully associative. (Default 4)
+        child (TLB):
+            The next level TLB, default is None, which means a miss walks the page table.
+        pageTable (PageTable):
+            The page table, default is None, which means that of the child or a default PageTable.
+        replacement (str or class):
+            Replacement policy, a name from `replacement.POLICIES` or a policy class (default 'lru').
+        """
         self.nEntries = nEntries
-        self.virtual = [0] * nEntries
-        self.physical = [0] * nEntries
-        self.freeList = list(range(nEntries))
-        self.lastUsed = [0] * nEntries
-        self.counter = 0
-        self.bits = bits
-        self.offset = random.randint(0, (1<<bits)-1)
-
-    def add(self, virtual, physical):
-        if len(self.freeList) == 0:
-            self.evict()
-        i = self.freeList.pop()
-        counter += 1
-        self.lastUsed[i] = counter
-        self.virtual[i] = virtual
-        self.physical[i] = physical
-
-    def translateVirt(self, virtualAddress):
-        return (virtualAddress - self.offset) % (1<<self.bits)
-        i = self.virtual.index(virtualAddress)
-        counter += 1
-        self.lastUsed[i] = counter
-        return self.physical[i]
-
-    def translatePhys(self, physicalAddress):
-        return (physicalAddress + self.offset) % (1<<self.bits)
-        i = self.physical.index(physicalAddress)
-        counter += 1
-        self.lastUsed[i] = counter
-        return self.virtual[i]
+        self.associativity = associativity
+        self.child = child
+        self.pageTable = pageTable
+
+        if self.associativity == -1:
+            self.associativity = self.nEntries
+        if self.pageTable is None:
+            self.pageTable = PageTable() if self.child is None else self.child.pageTable
+
+        self.nSets = self.nEntries // self.associativity
+
+        self.freeList = [list(range(self.associativity)) for i in range(self.nSets)]
+        # Translation held by each entry, indexed by setIndex * associativity + way, and the way of each in a set
+        self.keys = [None] * (self.nSets * self.associativity)
+        self.tagIndex = [{} for i in range(self.nSets)]
+        self.replacement = makePolicy(replacement, self.nSets, self.associativity)
+
+        self.accessTime = TLB_PRICES['accessTime']
+        self.accessEnergy = TLB_PRICES['accessEnergy']
+
+        self.hit = 0
+        self.miss = 0
+        # Lookups which cost energy, and those of them on the critical path (timed)
+        self.lookups = 0
+        self.timedLookups = 0
+
+    @property
+    def cycles(self):
+        """Cycles spent in this TLB, priced from the event counters at the current timing."""
+        return priceTLB(self.events(), self.prices())[0]
+
+    @property
+    def energy(self):
+        """Energy spent in this TLB, priced from the event counters at the current energies."""
+        return priceTLB(self.events(), self.prices())[1]
+
+    def events(self):
+        """The event counters of this TLB, as a dict."""
+        return {k: getattr(self, k) for k in TLB_EVENTS}
+
+    def prices(self):
+        """The timing and energy of this TLB, as a dict."""
+        return {k: getattr(self, k) for k in TLB_PRICES}
+
+    def lookup(self, address, count=True, countTime=None, countEnergy=None):
+        """Translate a virtual address, filling the TLBs on a miss.
+
+        Parameters
+        ----------
+        address (int):
+            The virtual address which is translated.
+        count (bool):
+            Whether hit/miss rate should be counted (default is True).
+        """
+        if countTime is None:
+            countTime = count
+        if countEnergy is None:
+            countEnergy = count
+        shift = self.pageTable.pageShift(address)
+        self.lookupPage(address >> shift, shift, count, countTime, countEnergy)
+
+    def lookupPage(self, page, shift, count=True, countTime=True, countEnergy=True):
+        """Look up page number `page` of a page of size 1 << shift."""
+        if countTime:
+            self.timedLookups += 1
+        if countEnergy:
+            self.lookups += 1
+        setIndex = page % self.nSets
+        # Pages of different sizes are told apart by the shift in the low bits
+        key = (page << 6) | shift
+        way = self.tagIndex[setIndex].get(key)
+        if way is not None:
+            if count:
+                self.hit += 1
+            self.replacement.touch(setIndex, way)
+            return
+        if count:
+            self.miss += 1
+        if self.child is not None:
+            self.child.lookupPage(page, shift, count, countTime, countEnergy)
+        else:
+            self.pageTable.walk(shift, countTime, countEnergy)
+        self.fill(setIndex, key)
+
+    def fill(self, setIndex, key):
+        """Install a translation in a set, replacing a victim if it is full."""
+        if self.freeList[setIndex]:
+            way = self.freeList[setIndex].pop()
+        else:
+            way = self.replacement.victim(setIndex)
+            self.replacement.remove(setIndex, way)
+            del self.tagIndex[setIndex][self.keys[setIndex * self.associativity + way]]
+        self.keys[setIndex * self.associativity + way] = key
+        self.tagIndex[setIndex][key] = way
+        self.replacement.insert(setIndex, way)
+
+    def access_many(self, addresses, count_mask=None, chunkSize=0x10000):
+        """Translate a batch of virtual addresses, equivalent to calling `lookup` on each in order.
+
+        Page sizes, page numbers and sets are computed with NumPy a chunk at a time,
+        hits are handled inline and misses fall back to `lookupPage`.
+        """
+        addresses = np.asarray(addresses, dtype=np.uint64)
+        n = len(addresses)
+        if count_mask is None:
+            count_mask = np.ones(n, dtype=bool)
+        count_mask = np.asarray(count_mask, dtype=bool)
+
+        tagIndex = self.tagIndex
+        touch = self.replacement.touch
+        for start in range(0, n, chunkSize):
+            chunk = addresses[start:start + chunkSize]
+            shifts = self.pageTable.pageShifts(chunk)
+            pages = chunk >> shifts
+            setIndices = (pages % np.uint64(self.nSets)).tolist()
+            keys = ((pages << np.uint64(6)) | shifts).tolist()
+            counts = count_mask[start:start + chunkSize].tolist()
+
+            # Counted hits not yet added to the event counters
+            hits = 0
+            for i, setIndex in enumerate(setIndices):
+                way = tagIndex[setIndex].get(keys[i])
+                if way is None:
+                    self.countHits(hits)
+                    hits = 0
+                    self.lookupPage(keys[i] >> 6, keys[i] & 63, counts[i], counts[i], counts[i])
+                    continue
+                if counts[i]:
+                    hits += 1
+                touch(setIndex, way)
+            self.countHits(hits)
+
+    def countHits(self, hits):
+        """Count the events of `hits` counted hits."""
+        self.hit += hits
+        self.lookups += hits
+        self.timedLookups += hits
+
+    def translateVirt(self, virtualPage, count=True, countTime=None, countEnergy=None):
+        """Physical page of a virtual page (in base pages of the page table), looking it up in the TLB."""
+        self.lookup(virtualPage << self.pageTable.shift, count, countTime, countEnergy)
+        return self.pageTable.translateVirt(virtualPage)
+
+    def translatePhys(self, physicalPage):
+        """Virtual page of a physical page, from the page table (reverse translations are not cached)."""
+        return self.pageTable.translatePhys(physicalPage)
@@ -0,0 +1,270 @@
+#! /usr/bin/env python3
+import io
+import mmap
+import os
+import struct
+import sys
+import numpy as np
+
+# Header: magic, format version, number of records
+MAGIC = b'CSTRACE'
+VERSION = 1
+HEADER = struct.Struct('<7sBQ')
+# One record per access, packed (9 bytes)
+RECORD = np.dtype([('address', '<u8'), ('flags', 'u1')])
+WRITE = 1
+
+def detectFormat(line):
+    """Guess the text format of a trace from its first line.
+
+    'text' is the `R 0x1234 ...` format read by cache.py and etlb.py,
+    'gem5' is the mem_ctrl debug log read by cacheMemTrace.py and etlbMemTrace.py.
+    """
+    if line[:1] in ('R', 'W') and line[1:2] == ' ':
+        return 'text'
+    return 'gem5'
+
+def parseLine(line, format):
+    """Return (address, write) for one line of a text trace."""
+    if format == 'text':
+        return int(line.split(' ')[1], 16), line[0] == 'W'
+    elif format == 'gem5':
+        return int(line.split(' ')[-3]), 'Write' in line
+    raise ValueError("Unknown trace format '%s', expected 'text' or 'gem5'"%format)
+
+# Value of each byte as a hex digit, 255 if it is not one
+DIGITS = np.full(256, 255, dtype=np.uint64)
+DIGITS[np.frombuffer(b'0123456789', dtype=np.uint8)] = np.arange(10, dtype=np.uint64)
+DIGITS[np.frombuffer(b'abcdef', dtype=np.uint8)] = np.arange(10, 16, dtype=np.uint64)
+DIGITS[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16, dtype=np.uint64)
+
+def parseNumbers(data, starts, ends, base):
+    """Parse the numbers data[starts[i]:ends[i]] of a uint8 array, all digits in `base`, at once."""
+    values = np.zeros(len(starts), dtype=np.uint64)
+    widths = ends - starts
+    last = len(data) - 1
+    for k in range(int(widths.max(initial=0))):
+        active = widths > k
+        digits = DIGITS[data[np.minimum(starts + k, last)]]
+        if (digits[active] >= base).any():
+            line = int(np.flatnonzero(active & (digits >= base))[0])
+            raise ValueError("Malformed address %r in trace"%bytes(data[starts[line]:ends[line]]))
+        values = np.where(active, values * np.uint64(base) + digits, values)
+    return values
+
+def scanBlock(block, format):
+    """Parse the complete lines of a text trace held in bytes into an array of RECORD.
+
+    Addresses are located and converted with NumPy over the whole block, matching
+    `parseLine` for every line.
+    """
+    data = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(data == ord('\n'))
+    if len(data) and data[-1] != ord('\n'):
+        ends = np.append(ends, len(data))
+    starts = np.concatenate(([0], ends[:-1] + 1)).astype(ends.dtype)
+    lines = ends > starts
+    starts = starts[lines]
+    ends = ends[lines]
+    spaces = np.append(np.flatnonzero(data == ord(' ')), len(data))
+
+    if format == 'text':
+        # 'R 0x1234 8': the second space separated field, in hex
+        first = np.searchsorted(spaces, starts)
+        tokenStarts = spaces[first] + 1
+        tokenEnds = np.minimum(spaces[np.minimum(first + 1, len(spaces) - 1)], ends)
+        prefixed = (data[np.minimum(tokenStarts + 1, len(data) - 1)] | 0x20) == ord('x')
+        addresses = parseNumbers(data, tokenStarts + 2 * prefixed, tokenEnds, 16)
+        writes = data[starts] == ord('W')
+    elif format == 'gem5':
+        # '...ReadReq addr 5352 size 8': the third field from the end, in decimal
+        last = np.searchsorted(spaces, ends)
+        addresses = parseNumbers(data, spaces[last - 3] + 1, spaces[last - 2], 10)
+        marks = np.ones(len(data), dtype=bool)
+        for k, c in enumerate(b'Write'):
+            marks[:len(data) - k] &= data[k:] == c
+        marks[len(data) - 4:] = False
+        writes = np.zeros(len(starts), dtype=bool)
+        writes[np.searchsorted(ends, np.flatnonzero(marks))] = True
+    else:
+        raise ValueError("Unknown trace format '%s', expected 'text' or 'gem5'"%format)
+    return makeRecords(addresses, np.where(writes, WRITE, 0))
+
+def parseChunks(source, format=None, blockSize=1 << 22):
+    """Parse a text trace, yielding an array of RECORD per block of about `blockSize` bytes.
+
+    Parameters
+    ----------
+    source (file):
+        Text trace to read, open in text or binary mode.
+    format (str):
+        'text' or 'gem5', default None detects it from the first line.
+    """
+    rest = b''
+    while True:
+        data = source.read(blockSize)
+        if isinstance(data, str):
+            data = data.encode()
+        block = rest + data
+        if format is None and block:
+            format = detectFormat(block.split(b'\n', 1)[0].decode())
+        if block.startswith(b'#eof'):
+            return
+        eof = block.find(b'\n#eof')
+        if eof != -1:
+            yield scanBlock(block[:eof + 1], format)
+            return
+        if not data:
+            if block:
+                yield scanBlock(block, format)
+            return
+        # Carry the last, incomplete, line over to the next block
+        cut = block.rfind(b'\n') + 1
+        rest = block[cut:]
+        if cut:
+            yield scanBlock(block[:cut], format)
+
+def makeRecords(addresses, flags):
+    records = np.empty(len(addresses), dtype=RECORD)
+    records['address'] = addresses
+    records['flags'] = flags
+    return records
+
+def parse(source, format=None):
+    """Parse a whole text trace into an array of RECORD."""
+    return np.concatenate([np.empty(0, dtype=RECORD)] + list(parseChunks(source, format)))
+
+def convert(source, destination, format=None):
+    """Convert a text trace to the binary trace format.
+
+    Parameters
+    ----------
+    source (file):
+        Text trace to read, open in text or binary mode.
+    destination (str):
+        Path of the binary trace to write.
+    format (str):
+        'text' or 'gem5', default None detects it from the first line.
+
+    Returns the number of records written.
+    """
+    nRecords = 0
+    with open(destination, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, 0))
+        for records in parseChunks(source, format):
+            records.tofile(out)
+            nRecords += len(records)
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, nRecords))
+    return nRecords
+
+def isBinary(prefix):
+    """Whether the first bytes of a file are a binary trace header."""
+    return prefix[:len(MAGIC)] == MAGIC
+
+def openTrace(source):
+    """Map a binary trace into memory.
+
+    `source` is a path or a binary file object. Regular files are memory mapped,
+    anything else (e.g. a pipe) is read in full. Returns a read only array of RECORD,
+    whose 'address' and 'flags' fields are zero copy views.
+    """
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, 'rb') as f:
+            return openTrace(f)
+    try:
+        buf = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, io.UnsupportedOperation):
+        buf = source.read()
+    magic, version, nRecords = HEADER.unpack_from(buf)
+    if magic != MAGIC:
+        raise ValueError("Not a binary trace, bad magic %r"%magic)
+    if version != VERSION:
+        raise ValueError("Unsupported binary trace version %d, expected %d"%(version, VERSION))
+    return np.frombuffer(buf, dtype=RECORD, count=nRecords, offset=HEADER.size)
+
+def stdinRecords():
+    """Records of a binary trace on stdin, or None if stdin is a text trace."""
+    if not isBinary(sys.stdin.buffer.peek(HEADER.size)):
+        return None
+    return openTrace(sys.stdin.buffer)
+
+def readStdin():
+    """Records of the trace on stdin, binary or text."""
+    records = stdinRecords()
+    if records is None:
+        records = parse(sys.stdin.buffer)
+    return records
+
+def readChunks(source, format=None, chunkSize=0x100000):
+    """Yield arrays of RECORD from a trace in any format, detecting binary traces.
+
+    Parameters
+    ----------
+    source (str or file):
+        Path of the trace, or a binary file object which supports `peek` (e.g. sys.stdin.buffer).
+    format (str):
+        'text' or 'gem5' for a text trace, default None detects it from the first line.
+    chunkSize (int):
+        Number of records per chunk of a binary trace, text traces are parsed a block at a time.
+    """
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield from readChunks(f, format, chunkSize)
+        return
+    if isBinary(source.peek(HEADER.size)):
+        records = openTrace(source)
+        for start in range(0, len(records), chunkSize):
+            yield records[start:start + chunkSize]
+    else:
+        yield from parseChunks(source, format)
+
+def chunks(records, chunkSize=0x100000):
+    """Yield (addresses, writes) for consecutive chunks of records, addresses being a view."""
+    for start in range(0, len(records), chunkSize):
+        chunk = records[start:start + chunkSize]
+        yield chunk['address'], (chunk['flags'] & WRITE).astype(bool)
+
+def window(records, skip=0, warmup=0, nLines=-1):
+    """Select the accesses a run replays, as the text loops in the test functions do.
+
+    The first `skip` records are dropped, the next `warmup` are replayed without
+    counting and then `nLines` are counted (-1 for the rest of the trace).
+    Returns (addresses, writes, counts).
+    """
+    end = len(records) if nLines == -1 else min(len(records), skip + warmup + nLines)
+    records = records[skip:end]
+    writes = (records['flags'] & WRITE).astype(bool)
+    counts = np.arange(len(records)) >= warmup
+    return records['address'], writes, counts
+
+def windowChunks(chunks, skip=0, warmup=0, nLines=-1):
+    """Streaming `window` over chunks of RECORD, yielding (addresses, writes, counts) per chunk.
+
+    Chunks after the end of the window are not read.
+    """
+    end = None if nLines == -1 else skip + warmup + nLines
+    position = 0
+    for records in chunks:
+        first = position
+        position += len(records)
+        lo = max(skip - first, 0)
+        hi = len(records) if end is None else min(end - first, len(records))
+        if lo < hi:
+            chunk = records[lo:hi]
+            counts = np.arange(first + lo, first + hi) >= skip + warmup
+            yield chunk['address'], (chunk['flags'] & WRITE).astype(bool), counts
+        if end is not None and position >= end:
+            return
+
+def main():
+    if len(sys.argv) < 3:
+        print("usage: traceFile.py <text trace> <binary trace> [text|gem5]")
+        sys.exit(1)
+    format = sys.argv[3] if len(sys.argv) > 3 else None
+    with open(sys.argv[1], 'rb') as f:
+        nRecords = convert(f, sys.argv[2], format)
+    print("Wrote %d records to %s"%(nRecords, sys.argv[2]))
+
+if __name__ == '__main__':
+    main()
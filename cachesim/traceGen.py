@@ -0,0 +1,174 @@
+#! /usr/bin/env python3
+import sys
+import numpy as np
+import traceFile
+
+# Default working set (bytes) of the generators
+WORKING_SET = 1 << 26
+
+def chunkSizes(n, chunkSize):
+    """Sizes of consecutive chunks covering n accesses, forever if n is None."""
+    done = 0
+    while n is None or done < n:
+        size = chunkSize if n is None else min(chunkSize, n - done)
+        yield done, size
+        done += size
+
+def generators(seed):
+    """Independent generators for addresses and writes, so chunking does not change the trace."""
+    addressSeed, writeSeed = np.random.SeedSequence(seed).spawn(2)
+    return np.random.default_rng(addressSeed), np.random.default_rng(writeSeed)
+
+def stream(n, chunkSize, rng, writeRng, writeFraction, addressChunk):
+    """Yield (addresses, writes) chunks, `addressChunk(rng, start, size)` giving the addresses."""
+    for start, size in chunkSizes(n, chunkSize):
+        addresses = addressChunk(rng, start, size)
+        if writeFraction > 0:
+            writes = writeRng.random(size) < writeFraction
+        else:
+            writes = np.zeros(size, dtype=bool)
+        yield addresses, writes
+
+def sequential(n=None, step=8, base=0, workingSet=WORKING_SET, writeFraction=0.0, seed=None, chunkSize=0x10000):
+    """Streaming accesses `step` bytes apart, wrapping around the working set.
+
+    Parameters
+    ----------
+    n (int):
+        Number of accesses, default None streams forever.
+    step (int):
+        Bytes between consecutive accesses.
+    base (int):
+        Lowest address of the working set.
+    workingSet (int):
+        Bytes of address space which are accessed.
+    writeFraction (float):
+        Probability that an access is a write.
+    seed (int):
+        Seed of the random write flags (and addresses for random patterns).
+    chunkSize (int):
+        Number of accesses per chunk.
+    """
+    def addressChunk(rng, start, size):
+        i = np.arange(start, start + size, dtype=np.uint64)
+        return np.uint64(base) + (i * np.uint64(step)) % np.uint64(workingSet)
+    return stream(n, chunkSize, *generators(seed), writeFraction, addressChunk)
+
+def strided(n=None, stride=4160, base=0, workingSet=WORKING_SET, writeFraction=0.0, seed=None, chunkSize=0x10000):
+    """Accesses `stride` bytes apart, wrapping around the working set (see `sequential`)."""
+    return sequential(n, stride, base, workingSet, writeFraction, seed, chunkSize)
+
+def uniform(n=None, align=8, base=0, workingSet=WORKING_SET, writeFraction=0.0, seed=None, chunkSize=0x10000):
+    """Uniformly random `align` byte aligned accesses within the working set (see `sequential`)."""
+    nSlots = max(workingSet // align, 1)
+    def addressChunk(rng, start, size):
+        return np.uint64(base) + rng.integers(0, nSlots, size, dtype=np.uint64) * np.uint64(align)
+    return stream(n, chunkSize, *generators(seed), writeFraction, addressChunk)
+
+def zipf(n=None, alpha=1.0, cacheLine=64, base=0, workingSet=WORKING_SET, writeFraction=0.0, seed=None, chunkSize=0x10000):
+    """Hot set accesses, the k-th most popular line being accessed with probability proportional to 1/k**alpha.
+
+    Popularity ranks are scattered over the lines of the working set by a random
+    permutation, so hot lines do not share sets. Other parameters are as for `sequential`.
+    """
+    nLines = max(workingSet // cacheLine, 1)
+    rng, writeRng = generators(seed)
+    cdf = np.cumsum(np.arange(1, nLines + 1, dtype=np.float64) ** -alpha)
+    cdf /= cdf[-1]
+    lines = rng.permutation(nLines).astype(np.uint64)
+    def addressChunk(rng, start, size):
+        ranks = np.minimum(np.searchsorted(cdf, rng.random(size)), nLines - 1)
+        return np.uint64(base) + lines[ranks] * np.uint64(cacheLine)
+    return stream(n, chunkSize, rng, writeRng, writeFraction, addressChunk)
+
+def pointerChase(n=None, nodeSize=64, base=0, workingSet=WORKING_SET, writeFraction=0.0, seed=None, chunkSize=0x10000):
+    """Follow a linked list whose nodes are randomly placed in the working set.
+
+    The list is a single cycle through every `nodeSize` byte node, so each node is
+    revisited only after all the others, defeating any spatial locality. Other
+    parameters are as for `sequential`.
+    """
+    nNodes = max(workingSet // nodeSize, 1)
+    rng, writeRng = generators(seed)
+    order = rng.permutation(nNodes).astype(np.uint64) * np.uint64(nodeSize) + np.uint64(base)
+    def addressChunk(rng, start, size):
+        return order[np.arange(start, start + size) % nNodes]
+    return stream(n, chunkSize, rng, writeRng, writeFraction, addressChunk)
+
+def pageScattered(n=None, pageSize=0x1000, linesPerPage=1, cacheLine=64, base=0, workingSet=WORKING_SET, writeFraction=0.0, seed=None, chunkSize=0x10000):
+    """Accesses to uniformly random pages, each touching one of its first `linesPerPage` lines.
+
+    Few lines are used per page, stressing the TLB, eTLB and Hub rather than the caches.
+    Other parameters are as for `sequential`.
+    """
+    nPages = max(workingSet // pageSize, 1)
+    def addressChunk(rng, start, size):
+        # One draw per access, as drawing pages then lines per chunk would depend on the chunk size
+        pages, lines = np.divmod(rng.integers(0, nPages * linesPerPage, size, dtype=np.uint64), np.uint64(linesPerPage))
+        return np.uint64(base) + pages * np.uint64(pageSize) + lines * np.uint64(cacheLine)
+    return stream(n, chunkSize, *generators(seed), writeFraction, addressChunk)
+
+PATTERNS = {
+    'sequential': sequential,
+    'strided': strided,
+    'uniform': uniform,
+    'zipf': zipf,
+    'pointerChase': pointerChase,
+    'pageScattered': pageScattered,
+}
+
+def generate(pattern, n=None, **params):
+    """Chunks of the named pattern, see `PATTERNS`."""
+    if pattern not in PATTERNS:
+        raise ValueError("Unknown pattern '%s', expected one of %s"%(pattern, ', '.join(PATTERNS)))
+    return PATTERNS[pattern](n, **params)
+
+def collect(chunks):
+    """Concatenate chunks into a single (addresses, writes)."""
+    addresses = []
+    writes = []
+    for a, w in chunks:
+        addresses.append(a)
+        writes.append(w)
+    return np.concatenate(addresses), np.concatenate(writes)
+
+def feed(top, chunks, warmup=0):
+    """Replay chunks through `top.access_many`, the first `warmup` accesses not being counted.
+
+    Returns the number of counted accesses.
+    """
+    counted = 0
+    done = 0
+    for addresses, writes in chunks:
+        counts = np.arange(done, done + len(addresses)) >= warmup
+        top.access_many(addresses, writes, counts)
+        done += len(addresses)
+        counted += int(counts.sum())
+    return counted
+
+def write(out, chunks, n):
+    """Write n accesses of chunks as a binary trace to a binary file object."""
+    out.write(traceFile.HEADER.pack(traceFile.MAGIC, traceFile.VERSION, n))
+    for addresses, writes in chunks:
+        records = np.empty(len(addresses), dtype=traceFile.RECORD)
+        records['address'] = addresses
+        records['flags'] = np.where(writes, traceFile.WRITE, 0)
+        out.write(records.tobytes())
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in PATTERNS:
+        print("usage: traceGen.py <pattern> <n> [seed] [workingSet] [writeFraction] > trace.bin")
+        print("patterns: %s"%', '.join(PATTERNS))
+        sys.exit(1)
+    n = int(sys.argv[2])
+    params = {}
+    if len(sys.argv) > 3:
+        params['seed'] = int(sys.argv[3])
+    if len(sys.argv) > 4:
+        params['workingSet'] = int(sys.argv[4], 0)
+    if len(sys.argv) > 5:
+        params['writeFraction'] = float(sys.argv[5])
+    write(sys.stdout.buffer, generate(sys.argv[1], n, **params), n)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+from collections import OrderedDict
+import numpy as np
+import pytest
+from cache import Cache
+import hierarchy
+import traceFile
+import traceGen
+
+LIBQUANTUM = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mem_trace', 'log_libquantum_mem')
+
+def libquantum():
+    with open(LIBQUANTUM, 'rb') as f:
+        return traceFile.window(traceFile.parse(f))
+
+def referenceLRU(addresses, nSets, associativity, cacheLine=64):
+    """Hits of a plain LRU cache, for addresses whose tags are never 0 (see `stackDistance.setDistances`)."""
+    sets = [OrderedDict() for i in range(nSets)]
+    hits = 0
+    for address in addresses.tolist():
+        line = address // cacheLine
+        lines = sets[line % nSets]
+        tag = line // nSets
+        if tag in lines:
+            lines.move_to_end(tag)
+            hits += 1
+        else:
+            lines[tag] = True
+            if len(lines) > associativity:
+                lines.popitem(last=False)
+    return hits
+
+def test_baseline_libquantum():
+    addresses, writes, counts = libquantum()
+    top = hierarchy.build({'engine': 'baseline'})
+    top.access_many(addresses, writes, counts)
+    row = hierarchy.results(top, int(counts.sum()))
+    assert (row['N'], row['L1Hit'], row['L1Miss'], row['L2Hit'], row['L2Miss']) == (7551, 7132, 419, 10, 409)
+    assert (row['L1Cycles'], row['L2Cycles'], row['DRAMCycles']) == (30204, 4609, 21672)
+    assert (row['DRAMReads'], row['DRAMWrites'], row['DRAMRowHits'], row['DRAMRowMisses'], row['DRAMRowConflicts']) == (409, 0, 343, 25, 41)
+    assert (row['L1TLBHit'], row['L1TLBMiss'], row['L2TLBHit'], row['L2TLBMiss'], row['pageTableWalks']) == (7487, 64, 5, 59, 59)
+    assert row['L1Energy'] == pytest.approx(99.285, abs=1e-3)
+    assert row['L2Energy'] == pytest.approx(60.272, abs=1e-3)
+
+@pytest.mark.parametrize('size, associativity', [(0x2000, 1), (0x2000, 4), (0x8000, 8), (0x1000, 64)])
+def test_lru_matches_reference(size, associativity):
+    addresses, writes = traceGen.collect(traceGen.zipf(20000, base=1 << 32, workingSet=1 << 18, writeFraction=0.3, seed=2))
+    cache = Cache(size=size, associativity=associativity)
+    cache.access_many(addresses, writes)
+    hits = referenceLRU(addresses, cache.nSets, associativity)
+    assert (cache.hit, cache.miss) == (hits, len(addresses) - hits)
+
+@pytest.mark.parametrize('config', [
+    {'engine': 'baseline'},
+    {'engine': 'baseline', 'L1': {'size': 0x2000, 'replacement': 'srrip'}, 'L2': {'size': 0x10000, 'replacement': 'plru'}},
+    {'engine': 'baseline', 'L1': {'writeAllocate': False}, 'L2': {'replacement': 'fifo'}},
+    {'engine': 'etlb'},
+    {'engine': 'etlb', 'L1': {'size': 0x2000, 'associativity': 4}, 'L2': {'size': 0x10000, 'replacement': 'fifo'}},
+])
+def test_access_many_matches_access(config):
+    addresses, writes = traceGen.collect(traceGen.uniform(5000, workingSet=1 << 20, writeFraction=0.3, seed=3))
+    counts = np.arange(len(addresses)) >= 500
+    batched = hierarchy.build(config)
+    batched.access_many(addresses, writes, counts)
+    single = hierarchy.build(config)
+    for address, write, count in zip(addresses.tolist(), writes.tolist(), counts.tolist()):
+        single.access(address, write, count)
+    N = int(counts.sum())
+    assert hierarchy.results(batched, N) == hierarchy.results(single, N)
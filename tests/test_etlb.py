@@ -0,0 +1,71 @@
+import os
+import pytest
+import hierarchy
+import traceFile
+import traceGen
+
+LIBQUANTUM = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mem_trace', 'log_libquantum_mem')
+# A small stack, so lines move between the L1, L2 and DRAM often
+SMALL = {'engine': 'etlb', 'L1': {'size': 0x2000, 'associativity': 4}, 'L2': {'size': 0x10000}}
+
+def violations(etlb):
+    """CLT items whose L1 or L2 line does not hold the hub pointer of their page, or which share a line."""
+    hub = etlb.hub
+    bad = 0
+    seen = set()
+    def check(clt, hubSet, hubWay, L1Set):
+        nonlocal bad
+        pointer = (hubWay << hub.setBits) + hubSet
+        paddr = (hub.entries[hubSet][hubWay].ptag << hub.setBits) + hubSet
+        for pageIndex, (loc, way) in clt.lines.items():
+            if loc == 2:
+                level, setIndex = etlb.cache, L1Set
+            else:
+                level, setIndex = hub.cache, paddr % hub.cache.nSets
+            key = (loc, setIndex, way)
+            if key in seen or not level.valid[setIndex * level.associativity + way] or level.getTag(setIndex, way) != pointer:
+                bad += 1
+            seen.add(key)
+    # The active CLT of a page is its eTLB entry's if it has one, else its Hub entry's
+    for setIndex in range(etlb.nSets):
+        for way, entry in enumerate(etlb.entries[setIndex]):
+            if entry.valid:
+                hubSet, hubWay = hub.pointers[(way << etlb.setBits) + setIndex]
+                check(entry, hubSet, hubWay, ((entry.vtag << etlb.setBits) + setIndex) % etlb.cache.nSets)
+    for setIndex in range(hub.nSets):
+        for way, entry in enumerate(hub.entries[setIndex]):
+            if entry.valid and not entry.eTLBValid:
+                paddr = (entry.ptag << hub.setBits) + setIndex
+                check(entry, setIndex, way, etlb.tlb.translatePhys(paddr) % etlb.cache.nSets)
+    return bad
+
+def test_etlb_libquantum():
+    with open(LIBQUANTUM, 'rb') as f:
+        addresses, writes, counts = traceFile.window(traceFile.parse(f))
+    top = hierarchy.build({'engine': 'etlb'})
+    top.access_many(addresses, writes, counts)
+    row = hierarchy.results(top, int(counts.sum()))
+    assert (row['N'], row['etlbHitNIC'], row['etlbHitL1'], row['etlbHitL2'], row['etlbMiss']) == (7551, 376, 7098, 18, 59)
+    assert (row['hubHitNIC'], row['hubHitL1'], row['hubHitL2'], row['hubMiss']) == (0, 0, 0, 59)
+    assert (row['L1Cycles'], row['L2Cycles'], row['DRAMCycles']) == (28392, 280, 24360)
+    assert (row['DRAMReads'], row['DRAMWrites'], row['DRAMRowHits'], row['DRAMRowMisses'], row['DRAMRowConflicts']) == (435, 22, 370, 25, 62)
+    assert (row['L2TLBHit'], row['L2TLBMiss'], row['pageTableWalks']) == (0, 59, 59)
+
+@pytest.mark.parametrize('pattern', ['uniform', 'zipf'])
+@pytest.mark.parametrize('params', [
+    {},
+    {'L2': {'replacement': 'fifo'}},
+    {'L2': {'replacement': 'srrip'}, 'L1': {'replacement': 'plru'}},
+    {'etlb': {'prefetcher': 'nextline'}},
+    {'etlb': {'prefetcher': 'stream'}, 'L2': {'replacement': 'fifo'}},
+    {'hub': {'nLines': 64}},
+])
+def test_clt_consistent(pattern, params):
+    config = dict(SMALL)
+    for level, levelParams in params.items():
+        config[level] = dict(config.get(level, {}), **levelParams)
+    top = hierarchy.build(config)
+    addresses, writes = traceGen.collect(traceGen.generate(pattern, 10000, seed=1, workingSet=1 << 22, writeFraction=0.3))
+    for start in range(0, len(addresses), 500):
+        top.access_many(addresses[start:start + 500], writes[start:start + 500])
+        assert violations(top) == 0
@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+from cache import Cache
+import stackDistance
+import traceGen
+
+@pytest.mark.parametrize('pattern', ['uniform', 'zipf', 'strided'])
+def test_miss_curves_match_cache(pattern):
+    # A working set from address 0, so the tag 0 lines every way starts out with are hit
+    addresses, writes = traceGen.collect(traceGen.generate(pattern, 20000, workingSet=1 << 17, seed=4))
+    counts = np.arange(len(addresses)) >= 1000
+    configs = [(0x1000, 1), (0x2000, 4), (0x4000, 8), (0x8000, 16), (0x2000, -1)]
+    results = stackDistance.missCurves(addresses, configs, count_mask=counts)
+    for size, associativity in configs:
+        cache = Cache(size=size, associativity=associativity)
+        cache.access_many(addresses, count_mask=counts)
+        assert results[(size, associativity)] == (cache.hit, cache.miss)
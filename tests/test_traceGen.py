@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+import traceGen
+
+PARAMS = {'pageScattered': {'linesPerPage': 3}}
+
+@pytest.mark.parametrize('pattern', sorted(traceGen.PATTERNS))
+def test_chunk_size_does_not_change_trace(pattern):
+    traces = [traceGen.collect(traceGen.generate(pattern, 5000, seed=5, workingSet=1 << 20, writeFraction=0.3,
+                                                 chunkSize=chunkSize, **PARAMS.get(pattern, {})))
+              for chunkSize in (5000, 1000, 777)]
+    for addresses, writes in traces[1:]:
+        assert np.array_equal(addresses, traces[0][0])
+        assert np.array_equal(writes, traces[0][1])